@@ -0,0 +1,71 @@
+import secrets
+from typing import Literal
+
+from aiogram import Bot
+from dishka.integrations.fastapi import (
+    DishkaRoute, FromDishka
+)
+from fast_bitrix24 import BitrixAsync
+from fastapi import APIRouter, Header, HTTPException, Query
+from fastapi.responses import JSONResponse
+
+from app.core.profiling import PROFILER, ProfilerBusy
+from app.core.settings.production import ProdAppSettings
+from app.services.sasha import SashaService
+
+router = APIRouter(route_class=DishkaRoute)
+
+
+def check_admin(settings: ProdAppSettings, token: str | None) -> None:
+    expected = settings.ADMIN_TOKEN
+    if expected is None:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not token or not secrets.compare_digest(token, expected.get_secret_value()):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+
+@router.post("/admin/profile")
+async def _(
+        settings: FromDishka[ProdAppSettings],
+        bitrix: FromDishka[BitrixAsync],
+        sasha: FromDishka[SashaService],
+        bot: FromDishka[Bot],
+        x_admin_token: str | None = Header(default=None),
+        seconds: float | None = Query(default=None, gt=0, le=600, description="профиль цикла событий на N секунд"),
+        task: str | None = Query(default=None, description="задача по метке sync_task_seconds, например load_deals_to_sasha"),
+        webhooks: Literal["deal", "lead", "any"] | None = Query(default=None, description="обработка результатов звонков"),
+        runs: int = Query(default=1, ge=1, le=100, description="сколько запусков задачи или вебхуков профилировать"),
+        timeout: float = Query(default=600, gt=0, le=3600, description="сколько ждать запусков, с"),
+        interval: float = Query(default=0.005, ge=0.001, le=1, description="шаг сэмплирования, с"),
+):
+    """
+    Профиль процесса, принявшего запрос, в формате speedscope (открывается на https://www.speedscope.app).
+
+    Ровно один режим: seconds, task или webhooks. Задачи синхронизации выполняет лидер,
+    при нескольких воркерах профиль задачи снимается только в нем (в остальных запрос уйдет по таймауту пустым).
+    В поле awaits - время ожидания Битрикс (с лимитером), Саши и Телеграма по каждому запуску.
+    """
+    check_admin(settings, x_admin_token)
+    if sum(mode is not None for mode in (seconds, task, webhooks)) != 1:
+        raise HTTPException(status_code=422, detail="Exactly one of seconds, task, webhooks is required")
+
+    patches = [(bitrix.srh, "request_attempt", "bitrix"), (sasha, "_post", "sasha"), (bot.session, "make_request", "telegram")]
+    try:
+        if seconds is not None:
+            profile = await PROFILER.profile("seconds", 1, seconds=seconds, interval=interval, patches=patches)
+        elif task is not None:
+            profile = await PROFILER.profile(
+                "task", runs, name=task, timeout=timeout, interval=interval, patches=patches,
+            )
+        else:
+            profile = await PROFILER.profile(
+                "webhook", runs, name=None if webhooks == "any" else webhooks,
+                timeout=timeout, interval=interval, patches=patches,
+            )
+    except ProfilerBusy:
+        raise HTTPException(status_code=409, detail="Profiling is already running")
+
+    return JSONResponse(
+        content=profile,
+        headers={"Content-Disposition": 'attachment; filename="profile.speedscope.json"'},
+    )
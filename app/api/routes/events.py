@@ -0,0 +1,47 @@
+from dishka.integrations.fastapi import (
+    DishkaRoute, FromDishka
+)
+from fastapi import APIRouter, HTTPException, Request
+
+from app.core.settings.production import ProdAppSettings
+from app.services.bitrix import BitrixService
+from app.services.push import PushSync
+
+router = APIRouter(route_class=DishkaRoute)
+
+CONTACT_EVENTS = ("ONCRMCONTACTUPDATE", "ONCRMCONTACTDELETE")
+LEAD_EVENTS = ("ONCRMLEADADD", "ONCRMLEADUPDATE")
+DEAL_EVENTS = ("ONCRMDEALUPDATE",)
+DELETE_EVENTS = {"ONCRMDEALDELETE": "deal", "ONCRMLEADDELETE": "lead"}
+
+
+@router.post("/bitrix/events")
+async def _(
+        request: Request,
+        bitrix: FromDishka[BitrixService],
+        push: FromDishka[PushSync],
+        settings: FromDishka[ProdAppSettings],
+):
+    """Исходящие события Битрикс24 (application/x-www-form-urlencoded)."""
+    form = await request.form()
+
+    token = settings.BITRIX24_EVENTS_TOKEN
+    if token and form.get("auth[application_token]") != token.get_secret_value():
+        raise HTTPException(status_code=403, detail="Invalid application token")
+
+    event = str(form.get("event", "")).upper()
+    entity_id = form.get("data[FIELDS][ID]")
+
+    if event in CONTACT_EVENTS and entity_id:
+        bitrix.invalidate_contact(str(entity_id))
+
+    if event in DELETE_EVENTS and entity_id and bitrix.mirror:
+        await bitrix.mirror.delete(DELETE_EVENTS[event], str(entity_id))
+
+    if settings.BITRIX24_PUSH_ENABLED and entity_id:
+        if event in LEAD_EVENTS:
+            push.leads.touch(str(entity_id))
+        elif event in DEAL_EVENTS:
+            push.deal_updated(str(entity_id))
+
+    return {"event": event, "id": entity_id}
@@ -0,0 +1,24 @@
+from dishka.integrations.fastapi import (
+    DishkaRoute, FromDishka
+)
+from fastapi import APIRouter
+from fastapi.responses import Response
+from prometheus_client import CONTENT_TYPE_LATEST
+
+from app.core.metrics import DEAD_LETTERS, QUEUE_DEPTH, render
+from app.services.deadletter import DeadLetterStore
+from app.services.queue import SQLiteQueue
+
+router = APIRouter(route_class=DishkaRoute)
+
+
+@router.get("/metrics")
+async def _(queue: FromDishka[SQLiteQueue], dead_letters: FromDishka[DeadLetterStore]):
+    # глубину очередей считаем в момент сбора, опустевшие очереди пропадают из GROUP BY
+    QUEUE_DEPTH.clear()
+    for name, depth in (await queue.depths()).items():
+        QUEUE_DEPTH.labels(queue=name).set(depth)
+    DEAD_LETTERS.clear()
+    for kind, count in (await dead_letters.counts()).items():
+        DEAD_LETTERS.labels(kind=kind).set(count)
+    return Response(content=render(), media_type=CONTENT_TYPE_LATEST)
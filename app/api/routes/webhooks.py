@@ -1,18 +1,33 @@
-import enum
-from typing import Any
+from typing import Any, NamedTuple
 
-from aiogram import Bot
+import structlog
 from aiogram.utils.formatting import TextLink
 from dishka.integrations.fastapi import (
     DishkaRoute, FromDishka
 )
 from fast_bitrix24 import BitrixAsync
-from fastapi import APIRouter
-
-from app.models.sasha import CallResultEvent, DealFieldsEnum
+from fast_bitrix24.utils import http_build_query
+from fastapi import APIRouter, Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse, Response
+from pydantic import ValidationError
+
+from app.core.metrics import WEBHOOK_SECONDS, track
+from app.core.profiling import profiled
+from app.core.settings.production import ProdAppSettings
+from app.models.sasha import CallResultEventLite, DealFieldsEnum
+from app.services.deadletter import DeadLetterStore
+from app.services.capture import TrafficCapture
+from app.services.dedup import EventDeduplicator
+from app.services.limiter import Priority, priority_lane
+from app.services.notifications import NotificationOutbox
+from app.services.queue import SQLiteQueue
+from app.services.transitions import move_command
 
 router = APIRouter(route_class=DishkaRoute)
 
+logger = structlog.get_logger()
+
 
 
 class CallbackTexts:
@@ -31,7 +46,7 @@ class CallbackTexts:
     }
 
     @classmethod
-    def format_message(cls, result: CallResultEvent, message_type: str) -> str:
+    def format_message(cls, result: CallResultEventLite, message_type: str) -> str:
         if message_type not in cls.MESSAGES:
             raise ValueError(f"Unknown message type: {message_type}")
 
@@ -54,24 +69,46 @@ class CallbackTexts:
         return "\n".join(text_parts)
 
     @classmethod
-    def call_failed(cls, result: CallResultEvent):
+    def call_failed(cls, result: CallResultEventLite):
         return cls.format_message(result, 'failed')
 
     @classmethod
-    def call_recall(cls, result: CallResultEvent):
+    def call_recall(cls, result: CallResultEventLite):
         return cls.format_message(result, 'recall')
 
     @classmethod
-    def call_unsuccess(cls, result: CallResultEvent):
+    def call_unsuccess(cls, result: CallResultEventLite):
         return cls.format_message(result, 'unsuccess')
 
     @classmethod
-    def call_success(cls, result: CallResultEvent):
+    def call_success(cls, result: CallResultEventLite):
         return cls.format_message(result, 'success')
 
 
-async def process_deal(result, bot, bitrix):
-    facts = result.call.agreements.client_facts
+def call_comment(result: CallResultEventLite, entity_id: str, entity_type: str) -> tuple[str, dict]:
+    return (
+        "crm.timeline.comment.add",
+        {
+            "fields": {
+                "ENTITY_ID": entity_id,
+                "ENTITY_TYPE": entity_type,
+                "COMMENT":
+                    f"Дата звонка: {result.call.started_at.strftime("%d.%m %H:%M")}\n"
+                    f"С номера: {result.call.call_details.from_phone} На: {result.call.call_details.to_phone}\n"
+                    f"Аудио: {result.call.record_url}\n"
+                    f"Текст:\n{result.call.call_details.history_as_string()}",
+            }
+        },
+    )
+
+
+class ResultActions(NamedTuple):
+    """Что сделать по результату звонка: команды Битрикс (comment, update) и уведомление после них."""
+    commands: dict[str, tuple[str, dict]]
+    notification: str | None = None
+
+
+def deal_actions(result: CallResultEventLite) -> ResultActions:
     record_file_url = result.call.record_url
     deal_id = result.contact.deal_id
     title = result.contact.title
@@ -80,22 +117,10 @@ async def process_deal(result, bot, bitrix):
         print(
             f"Deal id is not provided, can not update"
         )
-        return
+        return ResultActions({})
+    commands = {}
     if record_file_url:
-        await bitrix.call(
-            "crm.timeline.comment.add",
-            {
-                "fields": {
-                    "ENTITY_ID": deal_id,
-                    "ENTITY_TYPE": "deal",
-                    "COMMENT":
-                        f"Дата звонка: {result.call.started_at.strftime("%d.%m %H:%M")}\n"
-                        f"С номера: {result.call.call_details.from_phone} На: {result.call.call_details.to_phone}\n"
-                        f"Аудио: {record_file_url}\n"
-                        f"Текст:\n{result.call.call_details.history_as_string()}",
-                }
-            },
-        )
+        commands["comment"] = call_comment(result, deal_id, "deal")
 
     if result.call.status == "failed":
         session = result.call.call_session
@@ -103,24 +128,9 @@ async def process_deal(result, bot, bitrix):
         print(f"Недозвон {session.attempts_left}")
 
         if session.attempts_left == 0:
-            await bot.send_message(
-                chat_id="-1003363598566",
-                text=CallbackTexts.call_failed(result),
-                parse_mode="HTML"
-            )
-            await bitrix.call(
-                "crm.item.update",
-                {
-                    "entityTypeId": 2,
-                    "id": result.contact.deal_id,
-                    "fields": {
-                        "STAGE_ID": "C27:APOLOGY",
-                        "CATEGORY_ID": "27"
-                    },
-                },
-            )
-            return
-        return
+            commands["update"] = move_command(deal_id, {"STAGE_ID": "C27:APOLOGY", "CATEGORY_ID": "27"})
+            return ResultActions(commands, CallbackTexts.call_failed(result))
+        return ResultActions(commands)
 
     if result.call.agreements.lead_transfer.all_data.get("callback_required"):
         ftu = {
@@ -128,20 +138,8 @@ async def process_deal(result, bot, bitrix):
             "CATEGORY_ID": "27",
             DealFieldsEnum.interaction: result.call.agreements.client_facts
         }
-        await bot.send_message(
-            chat_id="-1003363598566",
-            text=CallbackTexts.call_recall(result),
-            parse_mode="HTML"
-        )
-        await bitrix.call(
-            "crm.item.update",
-            {
-                "entityTypeId": 2,
-                "id": deal_id,
-                "fields": ftu
-            },
-        )
-        return
+        commands["update"] = move_command(deal_id, ftu)
+        return ResultActions(commands, CallbackTexts.call_recall(result))
 
     elif not result.call.agreements.is_commit:
         ftu = {
@@ -149,21 +147,8 @@ async def process_deal(result, bot, bitrix):
             "CATEGORY_ID": "27",
             DealFieldsEnum.interaction: result.call.agreements.client_facts
         }
-        await bot.send_message(
-            chat_id="-1003363598566",
-            text=CallbackTexts.call_unsuccess(result),
-            parse_mode="HTML"
-        )
-
-        await bitrix.call(
-            "crm.item.update",
-            {
-                "entityTypeId": 2,
-                "id": deal_id,
-                "fields": ftu
-            },
-        )
-        return None
+        commands["update"] = move_command(deal_id, ftu)
+        return ResultActions(commands, CallbackTexts.call_unsuccess(result))
 
     ftu = {
         "TITLE": "ПРОГРЕВ ВЫПОЛНЕН " + title,
@@ -171,22 +156,11 @@ async def process_deal(result, bot, bitrix):
         "CATEGORY_ID": "27",
         DealFieldsEnum.interaction: result.call.agreements.client_facts
     }
-    await bitrix.call(
-        "crm.deal.update",
-        {
-            "id": deal_id,
-            "fields": ftu,
-        },
-    )
-    await bot.send_message(
-        chat_id="-1003363598566",
-        text=CallbackTexts.call_success(result),
-        parse_mode="HTML"
-    )
-    return None
+    commands["update"] = ("crm.deal.update", {"id": deal_id, "fields": ftu})
+    return ResultActions(commands, CallbackTexts.call_success(result))
 
 
-async def process_lead(result, bot, bitrix):
+def lead_actions(result: CallResultEventLite) -> ResultActions:
     facts = result.call.agreements.client_facts
     record_file_url = result.call.record_url
     lead_id = result.contact.lead_id
@@ -196,110 +170,151 @@ async def process_lead(result, bot, bitrix):
         print(
             f"Lead id is not provided, can not update"
         )
-        return
+        return ResultActions({})
+    commands = {}
     if record_file_url:
-        await bitrix.call(
-            "crm.timeline.comment.add",
-            {
-                "fields": {
-                    "ENTITY_ID": lead_id,
-                    "ENTITY_TYPE": "lead",
-                    "COMMENT":
-                        f"Дата звонка: {result.call.started_at.strftime("%d.%m %H:%M")}\n"
-                        f"С номера: {result.call.call_details.from_phone} На: {result.call.call_details.to_phone}\n"
-                        f"Аудио: {record_file_url}\n"
-                        f"Текст:\n{result.call.call_details.history_as_string()}",
-                }
-            },
-        )
+        commands["comment"] = call_comment(result, lead_id, "lead")
+
     if result.call.status == "failed":
         session = result.call.call_session
 
         print(f"Недозвон {session.attempts_left}")
         if session.attempts_left == 0:
-            await bot.send_message(
-                chat_id="-1003363598566",
-                text=f"❌ 3 недозвона по лиду!\n\n{facts if facts else ""}\n\n{TextLink("Ссылка", url=record_file_url).as_html()}",
-                parse_mode="HTML"
-            )
-            await bitrix.call(
-                "crm.lead.update",
-                {
-                    "id": lead_id,
-                    "fields": {
-                        "STATUS_ID": "UC_LLR3RD",
-                    },
-                },
+            commands["update"] = ("crm.lead.update", {"id": lead_id, "fields": {"STATUS_ID": "UC_LLR3RD"}})
+            return ResultActions(
+                commands,
+                f"❌ 3 недозвона по лиду!\n\n{facts if facts else ""}\n\n{TextLink("Ссылка", url=record_file_url).as_html()}",
             )
-            return
-        return
+        return ResultActions(commands)
 
     if result.call.agreements.lead_transfer.all_data.get("callback_required"):
         ftu = result.call.agreements.as_fields(mode="lead")
         ftu["STATUS_ID"] = "UC_LLR3RD"
-        await bot.send_message(
-            chat_id="-1003363598566",
-            text=CallbackTexts.call_recall(result),
-            parse_mode="HTML"
-        )
-        await bitrix.call(
-            "crm.lead.update",
-            {
-                "id": lead_id,
-                "fields": ftu,
-            },
-        )
-        return
+        commands["update"] = ("crm.lead.update", {"id": lead_id, "fields": ftu})
+        return ResultActions(commands, CallbackTexts.call_recall(result))
     elif not result.call.agreements.is_commit:
-        await bot.send_message(
-            chat_id="-1003363598566",
-            text=CallbackTexts.call_failed(result),
-            parse_mode="HTML"
-        )
-        await bitrix.call(
-            "crm.lead.update",
-            {
-                "id": lead_id,
-                "fields": {
-                    "STATUS_ID": "UC_LLR3RD",
-
-                },
-            },
-        )
-        return
+        commands["update"] = ("crm.lead.update", {"id": lead_id, "fields": {"STATUS_ID": "UC_LLR3RD"}})
+        return ResultActions(commands, CallbackTexts.call_failed(result))
 
     ftu = result.call.agreements.as_fields(mode="lead")
     ftu["TITLE"] = title
     ftu["STATUS_ID"] = "UC_DT372Z"  # Стадия квалификация, данные заполнены
-    await bitrix.call(
-        "crm.lead.update",
-        {
-            "id": lead_id,
-            "fields": ftu,
-        },
-    )
+    commands["update"] = ("crm.lead.update", {"id": lead_id, "fields": ftu})
+    return ResultActions(commands, CallbackTexts.call_success(result))
 
-    await bot.send_message(
-        chat_id="-1003363598566",
-        text=CallbackTexts.call_success(result),
-        parse_mode="HTML",
-    )
-    return None
+
+def step_key(result: CallResultEventLite, step: str) -> str:
+    return f"step:{result.id}:{step}"
+
+
+async def process_result(
+        result: CallResultEventLite, notifier: NotificationOutbox, bitrix: BitrixAsync, steps: EventDeduplicator,
+):
+    """
+    Обработка результата звонка, которую можно повторять (очередь, dead letters, повтор доставки Сашей).
+
+    Комментарий и изменение сделки или лида уходят одним batch, уведомление - только после них.
+    Выполненные шаги отмечаются по result.id, повтор делает только оставшиеся:
+    комментарий и сообщение в Телеграм не дублируются.
+    """
+    kind = "deal" if result.contact.deal_id else "lead"
+    with priority_lane(Priority.INTERACTIVE), track(WEBHOOK_SECONDS, kind=kind), profiled("webhook", kind):
+        actions = deal_actions(result) if kind == "deal" else lead_actions(result)
+        keys = {step: step_key(result, step) for step in [*actions.commands, "notify"]}
+        done = await steps.completed(*keys.values())
+        commands = {step: command for step, command in actions.commands.items() if keys[step] not in done}
+        if commands:
+            response = await bitrix.call("batch", {
+                "halt": 0,
+                "cmd": {step: f"{method}?{http_build_query(params)}" for step, (method, params) in commands.items()},
+            }, raw=True)
+            batch = response.get("result") or {}
+            results, errors = batch.get("result") or {}, batch.get("result_error") or {}
+            written = [keys[step] for step in commands if step in results and step not in errors]
+            if written:
+                await steps.complete(*written)
+            if len(written) != len(commands):
+                raise RuntimeError(f"Call result {result.id} Bitrix update failed: {errors}")
+        if actions.notification and keys["notify"] not in done:
+            await notifier.send(actions.notification)
+            await steps.complete(keys["notify"])
+
+
+async def consume_results(
+        queue: SQLiteQueue,
+        notifier: NotificationOutbox,
+        bitrix: BitrixAsync,
+        steps: EventDeduplicator,
+        max_attempts: int,
+        dead_letters: DeadLetterStore | None = None,
+):
+    """Обработчик очереди результатов звонков, запускается пулом в lifespan."""
+    while True:
+        item_id, payload, attempt = await queue.get()
+        try:
+            result = CallResultEventLite.model_validate_json(payload)
+            await process_result(result, notifier, bitrix, steps)
+        except Exception as e:
+            if attempt >= max_attempts:
+                logger.error("Call result dropped after retries", item_id=item_id, attempt=attempt, error=str(e))
+                if dead_letters:
+                    await dead_letters.put("webhooks", {"body": bytes(payload).decode()}, str(e))
+                await queue.ack(item_id)
+            else:
+                logger.warning("Call result processing failed", item_id=item_id, attempt=attempt, error=str(e))
+                await queue.nack(item_id, delay=2 ** attempt)
+            continue
+        await queue.ack(item_id)
+
+
+async def replay_result(
+        payload: dict, notifier: NotificationOutbox, bitrix: BitrixAsync, steps: EventDeduplicator,
+) -> None:
+    """Повтор результата звонка из dead_letters."""
+    await process_result(CallResultEventLite.model_validate_json(payload["body"]), notifier, bitrix, steps)
+
+
+def dedup_keys(result: CallResultEventLite) -> tuple[str, str]:
+    return f"event:{result.id}", f"call:{result.call.id}"
+
+
+@router.get("/webhooks/stats")
+async def _(dedup: FromDishka[EventDeduplicator]):
+    return {"duplicates_dropped": dedup.duplicates_dropped}
 
 
 @router.post("/webhooks/{webhook_id}")
 async def _(
-        data: dict,
-        bot: FromDishka[Bot],
+        request: Request,
+        notifier: FromDishka[NotificationOutbox],
         bitrix: FromDishka[BitrixAsync],
+        settings: FromDishka[ProdAppSettings],
+        dedup: FromDishka[EventDeduplicator],
         webhook_id: Any
 ):
-    print(data)
-    print("\n\n")
-    result = CallResultEvent(**data)
-    print(result)
-    if result.contact.deal_id:
-        await process_deal(result, bot, bitrix)
-    else:
-        await process_lead(result, bot, bitrix)
-    return data
+    # запись трафика и очередь берутся из контейнера, только если включены: выключенные не создаются вовсе
+    container = request.state.dishka_container
+    # тело разбирается один раз прямо из байтов и только в нужные обработке поля
+    body = await request.body()
+    if settings.WEBHOOK_CAPTURE_DIR:
+        (await container.get(TrafficCapture)).record(webhook_id, body)
+    try:
+        result = CallResultEventLite.model_validate_json(body)
+    except ValidationError as e:
+        raise RequestValidationError(e.errors())
+
+    # Саша повторяет доставку по таймауту - повтор не должен второй раз писать в Битрикс и Телеграм
+    if await dedup.is_duplicate(*dedup_keys(result)):
+        return {"id": result.id, "duplicate": True}
+
+    if settings.WEBHOOK_QUEUE_ENABLED:
+        await (await container.get(SQLiteQueue)).put(body)
+        return JSONResponse(status_code=202, content={"id": result.id})
+
+    logger.info("Call result received", id=result.id, deal_id=result.contact.deal_id, lead_id=result.contact.lead_id)
+    try:
+        await process_result(result, notifier, bitrix, dedup)
+    except Exception:
+        await dedup.forget(*dedup_keys(result))
+        raise
+    return Response(content=body, media_type="application/json")
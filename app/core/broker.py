@@ -0,0 +1,102 @@
+import asyncio
+import time
+from collections.abc import AsyncGenerator
+from functools import partial
+from typing import Any
+
+import structlog
+from taskiq import AckableMessage, AsyncBroker, AsyncResultBackend, InMemoryBroker, TaskiqResult
+from taskiq.message import BrokerMessage
+
+from app.core.settings.production import ProdAppSettings
+from app.core.sqlite import SQLiteStore
+from app.services.queue import SQLiteQueue
+
+logger = structlog.get_logger(service="SQLiteBroker")
+
+
+class SQLiteBroker(AsyncBroker):
+    """
+    Брокер taskiq поверх SQLiteQueue: задачи переживают рестарт и
+    выполняются отдельными процессами `taskiq worker app.main:broker`.
+
+    Пока задача выполняется, воркер раз в visibility_timeout / 3 секунд продлевает ее скрытие,
+    поэтому долгая задача не выдается второму воркеру. visibility_timeout - только время,
+    через которое задача упавшего воркера достанется другому.
+    """
+
+    def __init__(self, path: str, queue_name: str = "taskiq", visibility_timeout: float = 900):
+        super().__init__()
+        self.queue = SQLiteQueue(path, name=queue_name, visibility_timeout=visibility_timeout)
+        self._heartbeats: set[asyncio.Task] = set()
+
+    async def kick(self, message: BrokerMessage) -> None:
+        await self.queue.put(message.message)
+
+    async def _heartbeat(self, item_id: int) -> None:
+        while True:
+            await asyncio.sleep(self.queue.visibility_timeout / 3)
+            try:
+                await self.queue.touch(item_id)
+            except Exception as e:
+                # следующая попытка успеет до конца visibility_timeout
+                logger.warning("Task lease extension failed", item_id=item_id, error=str(e))
+
+    async def _ack(self, item_id: int, heartbeat: asyncio.Task) -> None:
+        heartbeat.cancel()
+        await self.queue.ack(item_id)
+
+    async def listen(self) -> AsyncGenerator[AckableMessage, None]:
+        while True:
+            item_id, payload, _ = await self.queue.get()
+            heartbeat = asyncio.create_task(self._heartbeat(item_id))
+            self._heartbeats.add(heartbeat)
+            heartbeat.add_done_callback(self._heartbeats.discard)
+            yield AckableMessage(data=payload, ack=partial(self._ack, item_id, heartbeat))
+
+    async def shutdown(self) -> None:
+        # неподтвержденные задачи вернутся в очередь через visibility_timeout
+        for heartbeat in list(self._heartbeats):
+            heartbeat.cancel()
+        await super().shutdown()
+
+
+class SQLiteResultBackend(SQLiteStore, AsyncResultBackend[Any]):
+    """Результаты задач для SQLiteBroker, хранятся result_ttl секунд."""
+
+    schema = """
+        CREATE TABLE IF NOT EXISTS task_results (
+            task_id TEXT PRIMARY KEY,
+            result TEXT NOT NULL,
+            created_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS ix_task_results_created ON task_results (created_at);
+    """
+
+    def __init__(self, path: str, result_ttl: float = 3600):
+        super().__init__(path)
+        self.result_ttl = result_ttl
+
+    async def set_result(self, task_id: str, result: TaskiqResult[Any]) -> None:
+        now = time.time()
+        await self.execute(
+            "INSERT OR REPLACE INTO task_results (task_id, result, created_at) VALUES (?, ?, ?)",
+            (task_id, result.model_dump_json(), now),
+        )
+        await self.execute("DELETE FROM task_results WHERE created_at < ?", (now - self.result_ttl,))
+
+    async def is_result_ready(self, task_id: str) -> bool:
+        rows = await self.execute("SELECT 1 FROM task_results WHERE task_id = ?", (task_id,))
+        return bool(rows)
+
+    async def get_result(self, task_id: str, with_logs: bool = False) -> TaskiqResult[Any]:
+        rows = await self.execute("SELECT result FROM task_results WHERE task_id = ?", (task_id,))
+        return TaskiqResult.model_validate_json(rows[0][0])
+
+
+def get_broker(settings: ProdAppSettings) -> AsyncBroker:
+    if settings.TASKIQ_BROKER == "sqlite":
+        return SQLiteBroker(
+            settings.SQLITE_PATH, visibility_timeout=settings.TASKIQ_VISIBILITY_TIMEOUT,
+        ).with_result_backend(SQLiteResultBackend(settings.SQLITE_PATH))
+    return InMemoryBroker()
@@ -0,0 +1,146 @@
+import asyncio
+import os
+import socket
+import sqlite3
+import time
+import uuid
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable
+
+import structlog
+
+from app.core.metrics import SCHEDULER_LEADER
+from app.core.sqlite import SQLiteStore
+
+logger = structlog.get_logger(service="LeaderLease")
+
+LEASES_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS leases (
+        name TEXT PRIMARY KEY,
+        holder TEXT NOT NULL,
+        expires_at REAL NOT NULL
+    );
+"""
+
+
+def process_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def acquire_lease(conn: sqlite3.Connection, name: str, holder: str, ttl: float) -> bool:
+    """Взять свободную или просроченную аренду name, либо продлить свою."""
+    now = time.time()
+    # одна инструкция - атомарно
+    cursor = conn.execute(
+        """
+        INSERT INTO leases (name, holder, expires_at) VALUES (?, ?, ?)
+        ON CONFLICT (name) DO UPDATE SET holder = excluded.holder, expires_at = excluded.expires_at
+        WHERE leases.holder = excluded.holder OR leases.expires_at < ?
+        """,
+        (name, holder, now + ttl, now),
+    )
+    return cursor.rowcount == 1
+
+
+def release_lease(conn: sqlite3.Connection, name: str, holder: str) -> None:
+    conn.execute("DELETE FROM leases WHERE name = ? AND holder = ?", (name, holder))
+
+
+class LeaderLease(SQLiteStore):
+    """
+    Выбор лидера среди процессов с общей SQLite-базой (uvicorn --workers N, несколько контейнеров на одном томе).
+
+    Лидер держит аренду name и продлевает ее каждые heartbeat секунд.
+    Если аренду не продлили за ttl секунд (процесс упал или завис), ее забирает другой процесс.
+    Лидер, не сумевший продлить аренду, сразу перестает им быть.
+    """
+
+    schema = LEASES_SCHEMA
+
+    def __init__(self, path: str, name: str = "scheduler", ttl: float = 30, heartbeat: float | None = None):
+        super().__init__(path)
+        self.name = name
+        self.ttl = ttl
+        self.heartbeat = heartbeat or ttl / 3
+        self.holder = process_id()
+        self.is_leader = False
+
+    def _try_acquire(self) -> bool:
+        return acquire_lease(self.conn, self.name, self.holder, self.ttl)
+
+    def _release(self) -> None:
+        release_lease(self.conn, self.name, self.holder)
+
+    async def campaign(
+            self,
+            on_elected: Callable[[], Awaitable[None]],
+            on_deposed: Callable[[], Awaitable[None]],
+    ) -> None:
+        """
+        Бесконечный цикл выборов: on_elected - когда процесс стал лидером, on_deposed - когда перестал.
+        При отмене аренда освобождается, чтобы другой процесс подхватил ее без ожидания ttl.
+        """
+        try:
+            while True:
+                try:
+                    leader = await self.run(self._try_acquire)
+                except Exception as e:
+                    logger.error("Failed to renew lease", name=self.name, error=str(e))
+                    leader = False
+
+                if leader != self.is_leader:
+                    self.is_leader = leader
+                    SCHEDULER_LEADER.set(int(leader))
+                    logger.info("Leadership changed", name=self.name, holder=self.holder, leader=leader)
+                    try:
+                        await (on_elected() if leader else on_deposed())
+                    except Exception as e:
+                        logger.error("Leadership callback failed", name=self.name, leader=leader, error=str(e))
+
+                await asyncio.sleep(self.heartbeat)
+        finally:
+            if self.is_leader:
+                self.is_leader = False
+                SCHEDULER_LEADER.set(0)
+                await on_deposed()
+                await self.run(self._release)
+
+
+class LeaseLock(SQLiteStore):
+    """
+    Блокировки между процессами с общей SQLite-базой: аренды lock:<name> в той же таблице, что у LeaderLease.
+
+    hold(name) ждет, пока аренда свободна или просрочена, держит ее, продлевая каждые ttl / 3 секунд,
+    и освобождает на выходе. Каждый hold - отдельный держатель, поэтому блокировка исключает
+    и корутины одного процесса. Аренду упавшего процесса через ttl секунд забирает следующий.
+    """
+
+    schema = LEASES_SCHEMA
+
+    def __init__(self, path: str, ttl: float = 30, poll_interval: float = 0.5):
+        super().__init__(path)
+        self.ttl = ttl
+        self.poll_interval = poll_interval
+        self.process = process_id()
+
+    async def _renew(self, name: str, holder: str) -> None:
+        while True:
+            await asyncio.sleep(self.ttl / 3)
+            try:
+                if not await self.run(acquire_lease, self.conn, name, holder, self.ttl):
+                    logger.error("Lock lease lost", name=name, holder=holder)
+            except Exception as e:
+                logger.error("Failed to renew lock lease", name=name, error=str(e))
+
+    @asynccontextmanager
+    async def hold(self, name: str) -> AsyncIterator[None]:
+        name = f"lock:{name}"
+        holder = f"{self.process}:{uuid.uuid4().hex[:8]}"
+        while not await self.run(acquire_lease, self.conn, name, holder, self.ttl):
+            await asyncio.sleep(self.poll_interval)
+        renewal = asyncio.create_task(self._renew(name, holder))
+        try:
+            yield
+        finally:
+            renewal.cancel()
+            await self.run(release_lease, self.conn, name, holder)
@@ -0,0 +1,94 @@
+import os
+import time
+from collections.abc import Awaitable
+from contextlib import contextmanager
+
+from prometheus_client import REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+
+from app.core.profiling import profiled
+
+# Метрики Prometheus. Запись - поиск дочерней метрики по меткам и сложение под локом,
+# так что их можно держать включенными в проде.
+# Если задан PROMETHEUS_MULTIPROC_DIR, /metrics собирает метрики всех процессов (taskiq worker и uvicorn).
+
+BITRIX_REQUEST_SECONDS = Histogram(
+    "bitrix_request_seconds", "HTTP-запрос к Битрикс без ожидания лимитера",
+    ["method", "outcome"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+BITRIX_LIMITER_WAIT_SECONDS = Histogram(
+    "bitrix_limiter_wait_seconds", "Ожидание места в пуле BitrixRateLimiter",
+    ["priority"],
+    buckets=(0.001, 0.01, 0.1, 0.5, 1, 5, 15, 60, 300),
+)
+
+TASK_SECONDS = Histogram(
+    "sync_task_seconds", "Длительность задач синхронизации",
+    ["task", "outcome"],
+    buckets=(0.5, 1, 5, 10, 30, 60, 120, 300, 600, 1800),
+)
+TASK_ITEMS = Counter("sync_task_items", "Сущностей, обработанных задачами синхронизации", ["task"])
+TASK_INTERVAL = Gauge(
+    "sync_task_interval_seconds", "Текущий интервал задачи в режиме SCHEDULER_MODE=adaptive",
+    ["task"], multiprocess_mode="livemax",
+)
+
+SASHA_UPLOAD_SECONDS = Histogram(
+    "sasha_upload_seconds", "Загрузка контактов в Сашу (все части одного add_contacts)",
+    ["outcome"],
+    buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300),
+)
+SASHA_UPLOAD_CONTACTS = Histogram(
+    "sasha_upload_contacts", "Контактов в одном add_contacts",
+    buckets=(1, 10, 50, 100, 500, 1000, 5000, 10000, 50000),
+)
+SASHA_CHUNK_BYTES = Histogram(
+    "sasha_chunk_bytes", "Размер тела запроса одной части (после gzip, если включен)",
+    buckets=(1e3, 1e4, 5e4, 1e5, 5e5, 1e6, 5e6, 1e7),
+)
+
+WEBHOOK_SECONDS = Histogram(
+    "webhook_processing_seconds", "Обработка результата звонка",
+    ["kind", "outcome"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+WEBHOOK_DUPLICATES = Counter("webhook_duplicates", "Отброшенных повторных доставок событий")
+
+SCHEDULER_LEADER = Gauge(
+    "scheduler_leader", "1 у процесса, который сейчас запускает планировщик", multiprocess_mode="livesum"
+)
+
+QUEUE_DEPTH = Gauge("queue_depth", "Элементов в очередях SQLiteQueue", ["queue"], multiprocess_mode="livemax")
+DEAD_LETTERS = Gauge("dead_letters", "Неотправленных вызовов в DeadLetterStore", ["kind"], multiprocess_mode="livemax")
+CIRCUIT_STATE = Gauge(
+    "circuit_state", "Предохранитель внешнего API: 0 - замкнут, 1 - пробный вызов, 2 - разомкнут",
+    ["endpoint"], multiprocess_mode="livemax",
+)
+
+
+@contextmanager
+def track(histogram: Histogram, **labels: str):
+    """Замерить блок в histogram с меткой outcome: ok или error."""
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        histogram.labels(**labels, outcome=outcome).observe(time.perf_counter() - start)
+
+
+async def track_task(task: str, run: Awaitable[int | None]) -> int:
+    """Выполнить задачу синхронизации, записать длительность и число обработанных сущностей."""
+    with track(TASK_SECONDS, task=task), profiled("task", task):
+        items = await run or 0
+    TASK_ITEMS.labels(task=task).inc(items)
+    return items
+
+
+def render() -> bytes:
+    registry = REGISTRY
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry)
@@ -0,0 +1,332 @@
+import asyncio
+import contextvars
+import functools
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from types import CodeType, FrameType
+from typing import Any, Awaitable, Callable, Iterator, Literal
+
+import structlog
+
+logger = structlog.get_logger(service="Profiler")
+
+ProfileKind = Literal["seconds", "task", "webhook"]
+
+_NO_PROFILE = nullcontext()
+_target: contextvars.ContextVar["ProfileTarget | None"] = contextvars.ContextVar("profile_target", default=None)
+
+
+class ProfilerBusy(Exception):
+    pass
+
+
+class ProfileTarget:
+    """Профилируемая единица: цикл событий целиком, один запуск задачи или одна обработка вебхука."""
+
+    def __init__(self, name: str, task: asyncio.Task | None):
+        self.name = name
+        self.task = task
+        self.started = time.perf_counter()
+        self.ended: float | None = None
+        self.samples: list[list[int]] = []
+        self.weights: list[float] = []
+        # внешний API -> [секунд в ожидании, вызовов]
+        self.awaits: dict[str, list[float]] = defaultdict(lambda: [0.0, 0])
+
+    @property
+    def active(self) -> bool:
+        return self.ended is None
+
+
+async def _awaited(endpoint: str, session: "ProfileSession", call: Callable[..., Awaitable], *args, **kwargs):
+    # имя endpoint читает сэмплер из f_locals: в стеке эта рамка становится "[await endpoint]"
+    start = time.perf_counter()
+    try:
+        return await call(*args, **kwargs)
+    finally:
+        session.awaited(endpoint, time.perf_counter() - start)
+
+
+class ProfileSession:
+    """
+    Сэмплирующий профиль по стенным часам и учет ожидания внешних API.
+
+    Отдельный поток раз в interval секунд снимает стек: в режиме seconds - потока цикла событий
+    (простой в select - "[idle]"), в режимах task и webhook - каждой профилируемой asyncio-задачи:
+    у выполняющейся - стек потока, у ждущей - цепочка cr_await ее корутин до "[await ...]".
+    На время сессии вызовы Битрикс, Саши и Телеграма подменяются обертками, которые считают время ожидания
+    (для Битрикс - вместе с ожиданием лимитера); вне сессии ни сэмплера, ни оберток нет.
+    """
+
+    def __init__(self, kind: ProfileKind, name: str | None, count: int, interval: float = 0.005):
+        self.kind = kind
+        self.name = name
+        self.remaining = count
+        self.interval = interval
+
+        self.loop = asyncio.get_running_loop()
+        self.loop_thread = threading.get_ident()
+        self.started = time.perf_counter()
+        self.targets: list[ProfileTarget] = []
+        # ожидания вне профилируемых задач (например, отправка уведомлений фоновым воркером)
+        self.background = ProfileTarget("background", None)
+        if kind == "seconds":
+            self.targets.append(ProfileTarget("event loop", None))
+
+        self.frames: list[dict] = []
+        self._frame_index: dict[tuple, int] = {}
+        self.done = asyncio.Event()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._sampler: threading.Thread | None = None
+        self._patched: list[tuple[object, str, Any, bool]] = []
+
+    # --- подмена вызовов внешних API
+
+    def patch(self, obj: object, attr: str, endpoint: str) -> None:
+        original = getattr(obj, attr)
+        had_own = attr in vars(obj)
+        setattr(obj, attr, functools.partial(_awaited, endpoint, self, original))
+        self._patched.append((obj, attr, original, had_own))
+
+    def _unpatch(self) -> None:
+        for obj, attr, original, had_own in reversed(self._patched):
+            if had_own:
+                setattr(obj, attr, original)
+            else:
+                delattr(obj, attr)
+        self._patched.clear()
+
+    def awaited(self, endpoint: str, seconds: float) -> None:
+        if self.kind == "seconds":
+            target = self.targets[0]
+        else:
+            target = _target.get()
+            if target is None or not target.active:
+                target = self.background
+        counter = target.awaits[endpoint]
+        counter[0] += seconds
+        counter[1] += 1
+
+    # --- цели
+
+    def wants(self, kind: ProfileKind, name: str) -> bool:
+        return self.kind == kind and self.remaining > 0 and (self.name is None or self.name == name)
+
+    @contextmanager
+    def target(self, name: str) -> Iterator[None]:
+        self.remaining -= 1
+        target = ProfileTarget(name, asyncio.current_task())
+        with self._lock:
+            self.targets.append(target)
+        token = _target.set(target)
+        try:
+            yield
+        finally:
+            _target.reset(token)
+            target.ended = time.perf_counter()
+            if self.remaining <= 0 and all(not t.active for t in self.targets):
+                self.done.set()
+
+    # --- сэмплирование
+
+    def _frame(self, code: CodeType) -> int:
+        key = (code,)
+        index = self._frame_index.get(key)
+        if index is None:
+            index = len(self.frames)
+            self._frame_index[key] = index
+            self.frames.append({
+                "name": code.co_qualname,
+                "file": code.co_filename,
+                "line": code.co_firstlineno,
+            })
+        return index
+
+    def _label(self, name: str) -> int:
+        key = ("label", name)
+        index = self._frame_index.get(key)
+        if index is None:
+            index = len(self.frames)
+            self._frame_index[key] = index
+            self.frames.append({"name": name})
+        return index
+
+    def _frame_id(self, frame: FrameType) -> int:
+        if frame.f_code is _awaited.__code__:
+            return self._label(f"[await {frame.f_locals.get('endpoint')}]")
+        return self._frame(frame.f_code)
+
+    @staticmethod
+    def _thread_stack(frame: FrameType | None) -> list[FrameType]:
+        stack = []
+        while frame is not None:
+            stack.append(frame)
+            frame = frame.f_back
+        stack.reverse()
+        return stack
+
+    def _loop_sample(self, frame: FrameType | None) -> list[int]:
+        stack = self._thread_stack(frame)
+        sample = [self._frame_id(f) for f in stack]
+        if stack and stack[-1].f_code.co_filename.endswith("selectors.py"):
+            sample.append(self._label("[idle]"))
+        return sample
+
+    def _task_sample(self, task: asyncio.Task, frame: FrameType | None) -> list[int]:
+        coro = task.get_coro()
+        root = getattr(coro, "cr_code", None)
+        if asyncio.current_task(self.loop) is task:
+            # выполняется: стек потока, начиная с корневой корутины задачи
+            stack = self._thread_stack(frame)
+            start = next((i for i, f in enumerate(stack) if f.f_code is root), 0)
+            return [self._frame_id(f) for f in stack[start:]]
+        sample = []
+        awaitable = coro
+        while getattr(awaitable, "cr_frame", None) is not None:
+            sample.append(self._frame_id(awaitable.cr_frame))
+            awaitable = awaitable.cr_await
+        if awaitable is not None:
+            # дальше Future (gather, wait, подзадачи) цепочку не пройти - время внутри видно в awaits
+            kind = "future" if type(awaitable).__name__ == "FutureIter" else type(awaitable).__name__
+            sample.append(self._label(f"[await {kind}]"))
+        return sample
+
+    def _sample(self) -> None:
+        frame = sys._current_frames().get(self.loop_thread)
+        with self._lock:
+            targets = [t for t in self.targets if t.active]
+        for target in targets:
+            try:
+                if target.task is None:
+                    sample = self._loop_sample(frame)
+                elif target.task.done():
+                    continue
+                else:
+                    sample = self._task_sample(target.task, frame)
+            except (AttributeError, ValueError, RuntimeError):
+                # корутина сменила состояние посреди обхода - пропускаем отсчет
+                continue
+            target.samples.append(sample)
+            target.weights.append(self.interval)
+
+    def _run_sampler(self) -> None:
+        next_at = time.perf_counter()
+        while not self._stop.is_set():
+            self._sample()
+            next_at += self.interval
+            self._stop.wait(max(0.0, next_at - time.perf_counter()))
+
+    # --- сессия
+
+    def start(self) -> None:
+        self._sampler = threading.Thread(target=self._run_sampler, name="profiler", daemon=True)
+        self._sampler.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._sampler:
+            self._sampler.join()
+        self._unpatch()
+        now = time.perf_counter()
+        for target in self.targets:
+            if target.ended is None:
+                target.ended = now
+
+    def speedscope(self) -> dict:
+        """Профиль в формате speedscope (https://www.speedscope.app), ожидания API - в поле awaits."""
+        profiles = [
+            {
+                "type": "sampled",
+                "name": target.name,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": round(target.ended - target.started, 6),
+                "samples": target.samples,
+                "weights": target.weights,
+            }
+            for target in self.targets
+        ]
+        awaits = {
+            target.name: {
+                "wall_seconds": round(target.ended - target.started, 3),
+                **{
+                    endpoint: {"seconds": round(seconds, 3), "calls": calls}
+                    for endpoint, (seconds, calls) in sorted(target.awaits.items())
+                },
+            }
+            for target in self.targets
+        }
+        if self.background.awaits:
+            awaits["background"] = {
+                endpoint: {"seconds": round(seconds, 3), "calls": calls}
+                for endpoint, (seconds, calls) in sorted(self.background.awaits.items())
+            }
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": f"{self.kind} {self.name or ''}".strip(),
+            "exporter": "bitrix-to-trysasha",
+            "shared": {"frames": self.frames},
+            "profiles": profiles,
+            "awaits": awaits,
+        }
+
+
+class Profiler:
+    """Не больше одной сессии на процесс; задачи и вебхуки отмечаются через profiled."""
+
+    def __init__(self):
+        self.session: ProfileSession | None = None
+
+    async def profile(
+            self,
+            kind: ProfileKind,
+            count: int,
+            name: str | None = None,
+            seconds: float | None = None,
+            timeout: float = 600,
+            interval: float = 0.005,
+            patches: list[tuple[object, str, str]] = (),
+    ) -> dict:
+        """
+        :param kind: seconds - цикл событий seconds секунд, task - count запусков задачи name,
+            webhook - count обработок результатов звонков
+        :param timeout: сколько ждать запусков в режимах task и webhook, потом отдается то, что собрано
+        :param patches: (объект, атрибут, имя API) - асинхронные вызовы, время ожидания которых считается
+        """
+        if self.session is not None:
+            raise ProfilerBusy()
+        session = ProfileSession(kind, name, count, interval)
+        for obj, attr, endpoint in patches:
+            session.patch(obj, attr, endpoint)
+        self.session = session
+        session.start()
+        logger.warning("Profiling started", kind=kind, name=name, count=count, seconds=seconds)
+        try:
+            if kind == "seconds":
+                await asyncio.sleep(seconds)
+            else:
+                try:
+                    await asyncio.wait_for(session.done.wait(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    logger.warning("Profiling timed out", kind=kind, name=name, runs=count - session.remaining)
+        finally:
+            self.session = None
+            session.stop()
+        profile = session.speedscope()
+        logger.warning("Profiling finished", kind=kind, name=name, awaits=profile["awaits"])
+        return profile
+
+
+PROFILER = Profiler()
+
+
+def profiled(kind: ProfileKind, name: str):
+    """Отметить запуск задачи или обработку вебхука для профиля; без сессии - пустой контекст."""
+    session = PROFILER.session
+    if session is None or not session.wants(kind, name):
+        return _NO_PROFILE
+    return session.target(f"{name} #{len(session.targets) + 1}")
@@ -1,4 +1,4 @@
-import asyncio
+from typing import AsyncIterable
 
 from aiogram import Bot
 from dishka import provide, Provider, Scope
@@ -6,9 +6,23 @@ from fast_bitrix24 import BitrixAsync
 from pydantic import SecretStr
 
 from app.core.config import get_app_settings
+from app.core.leader import LeaderLease, LeaseLock
+from app.core.resilience import CircuitBreaker
 from app.core.settings.production import ProdAppSettings
-from app.services.bitrix import BitrixService
+from app.services.bitrix import MIRROR_SCOPES, BitrixService
+from app.services.cache import TTLCache
+from app.services.capture import TrafficCapture
+from app.services.deadletter import DeadLetterReplayer, DeadLetterStore
+from app.services.dedup import EventDeduplicator
+from app.services.ledger import UploadLedger
+from app.services.limiter import BitrixRateLimiter, LimitedBitrixAsync
+from app.services.mirror import CrmMirror
+from app.services.notifications import NotificationOutbox
+from app.services.phones import PhoneIndex
+from app.services.push import PushSync
+from app.services.queue import SQLiteQueue
 from app.services.sasha import SashaService
+from app.services.sources import SourceRegistry
 
 
 class SettingsProvider(Provider):
@@ -22,23 +36,116 @@ class NotificationsProvider(Provider):
     def bot(self, settings: ProdAppSettings) -> Bot:
         return Bot(token=settings.TG_BOT_TOKEN.get_secret_value())
 
+    @provide(scope=Scope.APP)
+    async def outbox(self, bot: Bot, settings: ProdAppSettings) -> AsyncIterable[NotificationOutbox]:
+        # неотправленные уведомления лежат в SQLITE_PATH и досылаются после рестарта
+        queue = SQLiteQueue(settings.SQLITE_PATH, "notifications", visibility_timeout=2 * settings.TG_RETRY_MAX_TIME)
+        outbox = NotificationOutbox(
+            bot, chat_id=settings.TG_CHAT_ID, max_retry_time=settings.TG_RETRY_MAX_TIME, queue=queue,
+        )
+        outbox.start()
+        yield outbox
+        await outbox.close()
+
 
 class ServiceProvider(Provider):
     @provide(scope=Scope.APP)
-    def bitrix_client(self, settings: ProdAppSettings) -> BitrixAsync:
+    def bitrix_limiter(self, settings: ProdAppSettings) -> BitrixRateLimiter:
+        return BitrixRateLimiter(
+            pool_size=settings.BITRIX24_POOL_SIZE,
+            rate=settings.BITRIX24_RPS,
+            reserve=settings.BITRIX24_INTERACTIVE_RESERVE,
+        )
+
+    @provide(scope=Scope.APP)
+    def bitrix_client(self, settings: ProdAppSettings, limiter: BitrixRateLimiter) -> BitrixAsync:
         webhook_url: SecretStr = settings.BITRIX24_WEBHOOK_URL
-        return BitrixAsync(webhook_url.get_secret_value(), verbose=False)
+        breaker = CircuitBreaker(
+            "bitrix", failure_threshold=settings.CIRCUIT_FAILURE_THRESHOLD, reset_timeout=settings.CIRCUIT_RESET_TIMEOUT
+        )
+        return LimitedBitrixAsync(webhook_url.get_secret_value(), limiter=limiter, breaker=breaker, verbose=False)
 
     @provide(scope=Scope.APP)
-    def sasha_service(self, settings: ProdAppSettings) -> SashaService:
-        return SashaService(
-            settings.sasha_webhooks
+    async def sasha_service(self, settings: ProdAppSettings) -> AsyncIterable[SashaService]:
+        sasha = SashaService(
+            settings.sasha_webhooks,
+            chunk_size=settings.SASHA_CHUNK_SIZE,
+            concurrency=settings.SASHA_CONCURRENCY,
+            gzip_requests=settings.SASHA_GZIP,
+            retries=settings.SASHA_RETRIES,
+            breaker=CircuitBreaker(
+                "sasha",
+                failure_threshold=settings.CIRCUIT_FAILURE_THRESHOLD,
+                reset_timeout=settings.CIRCUIT_RESET_TIMEOUT,
+            ),
         )
+        yield sasha
+        await sasha.close()
+
+    @provide(scope=Scope.APP)
+    def source_registry(self, bitrix: BitrixAsync, settings: ProdAppSettings) -> SourceRegistry:
+        return SourceRegistry(bitrix, ttl=settings.SOURCES_TTL)
+
+    @provide(scope=Scope.APP)
+    def bitrix_service(
+            self,
+            sasha: SashaService,
+            bitrix: BitrixAsync,
+            sources: SourceRegistry,
+            settings: ProdAppSettings,
+    ) -> BitrixService:
+        return BitrixService(
+            sasha=sasha,
+            bitrix=bitrix,
+            contacts_cache=TTLCache(maxsize=settings.CONTACTS_CACHE_SIZE, ttl=settings.CONTACTS_CACHE_TTL),
+            source_registry=sources,
+            mirror=CrmMirror(
+                settings.SQLITE_PATH,
+                bitrix,
+                max_age=settings.CRM_MIRROR_MAX_AGE,
+                full_sync_interval=settings.CRM_MIRROR_FULL_SYNC_INTERVAL,
+                list_mode=settings.BITRIX24_LIST_MODE,
+                scopes=MIRROR_SCOPES,
+            ) if settings.CRM_MIRROR_ENABLED else None,
+            phone_index=PhoneIndex(ttl=settings.PHONE_INDEX_TTL),
+            ledger=UploadLedger(settings.SQLITE_PATH, cooldown=settings.SASHA_RESEND_COOLDOWN),
+            list_mode=settings.BITRIX24_LIST_MODE,
+            list_windows=settings.BITRIX24_LIST_WINDOWS,
+        )
+
+    @provide(scope=Scope.APP)
+    def webhook_queue(self, settings: ProdAppSettings) -> SQLiteQueue:
+        return SQLiteQueue(settings.SQLITE_PATH, name="webhooks")
+
+    @provide(scope=Scope.APP)
+    def traffic_capture(self, settings: ProdAppSettings) -> TrafficCapture:
+        return TrafficCapture(
+            settings.WEBHOOK_CAPTURE_DIR,
+            segment_bytes=settings.WEBHOOK_CAPTURE_SEGMENT_BYTES,
+            max_segments=settings.WEBHOOK_CAPTURE_SEGMENTS,
+            salt=settings.WEBHOOK_CAPTURE_SALT.get_secret_value() if settings.WEBHOOK_CAPTURE_SALT else None,
+        )
+
+    @provide(scope=Scope.APP)
+    def dead_letters(self, settings: ProdAppSettings) -> DeadLetterStore:
+        return DeadLetterStore(settings.SQLITE_PATH, ttl=settings.DEAD_LETTER_TTL)
+
+    @provide(scope=Scope.APP)
+    def dead_letter_replayer(self, store: DeadLetterStore, settings: ProdAppSettings) -> DeadLetterReplayer:
+        return DeadLetterReplayer(store, interval=settings.DEAD_LETTER_REPLAY_INTERVAL)
+
+    @provide(scope=Scope.APP)
+    def event_deduplicator(self, settings: ProdAppSettings) -> EventDeduplicator:
+        return EventDeduplicator(settings.SQLITE_PATH, ttl=settings.DEDUP_TTL)
+
+    @provide(scope=Scope.APP)
+    def leader_lease(self, settings: ProdAppSettings) -> LeaderLease:
+        return LeaderLease(settings.SQLITE_PATH, name="scheduler", ttl=settings.LEADER_LEASE_TTL)
 
     @provide(scope=Scope.APP)
-    def bitrix_service(self, sasha: SashaService, bitrix: BitrixAsync) -> BitrixService:
-        return BitrixService(sasha=sasha, bitrix=bitrix)
+    def sync_locks(self, settings: ProdAppSettings) -> LeaseLock:
+        return LeaseLock(settings.SQLITE_PATH, ttl=settings.LEADER_LEASE_TTL)
 
     @provide(scope=Scope.APP)
-    def lock(self) -> asyncio.Lock:
-        return asyncio.Lock()
\ No newline at end of file
+    def push_sync(self, bitrix: BitrixService, locks: LeaseLock, settings: ProdAppSettings) -> PushSync:
+        return PushSync(bitrix, locks, delay=settings.BITRIX24_PUSH_DEBOUNCE)
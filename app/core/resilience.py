@@ -0,0 +1,136 @@
+import asyncio
+import enum
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, TypeVar
+
+import structlog
+
+from app.core.metrics import CIRCUIT_STATE
+
+logger = structlog.get_logger(service="CircuitBreaker")
+
+T = TypeVar("T")
+
+
+def backoff_delay(attempt: int, base: float = 0.5, cap: float = 30) -> float:
+    """Экспоненциальная задержка с полным джиттером: равномерно от 0 до min(cap, base * 2^attempt)."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+async def retry(
+        fn: Callable[[], Awaitable[T]],
+        attempts: int = 3,
+        base: float = 0.5,
+        cap: float = 30,
+        retry_on: Callable[[Exception], bool] = lambda e: True,
+) -> T:
+    """Вызвать fn, при ошибке, для которой retry_on истинно, повторить до attempts раз с backoff_delay."""
+    attempt = 0
+    while True:
+        try:
+            return await fn()
+        except Exception as e:
+            attempt += 1
+            if attempt >= attempts or not retry_on(e):
+                raise
+            await asyncio.sleep(backoff_delay(attempt - 1, base, cap))
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, name: str, retry_in: float):
+        super().__init__(f"Circuit {name} is open, retry in {retry_in:.0f}s")
+        self.name = name
+        self.retry_in = retry_in
+
+
+class CircuitState(enum.IntEnum):
+    CLOSED = 0
+    HALF_OPEN = 1
+    OPEN = 2
+
+
+class CircuitBreaker:
+    """
+    Предохранитель внешнего API.
+
+    После failure_threshold ошибок подряд размыкается: вызовы сразу получают CircuitOpenError,
+    а не ждут таймаутов. Через reset_timeout секунд пропускает один пробный вызов:
+    успех замыкает цепь (и будит подписчиков on_close), ошибка - снова размыкает.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self.state = CircuitState.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._on_close: list[Callable[[], None]] = []
+        CIRCUIT_STATE.labels(endpoint=name).set(self.state)
+
+    @property
+    def is_open(self) -> bool:
+        """Разомкнут, и время пробного вызова еще не пришло."""
+        return self.state == CircuitState.OPEN and time.monotonic() - self._opened_at < self.reset_timeout
+
+    def on_close(self, callback: Callable[[], None]) -> None:
+        self._on_close.append(callback)
+
+    def _set_state(self, state: CircuitState) -> None:
+        if state == self.state:
+            return
+        logger.warning("Circuit state changed", endpoint=self.name, state=state.name, failures=self.failures)
+        self.state = state
+        CIRCUIT_STATE.labels(endpoint=self.name).set(state)
+        if state == CircuitState.CLOSED:
+            for callback in self._on_close:
+                callback()
+
+    def check(self) -> None:
+        """Разрешить вызов или поднять CircuitOpenError."""
+        if self.state == CircuitState.CLOSED:
+            return
+        retry_in = self._opened_at + self.reset_timeout - time.monotonic()
+        if self.state == CircuitState.OPEN and retry_in <= 0:
+            self._set_state(CircuitState.HALF_OPEN)
+        if self.state == CircuitState.HALF_OPEN and not self._probing:
+            self._probing = True
+            return
+        raise CircuitOpenError(self.name, max(retry_in, 0))
+
+    def success(self) -> None:
+        self.failures = 0
+        self._probing = False
+        self._set_state(CircuitState.CLOSED)
+
+    def failure(self) -> None:
+        self.failures += 1
+        self._probing = False
+        if self.state == CircuitState.HALF_OPEN or self.failures >= self.failure_threshold:
+            self._opened_at = time.monotonic()
+            self._set_state(CircuitState.OPEN)
+
+    @asynccontextmanager
+    async def guard(self, is_failure: Callable[[BaseException], bool] = lambda e: True):
+        """
+        Вызов через предохранитель. Ошибки, для которых is_failure ложно (4xx, лимиты), считаются успехом:
+        сервис отвечает, просто не на этот запрос.
+        """
+        self.check()
+        try:
+            yield
+        except asyncio.CancelledError:
+            # отмененный пробный вызов ничего не сказал о сервисе - следующий вызов станет пробным
+            self._probing = False
+            raise
+        except Exception as e:
+            if is_failure(e):
+                self.failure()
+            else:
+                self.success()
+            raise
+        self.success()
@@ -0,0 +1,81 @@
+import asyncio
+import time
+
+import structlog
+from taskiq import AsyncTaskiqDecoratedTask
+from taskiq.exceptions import TaskiqResultTimeoutError
+
+from app.core.metrics import TASK_INTERVAL
+
+logger = structlog.get_logger(service="AdaptiveJob")
+
+
+class AdaptiveJob:
+    """
+    Периодический запуск задачи брокера без наложения запусков.
+
+    Следующий запуск ставится только после того, как предыдущий закончился,
+    поэтому в полете не больше одного запуска, а тики, пропущенные за время долгого запуска, схлопываются.
+    Задача возвращает число найденных сущностей: если что-то нашлось - следующий запуск через min_interval,
+    если ничего (или запуск упал) - интервал растет в backoff раз, но не больше max_interval.
+    """
+
+    def __init__(
+            self,
+            task: AsyncTaskiqDecoratedTask,
+            min_interval: float,
+            max_interval: float,
+            backoff: float = 2.0,
+            run_timeout: float = 900,
+    ):
+        self.task = task
+        self.name = task.task_name.rsplit(":", 1)[-1]
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.run_timeout = run_timeout
+        self.interval = min_interval
+
+    def next_interval(self, items: int | None) -> float:
+        if items:
+            return self.min_interval
+        return min(self.max_interval, self.interval * self.backoff)
+
+    async def run_once(self) -> int | None:
+        """
+        Запустить задачу и дождаться ее результата; None - запуск не удался.
+
+        Запуск дольше run_timeout не перезапускается: следующий тик ставится только после его окончания,
+        а о переборе раз в run_timeout пишется в лог.
+        """
+        try:
+            running = await self.task.kiq()
+        except Exception as e:
+            logger.error("Failed to run job", job=self.name, error=str(e))
+            return None
+        started = time.monotonic()
+        while True:
+            try:
+                result = await running.wait_result(timeout=self.run_timeout)
+                break
+            except TaskiqResultTimeoutError:
+                logger.warning(
+                    "Job run overran, still waiting", job=self.name, running_for=round(time.monotonic() - started),
+                )
+            except Exception as e:
+                logger.error("Failed to get job result", job=self.name, error=str(e))
+                return None
+        if result.is_err:
+            logger.error("Job run failed", job=self.name, error=str(result.error))
+            return None
+        return result.return_value or 0
+
+    async def loop(self, run_immediately: bool = True) -> None:
+        if not run_immediately:
+            await asyncio.sleep(self.interval)
+        while True:
+            items = await self.run_once()
+            self.interval = self.next_interval(items)
+            TASK_INTERVAL.labels(task=self.name).set(self.interval)
+            logger.info("Job run finished", job=self.name, items=items, next_run_in=self.interval)
+            await asyncio.sleep(self.interval)
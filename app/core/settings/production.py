@@ -1,3 +1,5 @@
+from typing import Literal
+
 from pydantic import BaseModel, Field, SecretStr
 from pydantic_settings import SettingsConfigDict
 
@@ -15,7 +17,82 @@ class ProdAppSettings(AppSettings):
 
     BITRIX24_WEBHOOK_URL: SecretStr = Field()
     TG_BOT_TOKEN: SecretStr = Field()
+    TG_CHAT_ID: str = "-1003363598566"
+    # сколько секунд в сумме одно уведомление ждет снятия flood control Телеграма, потом отбрасывается
+    TG_RETRY_MAX_TIME: int = 300
     SASHA_WEBHOOK_UUIDS: list[SecretStr] = Field()
+    SASHA_CHUNK_SIZE: int = 500
+    SASHA_CONCURRENCY: int = 4
+    SASHA_GZIP: bool = False
+    SASHA_RETRIES: int = 3
+    # лимиты портала: пул запросов, скорость его освобождения и места пула только для вебхуков
+    BITRIX24_POOL_SIZE: int = 50
+    BITRIX24_RPS: float = 2.0
+    BITRIX24_INTERACTIVE_RESERVE: int = 10
+    # get_all - выборки crm.*.list постранично через start, keyset - по >ID без подсчета total;
+    # в режиме keyset диапазон DATE_CREATE выборки можно разбить на BITRIX24_LIST_WINDOWS параллельных окон
+    BITRIX24_LIST_MODE: Literal["get_all", "keyset"] = "get_all"
+    BITRIX24_LIST_WINDOWS: int = 1
+    # application_token исходящего вебхука Битрикс24, которым подписаны события
+    BITRIX24_EVENTS_TOKEN: SecretStr | None = None
+    # лиды и сделки из событий ONCRMLEADADD/ONCRMLEADUPDATE/ONCRMDEALUPDATE сразу грузятся в Сашу,
+    # а их опрос идет раз в BITRIX24_PUSH_RECONCILE_INTERVAL секунд и только подбирает пропущенное
+    BITRIX24_PUSH_ENABLED: bool = False
+    BITRIX24_PUSH_DEBOUNCE: float = 2.0
+    BITRIX24_PUSH_RECONCILE_INTERVAL: int = 600
+
+    CONTACTS_CACHE_SIZE: int = 10_000
+    CONTACTS_CACHE_TTL: int = 3600
+    # сколько секунд телефон, загруженный в Сашу, не загружается повторно от другой сделки или лида
+    PHONE_INDEX_TTL: int = 900
+    # отправленный лид без изменений уходит в Сашу повторно не раньше, чем через столько секунд
+    SASHA_RESEND_COOLDOWN: int = 24 * 3600
+    SOURCES_TTL: int = 3600
+
+    SQLITE_PATH: str = "data/app.sqlite3"
+
+    # кандидаты задач выбираются из локальной копии сделок и лидов в SQLITE_PATH,
+    # перед выборкой догружаются изменения по DATE_MODIFY, если копия старше CRM_MIRROR_MAX_AGE секунд
+    CRM_MIRROR_ENABLED: bool = False
+    CRM_MIRROR_MAX_AGE: float = 5
+    CRM_MIRROR_FULL_SYNC_INTERVAL: int = 24 * 3600
+
+    # memory - задачи выполняются в процессе API,
+    # sqlite - очередь задач в SQLITE_PATH, нужны отдельные `taskiq worker app.main:broker`
+    TASKIQ_BROKER: Literal["memory", "sqlite"] = "memory"
+    # через столько секунд задача воркера, который перестал продлевать ее (упал), выдается другому
+    TASKIQ_VISIBILITY_TIMEOUT: float = 900
+
+    # результаты звонков складываются в очередь и обрабатываются пулом обработчиков, вебхук отвечает 202
+    WEBHOOK_QUEUE_ENABLED: bool = False
+    WEBHOOK_QUEUE_CONSUMERS: int = 4
+    WEBHOOK_QUEUE_MAX_ATTEMPTS: int = 5
+    # токен заголовка X-Admin-Token для /admin/*, без него эндпоинты выключены
+    ADMIN_TOKEN: SecretStr | None = None
+    # если задан каталог, тела POST /webhooks/{id} пишутся туда сегментами *.jsonl.gz без телефонов
+    # для повтора нагрузки (benchmarks/replay_webhooks.py)
+    WEBHOOK_CAPTURE_DIR: str | None = None
+    WEBHOOK_CAPTURE_SEGMENT_BYTES: int = 64 * 1024 ** 2
+    WEBHOOK_CAPTURE_SEGMENTS: int = 20
+    # ключ подставных телефонов: один на все воркеры и перезапуски, чтобы дубли в записи оставались дублями;
+    # без него ключ случайный в каждом процессе
+    WEBHOOK_CAPTURE_SALT: SecretStr | None = None
+    # предохранители Битрикс и Саши размыкаются после CIRCUIT_FAILURE_THRESHOLD ошибок подряд,
+    # пробный вызов - через CIRCUIT_RESET_TIMEOUT секунд
+    CIRCUIT_FAILURE_THRESHOLD: int = 5
+    CIRCUIT_RESET_TIMEOUT: float = 30
+    # не записанные в Битрикс результаты звонков лидер повторяет при замыкании предохранителя
+    # и раз в DEAD_LETTER_REPLAY_INTERVAL секунд; письма старше DEAD_LETTER_TTL выбрасываются
+    DEAD_LETTER_REPLAY_INTERVAL: int = 60
+    DEAD_LETTER_TTL: int = 6 * 3600
+    # сколько секунд помним обработанные CallResultEvent.id / call.id
+    DEDUP_TTL: int = 3 * 24 * 3600
+    # планировщик запускает только лидер; аренда продлевается каждые LEADER_LEASE_TTL / 3 секунд,
+    # так же держатся блокировки загрузки лидов и сделок между процессами (LeaseLock)
+    LEADER_LEASE_TTL: int = 30
+    # interval - фиксированные интервалы APScheduler,
+    # adaptive - следующий запуск после окончания предыдущего, интервал зависит от найденного
+    SCHEDULER_MODE: Literal["interval", "adaptive"] = "interval"
 
     @property
     def sasha_webhooks(self) -> SashaWebhookStorage:
@@ -0,0 +1,45 @@
+import asyncio
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Callable
+
+
+def connect(path: str) -> sqlite3.Connection:
+    """Соединение с локальной SQLite-базой в режиме WAL."""
+    if path != ":memory:":
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA busy_timeout=5000")
+    return conn
+
+
+class SQLiteStore:
+    """
+    Базовый класс локальных хранилищ на SQLite.
+    Запросы выполняются в отдельном потоке, чтобы не блокировать event loop.
+    """
+
+    schema: str = ""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.conn = connect(path)
+        self._lock = threading.Lock()
+        if self.schema:
+            self.conn.executescript(self.schema)
+
+    def _call(self, fn: Callable[..., Any], *args) -> Any:
+        with self._lock:
+            return fn(*args)
+
+    async def run(self, fn: Callable[..., Any], *args) -> Any:
+        return await asyncio.to_thread(self._call, fn, *args)
+
+    async def execute(self, sql: str, params: tuple = ()) -> list[tuple]:
+        return await self.run(lambda: self.conn.execute(sql, params).fetchall())
+
+    def close(self) -> None:
+        self.conn.close()
@@ -1,5 +1,5 @@
 import asyncio
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, suppress
 
 import structlog
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
@@ -8,50 +8,91 @@ from dishka.integrations.fastapi import (
     FastapiProvider, setup_dishka,
 )
 from dishka.integrations.taskiq import FromDishka, inject, setup_dishka as setup_dishka_taskiq, TaskiqProvider
+from fast_bitrix24 import BitrixAsync
 from fastapi import FastAPI
 from starlette.middleware.cors import CORSMiddleware
-from taskiq import InMemoryBroker
 
+from app.core.broker import get_broker
 from app.core.config import get_app_settings
+from app.core.leader import LeaderLease, LeaseLock
+from app.core.metrics import track_task
+from app.core.scheduling import AdaptiveJob
 from app.core.providers import NotificationsProvider, ServiceProvider, SettingsProvider
+from app.core.settings.production import ProdAppSettings
 from app.services.bitrix import BitrixService
-
-broker = InMemoryBroker()
+from app.services.capture import TrafficCapture
+from app.services.deadletter import DeadLetterReplayer, DeadLetterStore
+from app.services.dedup import EventDeduplicator
+from app.services.notifications import NotificationOutbox
+from app.services.push import PushSync
+from app.services.queue import SQLiteQueue
+from app.services.sources import SourceRegistry
+from app.services.transitions import COLD, LOAD, ROLLBACK, Transition
+
+broker = get_broker(get_app_settings())
 scheduler = AsyncIOScheduler()
 
 logger = structlog.get_logger()
 
 
+async def run_deal_rule(task: str, rule: Transition, bitrix: BitrixService, locks: LeaseLock) -> int:
+    # под той же блокировкой, что и загрузка сделок по событиям (PushSync) в любом процессе
+    async with locks.hold("deals"):
+        logger.info("Deal transition task executed", task=task)
+        items = await track_task(task, bitrix.run_transitions((rule,)))
+        logger.info("Deal transition task DONE", task=task)
+        return items
+
+
 @broker.task
 @inject
-async def move_cold_deals_to_prepairing(bitrix: FromDishka[BitrixService]):
-    logger.info("Moving cold deals to prepairing task executed")
-    await bitrix.move_cold_deals_prepairing()
-    logger.info("Moving cold deals to prepairing task DONE")
+async def move_cold_deals_to_prepairing(bitrix: FromDishka[BitrixService], locks: FromDishka[LeaseLock]):
+    return await run_deal_rule("move_cold_deals_to_prepairing", COLD, bitrix, locks)
 
 
 @broker.task
 @inject
-async def load_deals_to_sasha(bitrix: FromDishka[BitrixService]):
-    logger.info("Loading DEALS to Sasha task executed")
-    await bitrix.load_to_sasha()
-    logger.info("Loading DEALS to Sasha task done")
+async def load_deals_to_sasha(bitrix: FromDishka[BitrixService], locks: FromDishka[LeaseLock]):
+    return await run_deal_rule("load_deals_to_sasha", LOAD, bitrix, locks)
 
 
 @broker.task
 @inject
-async def test_task(bitrix: FromDishka[BitrixService], lock: FromDishka[asyncio.Lock]):
-    async with lock:
+async def test_task(bitrix: FromDishka[BitrixService], locks: FromDishka[LeaseLock]):
+    async with locks.hold("leads"):
         logger.info("Loading LEADS to Sasha task executed")
-        await bitrix.load_leads_to_sasha()
+        items = await track_task("load_leads_to_sasha", bitrix.load_leads_to_sasha())
         logger.info("Loading LEADS to Sasha task DONE")
+        return items
+
 
 @broker.task
 @inject
-async def rollback_task(bitrix: FromDishka[BitrixService], lock: FromDishka[asyncio.Lock]):
-    logger.info("Rolling back executed")
-    await bitrix.rollback_frozen_deals()
-    logger.info("Rolling back done")
+async def rollback_task(bitrix: FromDishka[BitrixService], locks: FromDishka[LeaseLock]):
+    return await run_deal_rule("rollback_frozen_deals", ROLLBACK, bitrix, locks)
+
+
+# задача, интервал в режиме interval, (мин., макс.) интервал в режиме adaptive, запуск сразу после избрания;
+# у каждого перехода сделок (app/services/transitions.py) своя задача со своим интервалом
+JOBS = (
+    (move_cold_deals_to_prepairing, 360, (60, 1800), False),
+    (load_deals_to_sasha, 50, (10, 300), False),
+    (test_task, 30, (10, 300), True),
+    (rollback_task, 300, (60, 1800), True),
+)
+# при BITRIX24_PUSH_ENABLED эти сущности приходят событиями, а опрос только сверяет
+PUSH_COVERED = (load_deals_to_sasha, test_task)
+
+
+def job_schedule(settings: ProdAppSettings) -> list[tuple]:
+    if not settings.BITRIX24_PUSH_ENABLED:
+        return list(JOBS)
+    reconcile = settings.BITRIX24_PUSH_RECONCILE_INTERVAL
+    return [
+        (task, reconcile, (reconcile, max(reconcile, bounds[1])), on_start) if task in PUSH_COVERED
+        else (task, interval, bounds, on_start)
+        for task, interval, bounds, on_start in JOBS
+    ]
 
 
 @asynccontextmanager
@@ -59,31 +100,112 @@ async def lifespan(app: FastAPI):
     if not broker.is_worker_process:
         await broker.startup()
 
-    scheduler.start()
-    scheduler.add_job(move_cold_deals_to_prepairing.kiq, 'interval', seconds=360)
-    scheduler.add_job(load_deals_to_sasha.kiq, 'interval', seconds=50)
-    await test_task.kiq()
-    await rollback_task.kiq()
-    scheduler.add_job(test_task.kiq, 'interval', seconds=30)
-    scheduler.add_job(rollback_task.kiq, 'interval', seconds=300)
+    # прогреваем источники до первого тика, дальше обновляем их в фоне
+    sources = await app.state.dishka_container.get(SourceRegistry)
+    try:
+        await sources.refresh()
+    except Exception as e:
+        logger.error("Sources warm-up failed", error=str(e))
+    sources_refresh = asyncio.create_task(sources.run_refresh())
+
+    settings = get_app_settings()
+    push_sync = None
+    if settings.BITRIX24_PUSH_ENABLED:
+        push = await app.state.dishka_container.get(PushSync)
+        push_sync = asyncio.create_task(push.run())
+
+    from app.api.routes.webhooks import consume_results, replay_result
+
+    container = app.state.dishka_container
+    notifier = await container.get(NotificationOutbox)
+    bitrix_client = await container.get(BitrixAsync)
+    dead_letters = await container.get(DeadLetterStore)
+    dedup = await container.get(EventDeduplicator)
+    capture = None
+    if settings.WEBHOOK_CAPTURE_DIR:
+        capture = asyncio.create_task((await container.get(TrafficCapture)).run())
+
+    consumers = []
+    if settings.WEBHOOK_QUEUE_ENABLED:
+        queue = await container.get(SQLiteQueue)
+        consumers = [
+            asyncio.create_task(consume_results(
+                queue, notifier, bitrix_client, dedup, settings.WEBHOOK_QUEUE_MAX_ATTEMPTS, dead_letters,
+            ))
+            for _ in range(settings.WEBHOOK_QUEUE_CONSUMERS)
+        ]
+
+    # неудавшиеся записи в Битрикс повторяет только лидер, когда предохранитель Битрикс замкнут
+    replayer = await container.get(DeadLetterReplayer)
+    replayer.register(
+        "webhooks", lambda payload: replay_result(payload, notifier, bitrix_client, dedup), bitrix_client.breaker,
+    )
+
+    # задания есть во всех воркерах, но запускает их только лидер,
+    # остальные воркеры только принимают вебхуки
+    adaptive = settings.SCHEDULER_MODE == "adaptive"
+    jobs = job_schedule(settings)
+    if not adaptive:
+        for task, interval, _, _ in jobs:
+            scheduler.add_job(task.kiq, 'interval', seconds=interval)
+    scheduler.start(paused=True)
+    leader_tasks: list[asyncio.Task] = []
+
+    async def on_elected():
+        leader_tasks.append(asyncio.create_task(replayer.run()))
+        if adaptive:
+            leader_tasks.extend(
+                asyncio.create_task(AdaptiveJob(task, *bounds).loop(run_immediately=on_start))
+                for task, _, bounds, on_start in jobs
+            )
+            return
+        scheduler.resume()
+        for task, _, _, on_start in jobs:
+            if on_start:
+                await task.kiq()
+
+    async def on_deposed():
+        scheduler.pause()
+        for task in leader_tasks:
+            task.cancel()
+        leader_tasks.clear()
+
+    leader = await app.state.dishka_container.get(LeaderLease)
+    election = asyncio.create_task(leader.campaign(on_elected, on_deposed))
 
     yield
 
+    # отмена выборов освобождает аренду, и другой воркер забирает ее, не дожидаясь ttl
+    election.cancel()
+    with suppress(asyncio.CancelledError):
+        await election
+    sources_refresh.cancel()
+    if push_sync:
+        push_sync.cancel()
+    for consumer in consumers:
+        consumer.cancel()
+    if capture:
+        # последний сброс буфера
+        capture.cancel()
+        with suppress(asyncio.CancelledError):
+            await capture
+
     if not broker.is_worker_process:
         await broker.shutdown()
 
     scheduler.shutdown()
+    await app.state.dishka_container.close()
 
 
 def get_application() -> FastAPI:
     settings = get_app_settings()
 
     application = FastAPI(**settings.fastapi_kwargs, lifespan=lifespan)
-    fastapi_container = make_async_container(SettingsProvider(), ServiceProvider(), NotificationsProvider(),
-                                             FastapiProvider())
-    taskiq_container = make_async_container(SettingsProvider(), ServiceProvider(), TaskiqProvider())
-    setup_dishka(container=fastapi_container, app=application)
-    setup_dishka_taskiq(container=taskiq_container, broker=broker)
+    # один контейнер на процесс: задачи и вебхуки делят APP-сервисы (клиент Битрикс, кэш контактов)
+    container = make_async_container(SettingsProvider(), ServiceProvider(), NotificationsProvider(),
+                                     FastapiProvider(), TaskiqProvider())
+    setup_dishka(container=container, app=application)
+    setup_dishka_taskiq(container=container, broker=broker)
     application.add_middleware(
         CORSMiddleware,
         allow_origins=settings.allowed_hosts,
@@ -95,6 +217,12 @@ def get_application() -> FastAPI:
     application.include_router(router, prefix=settings.api_prefix)
     from app.api.routes.root import router
     application.include_router(router, prefix=settings.api_prefix)
+    from app.api.routes.events import router
+    application.include_router(router, prefix=settings.api_prefix)
+    from app.api.routes.metrics import router
+    application.include_router(router, prefix=settings.api_prefix)
+    from app.api.routes.admin import router
+    application.include_router(router, prefix=settings.api_prefix)
     return application
 
 
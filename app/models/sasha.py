@@ -1,7 +1,7 @@
 import enum
 import json
 from datetime import datetime
-from typing import Any, Literal
+from typing import Any, Iterator, Literal
 
 from pydantic import BaseModel, ConfigDict, Field, model_validator
 from pydantic.alias_generators import to_camel
@@ -52,6 +52,8 @@ class DealFieldsEnum(enum.StrEnum):
     length = "UF_CRM_1720783739"
     height = "UF_CRM_1720783750"
     region = "UF_CRM_628B829FDFAED"
+    building_type = "UF_CRM_671265881185F"  # Тип помещения
+    insulation_walls = "UF_CRM_1697023059779"  # Утепление стен
 
     interaction = "UF_CRM_69395837EC62E"  # Комментарий по взаимодействию
     size_anchor = "UF_CRM_693976DF42581"  # Комментарий по размерам объекта
@@ -70,6 +72,8 @@ class LeadFieldsEnum(enum.StrEnum):
     length = "UF_CRM_1720783619"
     height = "UF_CRM_1720783631"
     region = "UF_CRM_1653303699"
+    building_purpose = "UF_CRM_1725886337"  # Назначение
+    deadline = "UF_CRM_1738307952054"  # Ориентировочные сроки
 
     interaction = "UF_CRM_1765365691799"  # Комментарий по взаимодействию
     size_anchor = "UF_CRM_1765365898533"  # Комментарий по размерам объекта
@@ -321,37 +325,33 @@ class ChatMessage(SashaBase):
     role: str
 
 
-class CallDetails(SashaBase):
-    channel_id: str
-    chat_history: list[ChatMessage]
-    destination_phone: str
+# Облегченные модели результата звонка: только поля, которые читают deal_actions/lead_actions.
+# Полные модели ниже наследуют их и добавляют остальное.
+
+
+class CallDetailsLite(SashaBase):
+    # сообщения не превращаются в ChatMessage: на длинных диалогах это основная цена разбора
+    chat_history: list[dict[str, Any]]
     from_phone: str | None = Field(default=None, alias="from")
     to_phone: str | None = Field(default=None,alias="to")
 
+    def messages(self) -> Iterator[tuple[str | None, str | None]]:
+        for item in self.chat_history:
+            yield item.get("role"), item.get("content")
+
     def history_as_string(self):
         history_str = ""
         user_emoji, bot_emoji = "😎", "🤖"
-        for item in self.chat_history:
-            role = item.role
+        for role, content in self.messages():
             if role and role == "user":
-                history_str += f"{user_emoji}: {item.content}\n"
+                history_str += f"{user_emoji}: {content}\n"
             else:
-                history_str += f"{bot_emoji}: {item.content}\n"
+                history_str += f"{bot_emoji}: {content}\n"
         return history_str
 
 
-class Contact(SashaBase):
+class ContactLite(SashaBase):
     additional_fields: dict
-    blacklist: bool
-    call_list: CallList
-    call_sessions: list[Any] = []
-    created_at: datetime
-    created_by_user_id: str
-    id: str
-    is_deleted: bool
-    phone: str
-    tags: list[str]
-    updated_at: datetime
 
     @property
     def deal_id(self) -> str:
@@ -370,9 +370,51 @@ class Contact(SashaBase):
         return f"https://aaaeuroangar.bitrix24.ru/crm/deal/details/{self.deal_id}/" if self.deal_id else f"https://aaaeuroangar.bitrix24.ru/crm/lead/details/{self.lead_id}/"
 
 
-class CallSession(SashaBase):
-    attempts: int
+class CallSessionLite(SashaBase):
     attempts_left: int
+
+
+class CallLite(SashaBase):
+    agreements: Agreements
+    call_details: CallDetailsLite
+    call_session: CallSessionLite
+    id: str
+    record_url: str | None = None
+    started_at: datetime
+    status: str
+
+
+class CallResultEventLite(SashaBase):
+    call: CallLite
+    contact: ContactLite
+    id: str
+
+
+class CallDetails(CallDetailsLite):
+    channel_id: str
+    chat_history: list[ChatMessage]
+    destination_phone: str
+
+    def messages(self) -> Iterator[tuple[str | None, str | None]]:
+        for item in self.chat_history:
+            yield item.role, item.content
+
+
+class Contact(ContactLite):
+    blacklist: bool
+    call_list: CallList
+    call_sessions: list[Any] = []
+    created_at: datetime
+    created_by_user_id: str
+    id: str
+    is_deleted: bool
+    phone: str
+    tags: list[str]
+    updated_at: datetime
+
+
+class CallSession(CallSessionLite):
+    attempts: int
     calls: list[Any] = []
     contact: Contact
     created_at: datetime
@@ -381,24 +423,18 @@ class CallSession(SashaBase):
     updated_at: datetime
 
 
-class Call(SashaBase):
-    agreements: Agreements
+class Call(CallLite):
     call_details: CallDetails
     call_session: CallSession
     connected_at: datetime | None = None
     created_at: datetime
     ended_at: datetime | None = None
     hangup_reason: str
-    id: str
-    record_url: str | None = None
-    started_at: datetime
-    status: str
     type: str
     updated_at: datetime
 
 
-class CallResultEvent(SashaBase):
+class CallResultEvent(CallResultEventLite):
     call: Call
     contact: Contact
-    id: str
     timestamp: datetime
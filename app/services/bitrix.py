@@ -1,52 +1,196 @@
 from datetime import datetime, timedelta, UTC
+from typing import Any, Iterable, NamedTuple
 
 from fast_bitrix24 import BitrixAsync
-
-from app.models.sasha import DealFieldsEnum, LeadFieldsEnum
+from fast_bitrix24.utils import http_build_query
+
+from app.services.cache import MISSING, TTLCache
+from app.services.ledger import UploadLedger, content_hash
+from app.services.listing import ListMode, fetch_list, fetch_lists
+from app.services.mapping import DEAL_MAPPING, LEAD_MAPPING
+from app.services.mirror import CrmMirror
+from app.services.phones import PhoneIndex, normalize_phone
 from app.services.sasha import SashaService
+from app.services.sources import SourceRegistry
+from app.services.transitions import (
+    TRANSITIONS, Transition, move_command, plan, rule_filter, rule_select, stage_fields,
+)
 import structlog
 
 logger = structlog.get_logger()
 
+BITRIX_BATCH_SIZE = 50  # максимум команд в одном запросе batch
+CONTACTS_FILTER_SIZE = 500  # ID контактов в одном фильтре crm.contact.list
+MOVE_ECHO_SECONDS = 60  # столько помним свои переносы стадий, чтобы узнать их ONCRMDEALUPDATE
+LEAD_LOAD_STATUS = "NEW"  # лиды в этом статусе уходят в Сашу
+
+# полная загрузка CrmMirror: только стадии правил переноса и лиды, ждущие загрузки
+MIRROR_SCOPES = {
+    "deal": {"@STAGE_ID": list(dict.fromkeys(t.stage for t in TRANSITIONS))},
+    "lead": {"STATUS_ID": LEAD_LOAD_STATUS},
+}
+# методы изменения -> сущность CrmMirror (у crm.item.update - по entityTypeId)
+UPDATE_METHODS = {"crm.deal.update": "deal", "crm.lead.update": "lead"}
+ITEM_ENTITY_TYPES = {2: "deal", 1: "lead"}
+
+
+def updated_entity(method: str, params: dict) -> str | None:
+    if method == "crm.item.update":
+        return ITEM_ENTITY_TYPES.get(int(params.get("entityTypeId", 0)))
+    return UPDATE_METHODS.get(method)
+
+
+class DealUpload(NamedTuple):
+    """ID сделок, не ушедших в Сашу при загрузке, - переход их не переносит."""
+    failed: set[str] = set()  # части add_contacts с ошибкой или недоступность Саши
+    collapsed: set[str] = set()  # телефон уже загружен от другой сделки или лида (PhoneIndex)
+    skipped: set[str] = set()  # контакт не найден или у сделки нет телефона
+
+    @property
+    def held(self) -> set[str]:
+        return self.failed | self.collapsed | self.skipped
+
+
 class BitrixService:
     def __init__(
             self,
             sasha: SashaService,
             bitrix: BitrixAsync,
+            contacts_cache: TTLCache | None = None,
+            source_registry: SourceRegistry | None = None,
+            mirror: CrmMirror | None = None,
+            phone_index: PhoneIndex | None = None,
+            ledger: UploadLedger | None = None,
+            list_mode: ListMode = "get_all",
+            list_windows: int = 1,
     ):
         self.bitrix = bitrix
         self.sasha = sasha
-
-        self.raw_sources = (
-            "Сайт", "Реклама", "CRM-форма", "Квиз", "Яндекс Директ", "Авито", "Таргетированная реклама",
-            "Социальные сети",
-        )
-
-        self.raw_potencial_sources = (
-            "Скан", "Скан KZ", "Обзвон базы ИИ", "Обзвон базы RUS"
-        )
-
-        self.parsed_sources: list[dict] = []
+        # ID контакта -> телефон, сбрасывается событиями ONCRMCONTACTUPDATE/ONCRMCONTACTDELETE
+        self.contacts_cache = contacts_cache or TTLCache(maxsize=10_000, ttl=3600)
+        self.source_registry = source_registry or SourceRegistry(bitrix)
+        # если задана, кандидаты выбираются из локальной копии, в Битрикс идут только записи
+        self.mirror = mirror
+        # недавно загруженные в Сашу телефоны, общие для сделок и лидов
+        self.phones = phone_index or PhoneIndex()
+        # без журнала лиды отправляются на каждом тике
+        self.ledger = ledger
+        self.list_mode = list_mode
+        self.list_windows = list_windows
+        # ID сделки -> стадия, в которую ее только что перенес сервис
+        self.recent_moves = TTLCache(maxsize=20_000, ttl=MOVE_ECHO_SECONDS)
 
     async def sources(self) -> list[dict]:
-        sources = await self.bitrix.get_all('crm.status.list', params=
-        {
-            'filter': {"filter[ENTITY_ID]": "SOURCE"}
-        })
-        for status in sources:
-            if status["NAME"] in self.raw_sources or status["NAME"] in self.raw_potencial_sources:
-                parsed_source = {
-                    "name": status["NAME"],
-                    "id": status["STATUS_ID"],
-                    "is_potencial": True if status["NAME"] in self.raw_potencial_sources else False
-                }
-                self.parsed_sources.append(parsed_source)
-        return self.parsed_sources
+        sources = await self.source_registry.refresh()
+        return list(sources.values())
+
+    async def _batch_request(self, commands: dict[str, tuple[str, dict]]) -> dict[str, Any]:
+        """Один запрос batch (не больше BITRIX_BATCH_SIZE команд), halt=0. :return: ошибки команд по меткам"""
+        cmd = {label: f"{method}?{http_build_query(params)}" for label, (method, params) in commands.items()}
+        # запоминаем до отправки: событие о переносе может прийти раньше ответа batch
+        moves = {
+            label: str(params["id"])
+            for label, (method, params) in commands.items()
+            if method == "crm.item.update" and "STAGE_ID" in params.get("fields", {})
+        }
+        for label, deal_id in moves.items():
+            self.recent_moves.set(deal_id, commands[label][1]["fields"]["STAGE_ID"])
+        try:
+            response = await self.bitrix.call("batch", {"halt": 0, "cmd": cmd}, raw=True)
+        except Exception:
+            for deal_id in moves.values():
+                self.recent_moves.invalidate(deal_id)
+            raise
+
+        # пустой result_error Битрикс отдает как [], а не {}
+        errors = dict((response.get("result") or {}).get("result_error") or {})
+        for label, error in errors.items():
+            logger.error("Bitrix batch command failed", command=label, error=error)
+            if label in moves:
+                self.recent_moves.invalidate(moves[label])
+        if self.mirror:
+            await self._apply_to_mirror(commands, errors)
+        return errors
+
+    async def _apply_to_mirror(self, commands: dict[str, tuple[str, dict]], errors: dict[str, Any]) -> None:
+        """Успешные изменения сделок и лидов - сразу в CrmMirror, чтобы следующий тик не видел старую стадию."""
+        changes: dict[str, dict[str, dict]] = {}
+        for label, (method, params) in commands.items():
+            entity = updated_entity(method, params)
+            if entity and label not in errors and params.get("fields"):
+                changes.setdefault(entity, {})[str(params["id"])] = params["fields"]
+        for entity, entity_changes in changes.items():
+            # команды уже выполнены: ошибка копии не должна выглядеть как ошибка batch, строки поправит дельта
+            try:
+                await self.mirror.apply(entity, entity_changes)
+            except Exception as e:
+                logger.error("Mirror update failed", entity=entity, rows=len(entity_changes), error=str(e))
+
+    async def batch(self, commands: dict[str, tuple[str, dict]]) -> dict[str, Any]:
+        """
+        Выполнение команд через метод batch пачками по BITRIX_BATCH_SIZE.
+        Пачки отправляются с halt=0, поэтому ошибка одной команды не прерывает остальные.
+        Пачка, запрос которой не прошел целиком (Битрикс недоступен), не повторяется: все вызовы - переносы стадий,
+        которые следующий тик выведет заново из текущего состояния, а поздний повтор старого переноса
+        мог бы откатить сделку, которую за это время уже двигали.
+
+        :param commands: {метка команды: (метод, параметры)}
+        :return: ошибки по меткам неудачных команд
+        """
+        errors: dict[str, Any] = {}
+        labels = list(commands)
+        for i in range(0, len(labels), BITRIX_BATCH_SIZE):
+            chunk = {label: commands[label] for label in labels[i:i + BITRIX_BATCH_SIZE]}
+            try:
+                errors.update(await self._batch_request(chunk))
+            except Exception as e:
+                logger.error("Bitrix batch request failed", commands=len(chunk), error=str(e))
+                errors.update({label: str(e) for label in chunk})
+        return errors
 
     async def contact(self, contact_id: str):
         contact = await self.bitrix.get_by_ID('crm.contact.get', [contact_id])
+        if contact and contact.get("PHONE"):
+            self.contacts_cache.set(contact_id, contact["PHONE"][0].get("VALUE"))
         return contact
 
+    def invalidate_contact(self, contact_id: str) -> None:
+        self.contacts_cache.invalidate(str(contact_id))
+
+    async def contacts_phones(self, contact_ids: Iterable[str]) -> dict[str, str | None]:
+        """
+        Телефоны контактов одним или несколькими запросами crm.contact.list вместо crm.contact.get на каждый.
+
+        Сначала смотрит в contacts_cache, в Битрикс идут только промахи.
+
+        :param contact_ids: ID контактов, пустые и '0' пропускаются
+        :return: {ID контакта: первый телефон или None}, ненайденных контактов в словаре нет
+        """
+        phones: dict[str, str | None] = {}
+        ids = []
+        for contact_id in {contact_id for contact_id in contact_ids if contact_id and contact_id != '0'}:
+            phone = self.contacts_cache.get(contact_id, MISSING)
+            if phone is MISSING:
+                ids.append(contact_id)
+            else:
+                phones[contact_id] = phone
+
+        for i in range(0, len(ids), CONTACTS_FILTER_SIZE):
+            contacts = await self.bitrix.get_all('crm.contact.list', params=
+            {
+                'filter': {"@ID": ids[i:i + CONTACTS_FILTER_SIZE]},
+                'select': ["ID", "PHONE"],
+            })
+            for contact in contacts:
+                phone = contact.get("PHONE")
+                phones[str(contact["ID"])] = phone[0].get("VALUE") if phone else None
+                self.contacts_cache.set(str(contact["ID"]), phones[str(contact["ID"])])
+        logger.info(
+            "contacts phones resolved",
+            requested=len(ids), cache_hits=self.contacts_cache.hits, cache_misses=self.contacts_cache.misses
+        )
+        return phones
+
     async def load_deals_to_sasha(self, deals: list[dict]):
         # potencial_deals = []
         # general_deals = []
@@ -66,102 +210,40 @@ class BitrixService:
         r = await self.sasha.add_contacts(deals, webhook=self.sasha.webhooks.stuck.get_secret_value())
         skipped_results.extend(r.get("skippedPhones", []))
         #     skipped_results.extend(r.get("skippedPhones", []))
-        return skipped_results
-
-    async def deals(self, filters: dict) -> list[dict]:
-        deals: list[dict] = await self.bitrix.get_all('crm.deal.list', params=
-        {
-            'filter': filters,
-            "select": [
-                "SOURCE_ID",
-                "CONTACT_ID",
-                "TITLE",
-                "UF_CRM_668D021E4CCFE",
-                "UF_CRM_1697023059779",
-                "UF_CRM_1697023812515",
-                "UF_CRM_1720783729",
-                "UF_CRM_1720783739",
-                "UF_CRM_1720783750",
-                "UF_CRM_628B829FDFAED",
-                "UF_CRM_671265881185F",
-                "PHONE"
-            ]
-        })
-        return deals
-
-    async def move_cold_deals_prepairing(self) -> None:
-        """
-        Перенос сделок, находящихся более 30 дней в "Ожидании решения" в прогрев.
-                        # "@SOURCE_ID": [s["id"] for s in self.parsed_sources],
-        :return:
-        """
-        if not self.parsed_sources:
-            await self.sources()
-        deals = await self.deals(
-            {
-                "STAGE_ID": "C20:FINAL_INVOICE",
-                "<MOVED_TIME": f"{(datetime.now(tz=UTC) - timedelta(seconds=10)).isoformat()}",
-                ">DATE_CREATE": f"{(datetime(2026, 1, 13, tzinfo=UTC)).isoformat()}",
-                "=%TITLE": "%test%"
-            }
-        )
-        for deal in deals:
+        return skipped_results, r.get("failedPhones", [])
 
-            await self.bitrix.call(
-                "crm.timeline.comment.add",
-                {
-                    "fields": {
-                        "ENTITY_ID": deal["ID"],
-                        "ENTITY_TYPE": "deal",
-                        "COMMENT": 'Сделка перенесена в [B]"Новый прогрев"[/B] так как более [B]30 дней[/B] находится на стадии [B]"Ожидание решения"[/B].',
-                    }
-                },
-            )
-            await self.bitrix.call(
-                "crm.item.update",
-                {
-                    "entityTypeId": 2,
-                    "id": deal["ID"],
-                    "fields": {
-                        "STAGE_ID": "C27:NEW",
-                        "CATEGORY_ID": "27"
-                    },
-                },
-            )
-
-    async def load_to_sasha(self) -> None:
-        deals = await self.deals(
-            {
-                "STAGE_ID": "C27:NEW",
-                "<MOVED_TIME": f"{(datetime.now(tz=UTC) - timedelta(seconds=30)).isoformat()}",
-            }
-        )
-        if not deals:
-            return
+    async def upload_deals(self, deals: list[dict]) -> DealUpload:
+        """
+        Загрузка сделок в Сашу.
 
+        :return: ID не ушедших в Сашу сделок по причинам - все они остаются в C27:NEW до следующего тика
+        """
         datas = []
+        skipped: set[str] = set()
+
+        to_load: dict[str, list[str]] = {}
 
-        to_load = {}
+        contacts_phones = await self.contacts_phones(deal.get("CONTACT_ID") for deal in deals)
 
         for deal in deals:
             phone = None
             if deal.get("PHONE") and len(deal.get("PHONE")) > 0:
                 phone = deal.get("PHONE")[0].get("VALUE")
 
-            if deal.get("CONTACT_ID") and deal.get("CONTACT_ID") != '0':
-                contact = await self.contact(deal.get("CONTACT_ID"))
-                phone = contact.get("PHONE")[0].get("VALUE")
-                if not contact:
+            contact_id = deal.get("CONTACT_ID")
+            if contact_id and contact_id != '0':
+                if contact_id not in contacts_phones:
+                    skipped.add(deal["ID"])
                     continue
+                phone = contacts_phones[contact_id] or phone
 
             if not phone:
                 print(f"Телефон не найден для сделки, {deal}")
+                skipped.add(deal["ID"])
                 continue
+            phone = normalize_phone(phone) or phone
 
-            # potencial = next(
-            #     (source["is_potencial"] for source in self.parsed_sources if source["id"] == deal.get("SOURCE_ID")),
-            #     False
-            # )
+            # potencial = self.source_registry.is_potencial(deal.get("SOURCE_ID"))
             tags = ["Сделка"]
             # if potencial:
             #     tags.append("potencial")
@@ -171,37 +253,23 @@ class BitrixService:
             data = {
                 "phone": phone,
                 "tags": tags,
-                "additionalFields": {
-                    "deal_id": deal.get("ID"),
-                    "title": deal.get("TITLE"),
-                    "sqm": deal.get(DealFieldsEnum.sqm, "Не указано"),
-                    "width": deal.get(DealFieldsEnum.width, "Не указано"),
-                    "length": deal.get(DealFieldsEnum.length, "Не указано"),
-                    "height": deal.get(DealFieldsEnum.height, "Не указано"),
-                    "region": deal.get(DealFieldsEnum.region, "Не указано"),
-                    "building_type": deal.get("UF_CRM_671265881185F", "Не указано"),
-                    "insulation_walls": deal.get("UF_CRM_1697023059779", "Не указано"),
-                }
+                "additionalFields": DEAL_MAPPING.extract(deal),
             }
-            to_load[phone] = deal
+            to_load.setdefault(phone, []).append(deal["ID"])
             datas.append(data)
 
-        skipped_list = await self.load_deals_to_sasha(
-            datas
-        )
-
-        for deal in deals:
-            await self.bitrix.call(
-                "crm.item.update",
-                {
-                    "entityTypeId": 2,
-                    "id": deal["ID"],
-                    "fields": {
-                        "STAGE_ID": "C27:PREPARATION",
-                        "CATEGORY_ID": "27"
-                    },
-                },
+        # сделки с телефоном, уже загруженным от другой сделки или лида, не грузятся повторно и ждут в C27:NEW
+        kept = self.phones.collapse(datas, "deal")
+        kept_ids = {str(data["additionalFields"]["deal_id"]) for data in kept}
+        collapsed = {str(data["additionalFields"]["deal_id"]) for data in datas} - kept_ids
+        failed_phones = []
+        if kept:
+            skipped_list, failed_phones = await self.load_deals_to_sasha(
+                kept
             )
+            self.phones.remember(kept, "deal", failed_phones)
+        failed = {deal_id for phone in failed_phones for deal_id in to_load.get(phone, ()) if deal_id in kept_ids}
+        return DealUpload(failed=failed, collapsed=collapsed, skipped=skipped)
 
         # for skipped in skipped_list:
         #     skipped_phone = skipped.get("phone")
@@ -219,67 +287,95 @@ class BitrixService:
         #         },
         #     )
 
-    async def rollback_frozen_deals(self) -> None:
-        deals = await self.deals(
-            {
-                "STAGE_ID": "C27:PREPARATION",
-                "<MOVED_TIME": f"{(datetime.now(tz=UTC) - timedelta(days=1)).isoformat()}",
-            }
-        )
-        if not deals:
-            return
-
-        for deal in deals:
-            await self.bitrix.call(
-                "crm.item.update",
-                {
-                    "entityTypeId": 2,
-                    "id": deal["ID"],
-                    "fields": {
-                        "STAGE_ID": "C27:NEW",
-                        "CATEGORY_ID": "27"
-                    },
-                },
-            )
+    async def run_transitions(
+            self, transitions: tuple[Transition, ...] = TRANSITIONS, ids: list[str] | None = None,
+    ) -> int:
+        """
+        Переносы сделок по стадиям: выборки переходов (каждая со своими стадией, границей MOVED_TIME
+        и условиями) уходят одним batch, переносы и комментарии - одним набором batch.
+        Сделки переходов с upload сначала загружаются в Сашу, не загрузившиеся не переносятся.
 
+        :param transitions: переходы одной задачи по расписанию (у каждого правила свой интервал)
+        :param ids: только эти сделки (события Битрикс) - прямо из Битрикс: копия могла еще не получить изменение
+        :return: число перенесенных сделок
+        """
+        await self.source_registry.ensure_fresh()
+        now = datetime.now(tz=UTC)
+        filters = {t.name: rule_filter(t, now) | ({"@ID": ids} if ids is not None else {}) for t in transitions}
+        if self.mirror and ids is None:
+            found = [await self.mirror.select("deal", filters[t.name]) for t in transitions]
+        else:
+            found = list((await fetch_lists(self.bitrix, "crm.deal.list", {
+                t.name: (filters[t.name], rule_select(t)) for t in transitions
+            })).values())
+        deals = [deal for rule_deals in found for deal in rule_deals]
+        # повторная проверка локально: сделка, перенесенная посреди выборки, попадает только в один переход
+        planned = plan(deals, transitions, now)
+
+        commands = {}
+        moved = 0
+        for t in transitions:
+            candidates = planned[t.name]
+            if t.upload and candidates:
+                try:
+                    upload = await self.upload_deals(candidates)
+                except Exception:
+                    # Саша недоступна - сделки перехода ждут следующего тика, остальные переходы выполняются
+                    logger.exception("Deals upload failed", transition=t.name, deals=len(candidates))
+                    upload = DealUpload(failed={deal["ID"] for deal in candidates})
+                held = upload.held
+                if held:
+                    logger.info(
+                        "Deals held in stage", transition=t.name, failed=len(upload.failed),
+                        collapsed=len(upload.collapsed), skipped=len(upload.skipped),
+                    )
+                candidates = [deal for deal in candidates if deal["ID"] not in held]
+            for deal in candidates:
+                fields = stage_fields(deal, t.target)
+                if t.comment:
+                    commands[f"comment_{deal['ID']}"] = (
+                        "crm.timeline.comment.add",
+                        {"fields": {"ENTITY_ID": deal["ID"], "ENTITY_TYPE": "deal", "COMMENT": t.comment}},
+                    )
+                commands[f"update_{deal['ID']}"] = move_command(deal["ID"], fields)
+                moved += 1
+        logger.info(
+            "Deal transitions planned", fetched=len(deals),
+            **{t.name: len(planned[t.name]) for t in transitions}, commands=len(commands),
+        )
+        await self.batch(commands)
+        return moved
+
+    async def leads(self, filters: dict, select: list[str] | None = None, local: bool = True) -> list[dict]:
+        """:param local: можно выбрать из CrmMirror (в копии есть все поля, select не нужен)"""
+        if self.mirror and local:
+            return await self.mirror.select("lead", filters)
+        return await fetch_list(
+            self.bitrix, 'crm.lead.list', filters, select or LEAD_MAPPING.select,
+            mode=self.list_mode, windows=self.list_windows,
+        )
 
-    async def leads(self, filters: dict) -> list[dict]:
-        leads: list[dict] = await self.bitrix.get_all('crm.lead.list', params=
-        {
-            'filter': filters,
-            "select": [
-                "SOURCE_ID",
-                "CONTACT_ID",
-                "PHONE",
-                "TITLE",
-
-                "UF_*",
-                # "UF_CRM_1653303699", # регион строит,
-                # "UF_CRM_1720783603", # ширина,
-                # "UF_CRM_1720783619", # длина,
-                # "UF_CRM_1720783631", # высота,
-                # "UF_CRM_1725886337", # назначение,
-                # "UF_CRM_1738307952054" # ориентировачные сроки,
-            ]
-        })
-        return leads
-
-    async def load_leads_to_sasha(self):
-        if not self.parsed_sources:
-            await self.sources()
+    async def load_leads_to_sasha(self, ids: list[str] | None = None) -> int:
+        """
+        :param ids: только эти лиды (события Битрикс), по умолчанию - все подходящие
+        :return: число найденных лидов, которые еще не отправлялись, изменились или ждали повтора дольше cooldown
+        """
+        await self.source_registry.ensure_fresh()
         logger.info("load_leads_to_sasha")
-        leads = await self.leads(
-            {
-                "@SOURCE_ID": [s["id"] for s in self.parsed_sources],
-                "STATUS_ID": "NEW",
-                ">DATE_CREATE": f"{(datetime.now(tz=UTC) - timedelta(days=7)).isoformat()}",
-                "=%TITLE": "%test%",
-                "UF_CRM_1765365691799": False # ПРОЗВОНИВШИЕ УЖЕ НЕ НАДО
-            }
-        )
+        filters = {
+            "@SOURCE_ID": self.source_registry.ids,
+            "STATUS_ID": LEAD_LOAD_STATUS,
+            ">DATE_CREATE": f"{(datetime.now(tz=UTC) - timedelta(days=7)).isoformat()}",
+            "=%TITLE": "%test%",
+            "UF_CRM_1765365691799": False # ПРОЗВОНИВШИЕ УЖЕ НЕ НАДО
+        }
+        if ids is not None:
+            filters["@ID"] = ids
+        leads = await self.leads(filters, local=ids is None)
         logger.info(f"{len(leads)} leads can be loaded to sasha")
         datas = []
-        potential_datas = []
+
+        contacts_phones = await self.contacts_phones(lead.get("CONTACT_ID") for lead in leads)
 
         for lead in leads:
             phone = None
@@ -287,43 +383,55 @@ class BitrixService:
             if lead.get("PHONE") and len(lead.get("PHONE")) > 0:
                 phone = lead.get("PHONE")[0].get("VALUE")
 
-            if lead.get("CONTACT_ID") and lead.get("CONTACT_ID") != '0':
-                contact = await self.contact(lead.get("CONTACT_ID"))
-                phone = contact.get("PHONE")[0].get("VALUE")
-                if not contact:
+            contact_id = lead.get("CONTACT_ID")
+            if contact_id and contact_id != '0':
+                if contact_id not in contacts_phones:
                     continue
+                phone = contacts_phones[contact_id] or phone
 
             if not phone:
                 print(f"Телефон не найден для лида, {lead}")
                 continue
-            is_potencial = next(
-                (source["is_potencial"] for source in self.parsed_sources if source["id"] == lead.get("SOURCE_ID")),
-                False
-            )
+            phone = normalize_phone(phone) or phone
+            is_potencial = self.source_registry.is_potencial(lead.get("SOURCE_ID"))
             tags = ["Лид"]
 
             data = {
                 "phone": phone,
                 "tags": tags,
-                "additionalFields": {
-                    "lead_id": lead.get("ID"),
-                    "title": lead.get("TITLE"),
-                    "region": lead.get(LeadFieldsEnum.region, "Не указано"),
-                    "width": lead.get(LeadFieldsEnum.width, "Не указано"),
-                    "length": lead.get(LeadFieldsEnum.length, "Не указано"),
-                    "height": lead.get(LeadFieldsEnum.height, "Не указано"),
-                    "purpose": lead.get("UF_CRM_1725886337", "Не указано"),
-                    "deadline": lead.get("UF_CRM_1738307952054", "Не указано"),
-                }
+                "additionalFields": LEAD_MAPPING.extract(lead),
             }
             if is_potencial:
                 tags.append("potencial")
-                potential_datas.append(data)
-            else:
-                datas.append(data)
+            datas.append(data)
 
+        hashes = {str(data["additionalFields"]["lead_id"]): content_hash(data) for data in datas}
+        if self.ledger:
+            pending = await self.ledger.pending("lead", hashes)
+            datas = [data for data in datas if str(data["additionalFields"]["lead_id"]) in pending]
+            hashes = {lead_id: hashes[lead_id] for lead_id in pending}
+        candidates = datas
+
+        datas = self.phones.collapse(datas, "lead")
+        potential_datas = [data for data in datas if "potencial" in data["tags"]]
+        datas = [data for data in datas if "potencial" not in data["tags"]]
+
+        failed_phones = set()
         if datas:
-            await self.sasha.add_contacts(datas, webhook=self.sasha.webhooks.default.get_secret_value())
+            r = await self.sasha.add_contacts(datas, webhook=self.sasha.webhooks.default.get_secret_value())
+            failed_phones.update(r.get("failedPhones", []))
 
         if potential_datas:
-            await self.sasha.add_contacts(potential_datas, webhook=self.sasha.webhooks.potencial.get_secret_value())
+            r = await self.sasha.add_contacts(potential_datas, webhook=self.sasha.webhooks.potencial.get_secret_value())
+            failed_phones.update(r.get("failedPhones", []))
+
+        self.phones.remember(datas + potential_datas, "lead", failed_phones)
+        if self.ledger:
+            # схлопнутые дубликаты тоже отмечаются: их телефон уже ушел в Сашу
+            failed_ids = {
+                str(data["additionalFields"]["lead_id"]) for data in candidates if data["phone"] in failed_phones
+            }
+            await self.ledger.record(
+                "lead", {lead_id: digest for lead_id, digest in hashes.items() if lead_id not in failed_ids}
+            )
+        return len(hashes)
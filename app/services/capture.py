@@ -0,0 +1,185 @@
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import re
+import secrets
+import time
+from collections import deque
+from pathlib import Path
+from typing import Any
+
+import structlog
+
+from app.services.phones import normalize_phone
+
+logger = structlog.get_logger(service="TrafficCapture")
+
+# кандидаты в телефоны в свободном тексте (реплики диалога): от 10 до 15 цифр с +, пробелами, скобками
+# и дефисами, не внутри слова или числа
+PHONE_CANDIDATE = re.compile(r"(?<![\w+])\+?\d[\d\s()\-]{8,20}\d(?!\w)")
+# поля CallResultEvent с телефоном целиком: объект -> ключи
+PHONE_FIELDS = {
+    "contact": ("phone",),
+    "callDetails": ("from", "to", "destinationPhone"),
+}
+
+
+class PhoneRedactor:
+    """
+    Замена телефонов в тексте на стабильные подставные номера +7999XXXXXXX.
+
+    Один номер в разном написании получает одну подмену (по нормализованному виду),
+    поэтому при повторе дубли и повторные звонки остаются дублями - во всех процессах с одной солью salt.
+    Хэш с секретной солью: перебором 10^10 номеров подмену обратно не восстановить.
+    Без salt соль случайная, и подмены совпадают только в пределах процесса.
+    """
+
+    def __init__(self, salt: str | None = None):
+        self.salt = hashlib.sha256(salt.encode()).digest() if salt else secrets.token_bytes(16)
+
+    def pseudonym(self, phone: str) -> str:
+        digest = hashlib.blake2b(phone.encode(), key=self.salt, digest_size=8).digest()
+        return f"+7999{int.from_bytes(digest) % 10 ** 7:07d}"
+
+    def _replace(self, match: re.Match) -> str:
+        candidate = match.group(0)
+        digits = sum(c.isdigit() for c in candidate)
+        if not 10 <= digits <= 15:
+            return candidate
+        return self.pseudonym(normalize_phone(candidate) or candidate)
+
+    def redact(self, text: str) -> str:
+        """Подменить все похожие на телефон числа в свободном тексте."""
+        return PHONE_CANDIDATE.sub(self._replace, text)
+
+    def _redact_phone(self, value: Any) -> Any:
+        if not isinstance(value, str) or not value:
+            return value
+        return self.pseudonym(normalize_phone(value) or value)
+
+    def _redact_message(self, message: Any) -> Any:
+        if isinstance(message, dict) and isinstance(message.get("content"), str):
+            return {**message, "content": self.redact(message["content"])}
+        return message
+
+    def _walk(self, node: Any, parent: str | None = None) -> Any:
+        if isinstance(node, list):
+            return [self._walk(item, parent) for item in node]
+        if not isinstance(node, dict):
+            return node
+        phone_keys = PHONE_FIELDS.get(parent, ())
+        redacted = {}
+        for key, value in node.items():
+            if key in phone_keys:
+                redacted[key] = self._redact_phone(value)
+            elif parent == "callDetails" and key == "chatHistory" and isinstance(value, list):
+                redacted[key] = [self._redact_message(message) for message in value]
+            elif parent == "callList" and key == "phones" and isinstance(value, list):
+                redacted[key] = [self._redact_phone(phone) for phone in value]
+            else:
+                redacted[key] = self._walk(value, key)
+        return redacted
+
+    def redact_body(self, body: str) -> str:
+        """
+        Тело вебхука без телефонов: подменяются только поля с телефоном (PHONE_FIELDS, номера линий обзвона)
+        и телефоны в репликах диалога - ID, время и прочие числа остаются как есть.
+        Тело не JSON - подменяется все похожее на телефон.
+        """
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            return self.redact(body)
+        return json.dumps(self._walk(payload), ensure_ascii=False)
+
+
+class TrafficCapture:
+    """
+    Запись тел входящих вебхуков в JSONL-сегменты gzip для повтора нагрузки (benchmarks/replay_webhooks.py).
+
+    Вебхук только кладет тело в буфер, телефоны вырезаются и строки пишутся в фоне раз в flush_interval секунд.
+    Строка: {"ts": unix-время, "webhook_id": ..., "body": тело без телефонов}.
+    Сегмент закрывается после segment_bytes несжатых байт, хранятся последние max_segments сегментов процесса.
+    При переполнении буфера (диск не успевает) тела отбрасываются, вебхук не ждет записи.
+    Без directory запись выключена, record ничего не делает.
+    """
+
+    def __init__(
+            self,
+            directory: str | None,
+            segment_bytes: int = 64 * 1024 ** 2,
+            max_segments: int = 20,
+            buffer_size: int = 10_000,
+            flush_interval: float = 1.0,
+            salt: str | None = None,
+    ):
+        self.enabled = directory is not None
+        self.directory = Path(directory or ".")
+        self.segment_bytes = segment_bytes
+        self.max_segments = max_segments
+        self.flush_interval = flush_interval
+        self.redactor = PhoneRedactor(salt)
+        if self.enabled and not salt:
+            logger.warning("Capture salt is not set, phone pseudonyms differ between processes")
+
+        self._buffer: deque[tuple[float, str, bytes]] = deque(maxlen=buffer_size)
+        self.dropped = 0
+        self._segment: Path | None = None
+        self._written = 0
+
+    def record(self, webhook_id: str, body: bytes) -> None:
+        if not self.enabled:
+            return
+        if len(self._buffer) == self._buffer.maxlen:
+            self.dropped += 1
+        self._buffer.append((time.time(), str(webhook_id), body))
+
+    def _segments(self) -> list[Path]:
+        return sorted(self.directory.glob(f"webhooks-*-{os.getpid()}.jsonl.gz"))
+
+    def _rotate(self) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # новый сегмент появится при первой записи, из прежних остаются max_segments - 1
+        segments = self._segments()
+        for old in segments[:max(0, len(segments) - self.max_segments + 1)]:
+            old.unlink(missing_ok=True)
+        self._segment = self.directory / f"webhooks-{time.time_ns()}-{os.getpid()}.jsonl.gz"
+        self._written = 0
+
+    def _write(self, records: list[tuple[float, str, bytes]]) -> None:
+        if self._segment is None or self._written >= self.segment_bytes:
+            self._rotate()
+        lines = "".join(
+            json.dumps(
+                {"ts": ts, "webhook_id": webhook_id, "body": self.redactor.redact_body(body.decode(errors="replace"))},
+                ensure_ascii=False,
+            ) + "\n"
+            for ts, webhook_id, body in records
+        ).encode()
+        # каждый сброс - отдельный член gzip: файл читается целиком, даже если процесс упал посреди записи
+        with gzip.open(self._segment, "ab") as f:
+            f.write(lines)
+        self._written += len(lines)
+
+    async def flush(self) -> int:
+        records = list(self._buffer)
+        self._buffer.clear()
+        if records:
+            await asyncio.to_thread(self._write, records)
+        return len(records)
+
+    async def run(self) -> None:
+        try:
+            while True:
+                await asyncio.sleep(self.flush_interval)
+                try:
+                    await self.flush()
+                except Exception as e:
+                    logger.error("Capture flush failed", error=str(e))
+                if self.dropped:
+                    logger.warning("Capture buffer overflow", dropped=self.dropped)
+                    self.dropped = 0
+        finally:
+            await self.flush()
@@ -0,0 +1,143 @@
+import asyncio
+import json
+import time
+from typing import Awaitable, Callable
+
+import structlog
+
+from app.core.resilience import CircuitBreaker, backoff_delay
+from app.core.sqlite import SQLiteStore
+
+logger = structlog.get_logger(service="DeadLetterStore")
+
+Handler = Callable[[dict], Awaitable[object]]
+
+
+class DeadLetterStore(SQLiteStore):
+    """
+    Вызовы внешних API, которые не удалось выполнить: вид (webhooks), тело и последняя ошибка.
+
+    Повтор берет письмо так же, как SQLiteQueue: сдвигает next_attempt_at на lease секунд,
+    поэтому одно письмо не повторяется параллельно в двух процессах.
+    Письма старше ttl не повторяются и удаляются: поздний результат звонка может затереть поля, которые уже меняли.
+    """
+
+    schema = """
+        CREATE TABLE IF NOT EXISTS dead_letters (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            error TEXT,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            created_at REAL NOT NULL,
+            next_attempt_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS ix_dead_letters_due ON dead_letters (kind, next_attempt_at);
+    """
+
+    def __init__(self, path: str, ttl: float = 6 * 3600, lease: float = 300, max_delay: float = 3600):
+        super().__init__(path)
+        self.ttl = ttl
+        self.lease = lease
+        self.max_delay = max_delay
+
+    async def put(self, kind: str, payload: dict, error: str) -> int:
+        now = time.time()
+        rows = await self.execute(
+            "INSERT INTO dead_letters (kind, payload, error, created_at, next_attempt_at) "
+            "VALUES (?, ?, ?, ?, ?) RETURNING id",
+            (kind, json.dumps(payload, ensure_ascii=False), error, now, now),
+        )
+        logger.warning("Call dead-lettered", kind=kind, id=rows[0][0], error=error)
+        return rows[0][0]
+
+    async def claim(self, kind: str) -> tuple[int, dict, int] | None:
+        """Забрать первое письмо, которое пора повторить: (id, payload, номер попытки) или None."""
+        now = time.time()
+        expired = await self.execute(
+            "DELETE FROM dead_letters WHERE kind = ? AND created_at < ? RETURNING id", (kind, now - self.ttl)
+        )
+        if expired:
+            logger.error("Dead letters expired without replay", kind=kind, count=len(expired))
+        rows = await self.execute(
+            """
+            UPDATE dead_letters SET next_attempt_at = ?, attempts = attempts + 1
+            WHERE id = (
+                SELECT id FROM dead_letters WHERE kind = ? AND next_attempt_at <= ? ORDER BY id LIMIT 1
+            )
+            RETURNING id, payload, attempts
+            """,
+            (now + self.lease, kind, now),
+        )
+        if not rows:
+            return None
+        letter_id, payload, attempts = rows[0]
+        return letter_id, json.loads(payload), attempts
+
+    async def ack(self, letter_id: int) -> None:
+        await self.execute("DELETE FROM dead_letters WHERE id = ?", (letter_id,))
+
+    async def postpone(self, letter_id: int, attempts: int, error: str) -> None:
+        delay = backoff_delay(attempts, base=30, cap=self.max_delay)
+        await self.execute(
+            "UPDATE dead_letters SET next_attempt_at = ?, error = ? WHERE id = ?",
+            (time.time() + delay, error, letter_id),
+        )
+
+    async def counts(self) -> dict[str, int]:
+        rows = await self.execute("SELECT kind, COUNT(*) FROM dead_letters GROUP BY kind")
+        return dict(rows)
+
+
+class DeadLetterReplayer:
+    """
+    Повтор писем DeadLetterStore.
+
+    У каждого вида писем свой обработчик и предохранитель API, в которое он ходит:
+    пока предохранитель разомкнут, письма этого вида не трогаются, а его замыкание сразу будит повтор.
+    Без замыканий письма проверяются раз в interval секунд.
+    """
+
+    def __init__(self, store: DeadLetterStore, interval: float = 60):
+        self.store = store
+        self.interval = interval
+        self._handlers: dict[str, tuple[Handler, CircuitBreaker]] = {}
+        self._wakeup = asyncio.Event()
+
+    def register(self, kind: str, handler: Handler, breaker: CircuitBreaker) -> None:
+        self._handlers[kind] = (handler, breaker)
+        breaker.on_close(self._wakeup.set)
+
+    async def replay(self, kind: str) -> int:
+        """:return: число успешно повторенных писем"""
+        handler, breaker = self._handlers[kind]
+        replayed = 0
+        while not breaker.is_open:
+            letter = await self.store.claim(kind)
+            if letter is None:
+                break
+            letter_id, payload, attempts = letter
+            try:
+                await handler(payload)
+            except Exception as e:
+                logger.warning("Dead letter replay failed", kind=kind, id=letter_id, attempt=attempts, error=str(e))
+                await self.store.postpone(letter_id, attempts, str(e))
+                continue
+            await self.store.ack(letter_id)
+            replayed += 1
+        if replayed:
+            logger.info("Dead letters replayed", kind=kind, replayed=replayed)
+        return replayed
+
+    async def run(self) -> None:
+        while True:
+            self._wakeup.clear()
+            for kind in self._handlers:
+                try:
+                    await self.replay(kind)
+                except Exception as e:
+                    logger.error("Dead letter replay crashed", kind=kind, error=str(e))
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
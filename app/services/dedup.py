@@ -0,0 +1,107 @@
+import time
+
+import structlog
+
+from app.core.metrics import WEBHOOK_DUPLICATES
+from app.core.sqlite import SQLiteStore
+from app.services.cache import TTLCache
+
+logger = structlog.get_logger(service="EventDeduplicator")
+
+
+class EventDeduplicator(SQLiteStore):
+    """
+    Отсев повторных доставок событий и учет выполненных шагов их обработки.
+
+    Недавние ключи держатся в ограниченном кэше в памяти,
+    все ключи за ttl секунд - в таблице processed_events (общей для всех процессов).
+    Шаги (completed/complete) отмечаются в той же таблице, но только после выполнения:
+    повтор обработки пропускает уже сделанное.
+    """
+
+    schema = """
+        CREATE TABLE IF NOT EXISTS processed_events (
+            key TEXT PRIMARY KEY,
+            created_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS ix_processed_events_created ON processed_events (created_at);
+    """
+
+    def __init__(self, path: str, ttl: float = 3 * 24 * 3600, memory_size: int = 10_000):
+        super().__init__(path)
+        self.ttl = ttl
+        self._recent = TTLCache(maxsize=memory_size, ttl=ttl)
+        self._inserts = 0
+
+        self.duplicates_dropped = 0
+
+    def _claim(self, keys: list[str]) -> bool:
+        now = time.time()
+        placeholders = ", ".join("?" for _ in keys)
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            seen = self.conn.execute(
+                f"SELECT 1 FROM processed_events WHERE key IN ({placeholders}) AND created_at >= ? LIMIT 1",
+                (*keys, now - self.ttl),
+            ).fetchone()
+            if not seen:
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO processed_events (key, created_at) VALUES (?, ?)",
+                    [(key, now) for key in keys],
+                )
+                self._inserts += 1
+                if self._inserts % 1000 == 0:
+                    self.conn.execute("DELETE FROM processed_events WHERE created_at < ?", (now - self.ttl,))
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        return not seen
+
+    async def is_duplicate(self, *keys: str | None) -> bool:
+        """
+        Проверить и сразу отметить ключи события как обработанные.
+        Дубликат - если хотя бы один ключ уже встречался за ttl.
+        """
+        keys = [key for key in keys if key]
+        if not keys:
+            return False
+
+        if any(self._recent.get(key) for key in keys) or not await self.run(self._claim, keys):
+            self.duplicates_dropped += 1
+            WEBHOOK_DUPLICATES.inc()
+            logger.info("duplicate event dropped", keys=keys, duplicates_dropped=self.duplicates_dropped)
+            return True
+
+        for key in keys:
+            self._recent.set(key, True)
+        return False
+
+    async def forget(self, *keys: str | None) -> None:
+        """Снять отметку, если событие не удалось обработать и его нужно принять повторно."""
+        keys = [key for key in keys if key]
+        for key in keys:
+            self._recent.invalidate(key)
+        await self.run(
+            lambda: self.conn.executemany("DELETE FROM processed_events WHERE key = ?", [(key,) for key in keys])
+        )
+
+    async def completed(self, *keys: str) -> set[str]:
+        """Какие из ключей шагов уже отмечены выполненными за ttl."""
+        if not keys:
+            return set()
+        placeholders = ", ".join("?" for _ in keys)
+        rows = await self.execute(
+            f"SELECT key FROM processed_events WHERE key IN ({placeholders}) AND created_at >= ?",
+            (*keys, time.time() - self.ttl),
+        )
+        return {row[0] for row in rows}
+
+    async def complete(self, *keys: str) -> None:
+        """Отметить шаги выполненными."""
+        now = time.time()
+        await self.run(
+            lambda: self.conn.executemany(
+                "INSERT OR REPLACE INTO processed_events (key, created_at) VALUES (?, ?)", [(key, now) for key in keys]
+            )
+        )
@@ -0,0 +1,91 @@
+import hashlib
+import json
+import time
+
+import structlog
+
+from app.core.sqlite import SQLiteStore
+
+logger = structlog.get_logger(service="UploadLedger")
+
+IDS_PER_QUERY = 500  # ID в одном IN (...), с запасом до лимита переменных SQLite
+
+
+def content_hash(contact: dict) -> str:
+    """Хэш контакта в том виде, в котором он уходит в Сашу."""
+    body = json.dumps(contact, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.blake2b(body.encode(), digest_size=16).hexdigest()
+
+
+class UploadLedger(SQLiteStore):
+    """
+    Журнал сущностей, загруженных в Сашу: ID, хэш отправленного контакта и время отправки.
+
+    Сущность отправляется снова, только если ее еще не отправляли, если контакт изменился
+    или если с последней отправки прошло cooldown секунд. Записи старше retention удаляются.
+    """
+
+    schema = """
+        CREATE TABLE IF NOT EXISTS sasha_uploads (
+            entity TEXT NOT NULL,
+            id TEXT NOT NULL,
+            hash TEXT NOT NULL,
+            uploaded_at REAL NOT NULL,
+            PRIMARY KEY (entity, id)
+        );
+        CREATE INDEX IF NOT EXISTS ix_sasha_uploads_uploaded ON sasha_uploads (uploaded_at);
+    """
+
+    def __init__(self, path: str, cooldown: float = 24 * 3600, retention: float = 30 * 24 * 3600):
+        super().__init__(path)
+        self.cooldown = cooldown
+        self.retention = max(retention, cooldown)
+        self._records = 0
+
+    def _pending(self, entity: str, hashes: dict[str, str]) -> set[str]:
+        ids = list(hashes)
+        resend_before = time.time() - self.cooldown
+        sent: dict[str, tuple[str, float]] = {}
+        for i in range(0, len(ids), IDS_PER_QUERY):
+            chunk = ids[i:i + IDS_PER_QUERY]
+            rows = self.conn.execute(
+                f"SELECT id, hash, uploaded_at FROM sasha_uploads "
+                f"WHERE entity = ? AND id IN ({', '.join('?' for _ in chunk)})",
+                (entity, *chunk),
+            ).fetchall()
+            sent.update((entity_id, (digest, uploaded_at)) for entity_id, digest, uploaded_at in rows)
+        return {
+            entity_id for entity_id, digest in hashes.items()
+            if entity_id not in sent or sent[entity_id][0] != digest or sent[entity_id][1] < resend_before
+        }
+
+    def _record(self, entity: str, hashes: dict[str, str]) -> None:
+        now = time.time()
+        self.conn.execute("BEGIN")
+        try:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO sasha_uploads (entity, id, hash, uploaded_at) VALUES (?, ?, ?, ?)",
+                [(entity, entity_id, digest, now) for entity_id, digest in hashes.items()],
+            )
+            self._records += 1
+            if self._records % 100 == 0:
+                self.conn.execute("DELETE FROM sasha_uploads WHERE uploaded_at < ?", (now - self.retention,))
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+
+    async def pending(self, entity: str, hashes: dict[str, str]) -> set[str]:
+        """
+        :param hashes: {ID сущности: content_hash контакта}
+        :return: ID, которые нужно отправить
+        """
+        if not hashes:
+            return set()
+        pending = await self.run(self._pending, entity, hashes)
+        logger.info("Upload ledger checked", entity=entity, candidates=len(hashes), pending=len(pending))
+        return pending
+
+    async def record(self, entity: str, hashes: dict[str, str]) -> None:
+        if hashes:
+            await self.run(self._record, entity, hashes)
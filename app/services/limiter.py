@@ -0,0 +1,263 @@
+import asyncio
+import enum
+import heapq
+import itertools
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+
+import structlog
+from aiohttp import ClientConnectionError, ClientPayloadError
+from fast_bitrix24 import BitrixAsync
+from fast_bitrix24.srh import ServerError, ServerRequestHandler
+
+from app.core.metrics import BITRIX_LIMITER_WAIT_SECONDS, BITRIX_REQUEST_SECONDS
+from app.core.resilience import CircuitBreaker
+
+logger = structlog.get_logger(service="BitrixRateLimiter")
+
+OPERATING_LIMIT = 480  # секунд работы метода за 10 минут, после которых Битрикс начинает блокировать
+
+
+class Priority(enum.IntEnum):
+    INTERACTIVE = 0  # обработка результатов звонков и событий
+    BULK = 1  # периодические синхронизации
+
+
+bitrix_priority: ContextVar[Priority] = ContextVar("bitrix_priority", default=Priority.BULK)
+
+
+@contextmanager
+def priority_lane(priority: Priority):
+    """Все запросы к Битрикс внутри блока (и в порожденных задачах) идут в полосе priority."""
+    token = bitrix_priority.set(priority)
+    try:
+        yield
+    finally:
+        bitrix_priority.reset(token)
+
+
+class BitrixRateLimiter:
+    """
+    Модель leaky bucket портала: пул pool_size запросов, утекающий со скоростью rate в секунду.
+
+    Ожидающие запросы выдаются по приоритету, последние reserve мест пула
+    доступны только интерактивной полосе. Скорость падает вдвое на QUERY_LIMIT_EXCEEDED
+    и при приближении operating к лимиту, и плавно восстанавливается на успешных ответах.
+    """
+
+    def __init__(self, pool_size: int = 50, rate: float = 2.0, reserve: int = 10, min_rate: float = 0.2):
+        self.capacity = pool_size
+        self.max_rate = rate
+        self.min_rate = min_rate
+        self.rate = rate
+        self.reserve = reserve
+
+        self.level = 0.0
+        self._updated_at = time.monotonic()
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._dispatcher: asyncio.Task | None = None
+        self._wakeup = asyncio.Event()
+
+    def _leak(self) -> None:
+        now = time.monotonic()
+        self.level = max(0.0, self.level - (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def _limit(self, priority: Priority) -> float:
+        return self.capacity if priority == Priority.INTERACTIVE else self.capacity - self.reserve
+
+    async def acquire(self, priority: Priority | None = None) -> None:
+        priority = bitrix_priority.get() if priority is None else priority
+        self._leak()
+        if not self._waiters and self.level + 1 <= self._limit(priority):
+            self.level += 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        self._wakeup.set()
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        await future
+
+    async def _dispatch(self) -> None:
+        while self._waiters:
+            priority, _, future = self._waiters[0]
+            if future.done():  # ожидающий отменен
+                heapq.heappop(self._waiters)
+                continue
+            self._leak()
+            free = self._limit(priority) - self.level
+            if free >= 1:
+                heapq.heappop(self._waiters)
+                self.level += 1
+                future.set_result(None)
+                continue
+            # новый ожидающий мог оказаться приоритетнее текущего - просыпаемся и пересчитываем
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=(1 - free) / self.rate)
+            except asyncio.TimeoutError:
+                pass
+
+    def penalize(self) -> None:
+        """QUERY_LIMIT_EXCEEDED: портал считает пул переполненным."""
+        self.rate = max(self.min_rate, self.rate / 2)
+        self.level = self.capacity
+        self._updated_at = time.monotonic()
+        logger.warning("Bitrix query limit exceeded, slowing down", rate=self.rate)
+
+    def observe(self, timing: dict | None) -> None:
+        """Учесть блок time из ответа Битрикс."""
+        operating = (timing or {}).get("operating") or 0
+        if operating > OPERATING_LIMIT * 0.8:
+            self.rate = max(self.min_rate, self.rate / 2)
+            logger.warning("Bitrix operating time is close to limit", operating=operating, rate=self.rate)
+        elif self.rate < self.max_rate:
+            self.rate = min(self.max_rate, self.rate + self.max_rate * 0.05)
+
+
+def is_query_limit(error: BaseException) -> bool:
+    return isinstance(error, ServerError) and getattr(error.__cause__, "status", None) == 503
+
+
+def is_outage(error: BaseException) -> bool:
+    """Битрикс недоступен (5xx, обрыв, таймаут), а не отказал в конкретном запросе или попросил сбавить скорость."""
+    if is_query_limit(error):
+        return False
+    return isinstance(error, (ServerError, ClientConnectionError, ClientPayloadError, asyncio.TimeoutError))
+
+
+def observe_request(method: str, params: dict | None, response: dict | None, outcome: str, seconds: float) -> None:
+    """
+    Записать запрос в BITRIX_REQUEST_SECONDS.
+
+    call() и страницы get_all() fast_bitrix24 отправляет через batch, поэтому кроме самого batch
+    каждая его команда пишется под своим методом (как в srh.add_throttler_records):
+    время - duration из result_time, если Битрикс его вернул, иначе время всего запроса.
+    """
+    BITRIX_REQUEST_SECONDS.labels(method=method, outcome=outcome).observe(seconds)
+    if method != "batch" or not params or not params.get("cmd"):
+        return
+    result = (response or {}).get("result") or {}
+    times = result.get("result_time") or {}
+    errors = result.get("result_error") or {}
+    for label, command in params["cmd"].items():
+        command_method = command.split("?", 1)[0]
+        timing = times.get(label) if isinstance(times, dict) else None
+        BITRIX_REQUEST_SECONDS.labels(
+            method=command_method,
+            outcome="error" if label in errors else outcome,
+        ).observe(timing.get("duration", seconds) if isinstance(timing, dict) else seconds)
+
+
+class LimitedRequestHandler(ServerRequestHandler):
+    """
+    srh клиента LimitedBitrixAsync: каждая попытка запроса проходит через предохранитель breaker
+    и общий BitrixRateLimiter - пока Битрикс лежит, запросы сразу падают с CircuitOpenError,
+    а не перебирают 10 повторов fast_bitrix24.
+
+    Кроме того, всегда оставляет call() и get_all() хотя бы одно место.
+    MultipleServerRequestHandler запускает столько задач, сколько видит свободных мест
+    (mcr_cur_limit - concurrent_requests), и не запускает ни одной, когда лимит занят другими вызовами
+    (после 503 он еще и делится на 3) - run() тогда сразу возвращает None: call() и страницы get_all()
+    под нагрузкой молча не отправлялись. Здесь занятые места считаются в in_flight, а concurrent_requests
+    всегда на одно меньше лимита; лишняя задача дождется места в limit_concurrent_requests.
+    """
+
+    def __init__(self, *args, limiter: BitrixRateLimiter, breaker: CircuitBreaker | None = None, **kwargs):
+        self.in_flight = 0
+        super().__init__(*args, **kwargs)
+        self.limiter = limiter
+        self.breaker = breaker or CircuitBreaker("bitrix")
+
+    @property
+    def concurrent_requests(self) -> int:
+        return min(self.in_flight, max(int(self.mcr_cur_limit) - 1, 0))
+
+    @concurrent_requests.setter
+    def concurrent_requests(self, value: int) -> None:
+        self.in_flight = value
+
+    @asynccontextmanager
+    async def limit_concurrent_requests(self):
+        while self.in_flight > self.mcr_cur_limit:
+            self.request_complete.clear()
+            await self.request_complete.wait()
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self.request_complete.set()
+
+    async def request_attempt(self, method: str, params: dict | None = None) -> dict:
+        async with self.breaker.guard(is_failure=is_outage):
+            return await self._limited_attempt(method, params)
+
+    async def _limited_attempt(self, method: str, params: dict | None = None) -> dict:
+        priority = bitrix_priority.get()
+        start = time.perf_counter()
+        await self.limiter.acquire(priority)
+        sent_at = time.perf_counter()
+        BITRIX_LIMITER_WAIT_SECONDS.labels(priority=priority.name).observe(sent_at - start)
+
+        outcome = "error"
+        response = None
+        try:
+            response = await super().request_attempt(method, params)
+            outcome = "ok"
+        except ServerError as e:
+            # QUERY_LIMIT_EXCEEDED приходит как 503, повторит запрос сам fast_bitrix24
+            if is_query_limit(e):
+                outcome = "query_limit"
+                self.limiter.penalize()
+            raise
+        finally:
+            observe_request(method, params, response, outcome, time.perf_counter() - sent_at)
+        self.limiter.observe(response.get("time"))
+        return response
+
+
+class LimitedBitrixAsync(BitrixAsync):
+    """BitrixAsync, запросы которого идут через LimitedRequestHandler с общим лимитером и предохранителем."""
+
+    def __init__(
+            self,
+            webhook: str,
+            limiter: BitrixRateLimiter,
+            breaker: CircuitBreaker | None = None,
+            token_func=None,
+            respect_velocity_policy: bool = True,
+            request_pool_size: int | None = None,
+            requests_per_second: float | None = None,
+            operating_time_limit: int = OPERATING_LIMIT,
+            client=None,
+            ssl: bool = True,
+            **kwargs,
+    ):
+        # собственный leaky bucket fast_bitrix24 (по умолчанию 50 и 2 в секунду) не должен быть строже лимитера,
+        # иначе BITRIX24_RPS выше 2 ничего не дает, а приоритеты теряются в его очереди
+        handler_params = dict(
+            token_func=token_func,
+            respect_velocity_policy=respect_velocity_policy,
+            request_pool_size=request_pool_size or limiter.capacity,
+            requests_per_second=requests_per_second or limiter.max_rate,
+            operating_time_limit=operating_time_limit,
+            client=client,
+            ssl=ssl,
+        )
+        # BitrixAsync (beartype) не принимает client=None явно, только отсутствие параметра
+        super().__init__(webhook, **{k: v for k, v in handler_params.items() if k != "client" or v}, **kwargs)
+        # srh с теми же параметрами, что передали BitrixAsync, - все запросы клиента идут через него
+        self.srh = LimitedRequestHandler(webhook=webhook, **handler_params, limiter=limiter, breaker=breaker)
+
+    @property
+    def limiter(self) -> BitrixRateLimiter:
+        return self.srh.limiter
+
+    @property
+    def breaker(self) -> CircuitBreaker:
+        return self.srh.breaker
@@ -0,0 +1,158 @@
+import asyncio
+import math
+from datetime import UTC, datetime
+from typing import Literal
+
+from fast_bitrix24 import BitrixAsync
+from fast_bitrix24.utils import http_build_query
+
+ListMode = Literal["get_all", "keyset"]
+
+KEYSET_PAGE_SIZE = 50  # crm.*.list всегда отдает не больше 50 записей
+BATCH_PAGES = 50  # команд в одном batch
+
+
+def _page(bitrix_filters: dict, select: list[str], after: int | str, count: bool = False) -> dict:
+    """:param count: с подсчетом total (start=0) - только для первой страницы"""
+    return {
+        "filter": {**bitrix_filters, ">ID": after},
+        "select": select,
+        "order": {"ID": "ASC"},
+        "start": 0 if count else -1,
+    }
+
+
+async def list_keyset(bitrix: BitrixAsync, method: str, filters: dict, select: list[str]) -> list[dict]:
+    """
+    Все записи crm.*.list постранично по ID: >ID последней полученной записи, order ID ASC, start=-1.
+
+    В отличие от start=N, Битрикс не пропускает N строк, поэтому каждая страница стоит одинаково
+    независимо от глубины. Первая страница запрашивается отдельно и с total, дальше страницы идут цепочкой
+    в batch: >ID каждой команды - ссылка $result на последнюю запись предыдущей, total не считается.
+    """
+    select = list(dict.fromkeys(["ID", *select]))
+    response = await bitrix.call(method, _page(filters, select, 0, count=True), raw=True)
+    items: list[dict] = response.get("result") or []
+    return await _keyset_tail(bitrix, method, filters, select, items, response.get("total"))
+
+
+async def _keyset_tail(
+        bitrix: BitrixAsync, method: str, filters: dict, select: list[str], items: list[dict], total: int | None,
+) -> list[dict]:
+    """
+    Догрузить страницы list_keyset после первой (items), если она полная.
+
+    Цепочка batch - столько страниц, сколько осталось по total первой страницы (не больше BATCH_PAGES):
+    команда после неполной страницы получает пустую ссылку вместо >ID и выбирала бы все заново.
+    Записи, добавленные во время выборки, догружаются по одной странице, пока страницы полные.
+    """
+    if len(items) < KEYSET_PAGE_SIZE:
+        return items
+
+    while True:
+        remaining = int(total or 0) - len(items)
+        chain = min(BATCH_PAGES, max(1, math.ceil(remaining / KEYSET_PAGE_SIZE)))
+        cmd = {}
+        for i in range(chain):
+            after = int(items[-1]["ID"]) if i == 0 else f"$result[p{i - 1}][{KEYSET_PAGE_SIZE - 1}][ID]"
+            cmd[f"p{i}"] = f"{method}?{http_build_query(_page(filters, select, after))}"
+        response = await bitrix.call("batch", {"halt": 1, "cmd": cmd}, raw=True)
+        result = response.get("result") or {}
+        errors = result.get("result_error") or {}
+        pages = result.get("result") or {}
+        for i in range(chain):
+            # ошибки команд после неполной страницы (записи удалены во время выборки) не важны - до них не доходим
+            if f"p{i}" in errors:
+                raise RuntimeError(f"{method} keyset page failed: {errors[f'p{i}']}")
+            page = pages.get(f"p{i}") or []
+            items.extend(page)
+            if len(page) < KEYSET_PAGE_SIZE:
+                return items
+
+
+async def fetch_lists(
+        bitrix: BitrixAsync, method: str, queries: dict[str, tuple[dict, list[str]]],
+) -> dict[str, list[dict]]:
+    """
+    Несколько выборок crm.*.list за один batch: первая страница каждой (как в list_keyset, с total) - одной командой batch,
+    выборки с полной первой страницей догружаются через list_keyset.
+
+    :param queries: {метка: (фильтр, select)}, не больше BATCH_PAGES
+    :return: {метка: записи}
+    """
+    selects = {label: list(dict.fromkeys(["ID", *select])) for label, (_, select) in queries.items()}
+    cmd = {
+        label: f"{method}?{http_build_query(_page(filters, selects[label], 0, count=True))}"
+        for label, (filters, _) in queries.items()
+    }
+    response = await bitrix.call("batch", {"halt": 1, "cmd": cmd}, raw=True)
+    result = response.get("result") or {}
+    errors = result.get("result_error") or {}
+    pages = result.get("result") or {}
+    totals = result.get("result_total") or {}
+    if errors:
+        raise RuntimeError(f"{method} batch listing failed: {errors}")
+
+    async def tail(label: str) -> list[dict]:
+        filters, _ = queries[label]
+        return await _keyset_tail(
+            bitrix, method, filters, selects[label], list(pages.get(label) or []), totals.get(label),
+        )
+
+    found = await asyncio.gather(*(tail(label) for label in queries))
+    return dict(zip(queries, found))
+
+
+def date_windows(filters: dict, windows: int) -> list[tuple[str, str | None]] | None:
+    """
+    Разбиение диапазона DATE_CREATE фильтра на windows равных окон [от, до).
+
+    Нижняя граница берется из >DATE_CREATE / >=DATE_CREATE, верхняя - из <DATE_CREATE, иначе окно открыто.
+    :return: None, если окно одно или в фильтре нет нижней границы
+    """
+    lower = filters.get(">=DATE_CREATE") or filters.get(">DATE_CREATE")
+    if windows <= 1 or not lower:
+        return None
+    start = datetime.fromisoformat(str(lower))
+    upper = filters.get("<DATE_CREATE")
+    end = datetime.fromisoformat(str(upper)) if upper else datetime.now(tz=start.tzinfo or UTC)
+    if end <= start:
+        return None
+    step = (end - start) / windows
+    bounds = [start + step * i for i in range(windows)]
+    return [
+        (bound.isoformat(), bounds[i + 1].isoformat() if i + 1 < windows else upper)
+        for i, bound in enumerate(bounds)
+    ]
+
+
+async def fetch_list(
+        bitrix: BitrixAsync,
+        method: str,
+        filters: dict,
+        select: list[str],
+        mode: ListMode = "get_all",
+        windows: int = 1,
+) -> list[dict]:
+    """
+    Выборка crm.*.list целиком.
+
+    :param mode: get_all - постранично через start средствами fast_bitrix24, keyset - через list_keyset
+    :param windows: в режиме keyset диапазон DATE_CREATE делится на столько окон, они выбираются параллельно
+        (общий лимитер клиента все равно держит квоту портала)
+    """
+    if mode == "get_all":
+        return await bitrix.get_all(method, params={"filter": filters, "select": select})
+
+    bounds = date_windows(filters, windows)
+    if bounds is None:
+        return await list_keyset(bitrix, method, filters, select)
+
+    async def window(lower: str, upper: str | None) -> list[dict]:
+        window_filters = {**filters, ">=DATE_CREATE": lower}
+        if upper:
+            window_filters["<DATE_CREATE"] = upper
+        return await list_keyset(bitrix, method, window_filters, select)
+
+    pages = await asyncio.gather(*(window(lower, upper) for lower, upper in bounds))
+    return [item for page in pages for item in page]
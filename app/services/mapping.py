@@ -0,0 +1,65 @@
+from typing import Any, Callable, NamedTuple, Sequence
+
+from app.models.sasha import DealFieldsEnum, LeadFieldsEnum
+
+NOT_SPECIFIED = "Не указано"
+
+
+class FieldMap(NamedTuple):
+    target: str  # ключ в additionalFields Саши
+    source: str  # поле сущности Битрикс
+    default: Any = NOT_SPECIFIED
+
+
+class EntityMapping:
+    """
+    Описание переноса полей сущности Битрикс в additionalFields Саши.
+
+    Собирается один раз при импорте: extract - готовая функция извлечения,
+    select - ровно те поля, которые нужно запросить в crm.*.list.
+    """
+
+    def __init__(self, fields: Sequence[FieldMap], service_fields: Sequence[str] = ()):
+        self.fields = tuple(fields)
+        # служебные поля нужны обработке (телефон, источник), но в additionalFields не попадают
+        self.select: list[str] = list(dict.fromkeys([*service_fields, *(str(f.source) for f in self.fields)]))
+        self.extract: Callable[[dict], dict] = self._compile()
+
+    def _compile(self) -> Callable[[dict], dict]:
+        pairs = tuple((f.target, str(f.source), f.default) for f in self.fields)
+
+        def extract(entity: dict) -> dict:
+            get = entity.get
+            return {target: get(source, default) for target, source, default in pairs}
+
+        return extract
+
+
+DEAL_MAPPING = EntityMapping(
+    [
+        FieldMap("deal_id", "ID", None),
+        FieldMap("title", "TITLE", None),
+        FieldMap("sqm", DealFieldsEnum.sqm),
+        FieldMap("width", DealFieldsEnum.width),
+        FieldMap("length", DealFieldsEnum.length),
+        FieldMap("height", DealFieldsEnum.height),
+        FieldMap("region", DealFieldsEnum.region),
+        FieldMap("building_type", DealFieldsEnum.building_type),
+        FieldMap("insulation_walls", DealFieldsEnum.insulation_walls),
+    ],
+    service_fields=["ID", "SOURCE_ID", "CONTACT_ID", "PHONE"],
+)
+
+LEAD_MAPPING = EntityMapping(
+    [
+        FieldMap("lead_id", "ID", None),
+        FieldMap("title", "TITLE", None),
+        FieldMap("region", LeadFieldsEnum.region),
+        FieldMap("width", LeadFieldsEnum.width),
+        FieldMap("length", LeadFieldsEnum.length),
+        FieldMap("height", LeadFieldsEnum.height),
+        FieldMap("purpose", LeadFieldsEnum.building_purpose),
+        FieldMap("deadline", LeadFieldsEnum.deadline),
+    ],
+    service_fields=["ID", "SOURCE_ID", "CONTACT_ID", "PHONE"],
+)
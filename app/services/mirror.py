@@ -0,0 +1,319 @@
+import asyncio
+import json
+import re
+import time
+from datetime import UTC, datetime
+from typing import Any, NamedTuple
+
+import structlog
+from fast_bitrix24 import BitrixAsync
+
+from app.core.sqlite import SQLiteStore
+from app.services.listing import ListMode, fetch_list
+from app.services.mapping import DEAL_MAPPING, LEAD_MAPPING
+
+logger = structlog.get_logger(service="CrmMirror")
+
+# операции фильтра от длинных к коротким, чтобы ">=" не принять за ">"
+FILTER_OPS = (">=", "<=", "!@", "!=", "=%", "@", ">", "<", "=", "!", "%")
+TIME_FIELDS = ("MOVED_TIME", "DATE_CREATE", "DATE_MODIFY")
+
+
+class MirrorEntity(NamedTuple):
+    method: str  # crm.*.list
+    stage: str  # поле стадии: STAGE_ID у сделок, STATUS_ID у лидов
+    select: list[str]
+
+
+ENTITIES = {
+    "deal": MirrorEntity(
+        "crm.deal.list", "STAGE_ID",
+        list(dict.fromkeys([
+            *DEAL_MAPPING.select, "TITLE", "STAGE_ID", "CATEGORY_ID", "MOVED_TIME", "DATE_CREATE", "DATE_MODIFY",
+        ])),
+    ),
+    "lead": MirrorEntity(
+        "crm.lead.list", "STATUS_ID",
+        list(dict.fromkeys([
+            *LEAD_MAPPING.select, "TITLE", "STATUS_ID", "MOVED_TIME", "DATE_CREATE", "DATE_MODIFY",
+            "UF_CRM_1765365691799",  # прозвонен
+        ])),
+    ),
+}
+
+
+def timestamp(value: Any) -> float | None:
+    if not value:
+        return None
+    moment = datetime.fromisoformat(str(value))
+    return (moment if moment.tzinfo else moment.replace(tzinfo=UTC)).timestamp()
+
+
+def _like(pattern: str) -> re.Pattern:
+    return re.compile("^" + ".*".join(re.escape(part) for part in pattern.split("%")) + "$", re.IGNORECASE | re.S)
+
+
+def _is_true(value: Any) -> bool:
+    return str(value).upper() in ("1", "Y", "TRUE")
+
+
+def parse_key(key: str) -> tuple[str, str]:
+    op = next((op for op in FILTER_OPS if key.startswith(op)), "")
+    return op, key[len(op):]
+
+
+def matches(row: dict, filters: dict) -> bool:
+    """Проверка строки зеркала фильтром в формате crm.*.list (те операции, что используются в сервисах)."""
+    for key, expected in filters.items():
+        op, field = parse_key(key)
+        actual = row.get(field)
+        if op in ("@", "!@"):
+            values = expected if isinstance(expected, (list, tuple, set)) else [expected]
+            if (str(actual) in {str(value) for value in values}) != (op == "@"):
+                return False
+        elif op == "=%":
+            if not _like(str(expected)).match(str(actual or "")):
+                return False
+        elif op == "%":
+            if str(expected).lower() not in str(actual or "").lower():
+                return False
+        elif op in (">", "<", ">=", "<="):
+            if field in TIME_FIELDS:
+                a, b = timestamp(actual), timestamp(expected)
+            else:
+                a, b = float(actual or 0), float(expected)
+            if a is None or not {">": a > b, "<": a < b, ">=": a >= b, "<=": a <= b}[op]:
+                return False
+        else:
+            if isinstance(expected, bool):
+                equal = _is_true(actual) == expected
+            else:
+                equal = str(actual) == str(expected)
+            if equal == (op in ("!", "!=")):
+                return False
+    return True
+
+
+class CrmMirror(SQLiteStore):
+    """
+    Локальная копия сделок и лидов (только поля, нужные сервисам).
+
+    Перед выборкой, если копия старше max_age секунд, догружается дельта: crm.*.list с >=DATE_MODIFY
+    от последнего известного изменения минус overlap. Раз в full_sync_interval секунд копия перечитывается
+    целиком, чтобы убрать удаленные в Битрикс сущности, которые не пришли событиями ONCRM*DELETE.
+    Полная загрузка ограничена фильтром scopes[entity] (стадии, с которыми работают сервисы), дельта - нет:
+    сущность, ушедшая из этих стадий, должна обновиться в копии, иначе осталась бы в старой стадии.
+    Лишние строки из дельты убирает следующая полная загрузка.
+    Фильтр выборки сначала сужается по индексам (стадия, MOVED_TIME, DATE_CREATE, источник, ID),
+    затем каждая строка проверяется им целиком.
+    """
+
+    schema = """
+        CREATE TABLE IF NOT EXISTS crm_mirror (
+            entity TEXT NOT NULL,
+            id INTEGER NOT NULL,
+            stage TEXT,
+            moved_time REAL,
+            date_create REAL,
+            date_modify REAL,
+            source_id TEXT,
+            data TEXT NOT NULL,
+            PRIMARY KEY (entity, id)
+        );
+        CREATE INDEX IF NOT EXISTS ix_crm_mirror_stage ON crm_mirror (entity, stage, moved_time);
+        CREATE INDEX IF NOT EXISTS ix_crm_mirror_created ON crm_mirror (entity, date_create);
+        CREATE INDEX IF NOT EXISTS ix_crm_mirror_source ON crm_mirror (entity, source_id);
+        CREATE INDEX IF NOT EXISTS ix_crm_mirror_modified ON crm_mirror (entity, date_modify);
+        CREATE TABLE IF NOT EXISTS crm_mirror_syncs (
+            entity TEXT PRIMARY KEY,
+            full_synced_at REAL NOT NULL
+        );
+    """
+
+    # поле фильтра -> колонка с индексом
+    columns = {"ID": "id", "MOVED_TIME": "moved_time", "DATE_CREATE": "date_create", "SOURCE_ID": "source_id"}
+    sql_ops = {"": "=", "=": "=", "<": "<", ">": ">", "<=": "<=", ">=": ">="}
+
+    def __init__(
+            self,
+            path: str,
+            bitrix: BitrixAsync,
+            max_age: float = 5,
+            overlap: float = 60,
+            full_sync_interval: float = 24 * 3600,
+            list_mode: ListMode = "get_all",
+            scopes: dict[str, dict] | None = None,
+    ):
+        """:param scopes: {сущность: фильтр crm.*.list полной загрузки}, без фильтра - все сущности"""
+        super().__init__(path)
+        self.bitrix = bitrix
+        self.max_age = max_age
+        self.overlap = overlap
+        self.full_sync_interval = full_sync_interval
+        self.list_mode = list_mode
+        self.scopes = scopes or {}
+
+        self._synced_at = {entity: 0.0 for entity in ENTITIES}
+        self._locks = {entity: asyncio.Lock() for entity in ENTITIES}
+
+    # --- SQLite
+
+    def _row(self, entity: str, item: dict) -> tuple:
+        return (
+            entity,
+            int(item["ID"]),
+            item.get(ENTITIES[entity].stage),
+            timestamp(item.get("MOVED_TIME")),
+            timestamp(item.get("DATE_CREATE")),
+            timestamp(item.get("DATE_MODIFY")),
+            item.get("SOURCE_ID"),
+            json.dumps(item, ensure_ascii=False),
+        )
+
+    def _upsert(self, entity: str, items: list[dict]) -> None:
+        self._upsert_rows([self._row(entity, item) for item in items])
+
+    def _upsert_rows(self, rows: list[tuple]) -> None:
+        self.conn.execute("BEGIN")
+        try:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO crm_mirror "
+                "(entity, id, stage, moved_time, date_create, date_modify, source_id, data) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self.conn.execute("COMMIT")
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+
+    def _replace(self, entity: str, items: list[dict], started_at: float) -> int:
+        """Полная перезагрузка: все строки сущности, которых не было в выгрузке, удаляются."""
+        self.conn.execute("BEGIN")
+        try:
+            self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS mirror_seen (id INTEGER PRIMARY KEY)")
+            self.conn.execute("DELETE FROM mirror_seen")
+            self.conn.executemany("INSERT OR IGNORE INTO mirror_seen (id) VALUES (?)", [(int(i["ID"]),) for i in items])
+            deleted = self.conn.execute(
+                "DELETE FROM crm_mirror WHERE entity = ? AND id NOT IN (SELECT id FROM mirror_seen)", (entity,)
+            ).rowcount
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO crm_mirror "
+                "(entity, id, stage, moved_time, date_create, date_modify, source_id, data) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [self._row(entity, item) for item in items],
+            )
+            self.conn.execute(
+                "INSERT OR REPLACE INTO crm_mirror_syncs (entity, full_synced_at) VALUES (?, ?)", (entity, started_at)
+            )
+            self.conn.execute("COMMIT")
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        return deleted
+
+    def _watermark(self, entity: str) -> tuple[float | None, float | None]:
+        """(последний DATE_MODIFY в копии, время последней полной загрузки)"""
+        modified = self.conn.execute(
+            "SELECT MAX(date_modify) FROM crm_mirror WHERE entity = ?", (entity,)
+        ).fetchone()[0]
+        full = self.conn.execute(
+            "SELECT full_synced_at FROM crm_mirror_syncs WHERE entity = ?", (entity,)
+        ).fetchone()
+        return modified, full[0] if full else None
+
+    def _select(self, entity: str, filters: dict) -> list[dict]:
+        where, params = ["entity = ?"], [entity]
+        for key, expected in filters.items():
+            op, field = parse_key(key)
+            column = "stage" if field == ENTITIES[entity].stage else self.columns.get(field)
+            if column is None or isinstance(expected, bool):
+                continue
+            if op == "@":
+                values = list(expected) if isinstance(expected, (list, tuple, set)) else [expected]
+                where.append(f"{column} IN ({', '.join('?' for _ in values)})" if values else "0")
+                params.extend(int(v) if column == "id" else str(v) for v in values)
+            elif op in self.sql_ops:
+                if field in TIME_FIELDS:
+                    expected = timestamp(expected)
+                elif column == "id":
+                    expected = int(expected)
+                where.append(f"{column} {self.sql_ops[op]} ?")
+                params.append(expected)
+        rows = self.conn.execute(
+            f"SELECT data FROM crm_mirror WHERE {' AND '.join(where)} ORDER BY id", params
+        ).fetchall()
+        return [item for item in (json.loads(data) for data, in rows) if matches(item, filters)]
+
+    def _apply(self, entity: str, changes: dict[int, dict], moved_at: str) -> int:
+        """Записать в строки копии поля, измененные самим сервисом. :return: число обновленных строк"""
+        ids = list(changes)
+        rows = self.conn.execute(
+            f"SELECT id, data FROM crm_mirror WHERE entity = ? AND id IN ({', '.join('?' for _ in ids)})",
+            [entity, *ids],
+        ).fetchall()
+        stage = ENTITIES[entity].stage
+        updated = []
+        for entity_id, data in rows:
+            item = json.loads(data)
+            fields = changes[entity_id]
+            if stage in fields and fields[stage] != item.get(stage):
+                item["MOVED_TIME"] = moved_at
+            item.update(fields)
+            updated.append(self._row(entity, item))
+        self._upsert_rows(updated)
+        return len(updated)
+
+    def _delete(self, entity: str, entity_id: int) -> None:
+        self.conn.execute("DELETE FROM crm_mirror WHERE entity = ? AND id = ?", (entity, entity_id))
+
+    # --- синхронизация
+
+    async def sync(self, entity: str, force: bool = False) -> int:
+        """
+        Догрузить изменения сущности из Битрикс.
+
+        :param force: не смотреть на max_age
+        :return: число полученных из Битрикс строк
+        """
+        async with self._locks[entity]:
+            if not force and time.monotonic() - self._synced_at[entity] < self.max_age:
+                return 0
+            spec = ENTITIES[entity]
+            started_at = time.time()
+            modified, full_synced_at = await self.run(self._watermark, entity)
+            full = full_synced_at is None or started_at - full_synced_at > self.full_sync_interval
+
+            filters = dict(self.scopes.get(entity, {})) if full else {}
+            if not full and modified is not None:
+                since = datetime.fromtimestamp(modified - self.overlap, tz=UTC)
+                filters[">=DATE_MODIFY"] = since.isoformat()
+            items = await fetch_list(self.bitrix, spec.method, filters, spec.select, mode=self.list_mode)
+
+            if full:
+                deleted = await self.run(self._replace, entity, items, started_at)
+                logger.info("Mirror reloaded", entity=entity, rows=len(items), deleted=deleted)
+            elif items:
+                await self.run(self._upsert, entity, items)
+            self._synced_at[entity] = time.monotonic()
+            return len(items)
+
+    async def select(self, entity: str, filters: dict) -> list[dict]:
+        """Выборка по фильтру crm.*.list из копии, догрузив перед этим изменения."""
+        await self.sync(entity)
+        return await self.run(self._select, entity, filters)
+
+    async def apply(self, entity: str, changes: dict[str, dict]) -> int:
+        """
+        Записать в копию успешные изменения самого сервиса ({ID: поля}), не дожидаясь дельты:
+        иначе до следующей синхронизации выборка видела бы сущность в старой стадии.
+        DATE_MODIFY не трогается - его время задает Битрикс, и дельта все равно перечитает эти строки.
+        Сущности, которых нет в копии, пропускаются.
+        """
+        if not changes:
+            return 0
+        moved_at = datetime.now(tz=UTC).isoformat()
+        return await self.run(self._apply, entity, {int(i): fields for i, fields in changes.items()}, moved_at)
+
+    async def delete(self, entity: str, entity_id: str) -> None:
+        await self.run(self._delete, entity, int(entity_id))
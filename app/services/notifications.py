@@ -0,0 +1,179 @@
+import asyncio
+import json
+import time
+from collections import deque
+
+import structlog
+from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter
+
+from app.services.queue import SQLiteQueue
+
+logger = structlog.get_logger(service="NotificationOutbox")
+
+TELEGRAM_MESSAGE_LIMIT = 4096
+DIGEST_SEPARATOR = "\n\n〰〰〰〰〰\n\n"
+
+
+class ChatBucket:
+    """Token bucket одного чата: burst сообщений сразу, дальше rate в секунду."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self._updated_at = time.monotonic()
+
+    async def take(self) -> None:
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self._updated_at) * self.rate)
+            self._updated_at = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class NotificationOutbox:
+    """
+    Очередь уведомлений в Телеграм.
+
+    send() только ставит сообщение в очередь чата и сразу возвращается.
+    Отправка идет через token bucket чата (в группу - не больше 20 сообщений в минуту),
+    накопившиеся за время ожидания сообщения склеиваются в одну сводку,
+    на TelegramRetryAfter отправка откладывается на указанное время и повторяется,
+    но в сумме не дольше max_retry_time секунд на сообщение.
+
+    С queue сообщения сначала записываются в SQLiteQueue и удаляются из нее только после отправки:
+    неотправленное переживает рестарт и досылается этим или другим процессом.
+    """
+
+    def __init__(
+            self,
+            bot: Bot,
+            chat_id: str,
+            rate: float = 20 / 60,
+            burst: int = 3,
+            max_attempts: int = 5,
+            max_retry_time: float = 300,
+            queue: SQLiteQueue | None = None,
+            max_claimed: int = 20,
+    ):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.rate = rate
+        self.burst = burst
+        self.max_attempts = max_attempts
+        self.max_retry_time = max_retry_time
+        self.queue = queue
+        self.max_claimed = max_claimed
+
+        # сообщения чата с ID элемента queue (None без queue)
+        self._pending: dict[str, deque[tuple[str, int | None]]] = {}
+        self._workers: dict[str, asyncio.Task] = {}
+        self._buckets: dict[str, ChatBucket] = {}
+        self._pump: asyncio.Task | None = None
+        self._claimed = 0
+        self._sent = asyncio.Event()
+
+    def start(self) -> None:
+        """Начать досылать сообщения из queue, оставшиеся от прошлых запусков."""
+        if self.queue and (self._pump is None or self._pump.done()):
+            self._pump = asyncio.create_task(self._take_from_queue())
+
+    async def send(self, text: str, chat_id: str | None = None) -> None:
+        chat_id = chat_id or self.chat_id
+        if self.queue:
+            await self.queue.put(json.dumps({"chat_id": chat_id, "text": text}, ensure_ascii=False).encode())
+            self.start()
+            return
+        self._enqueue(chat_id, text, None)
+
+    def _enqueue(self, chat_id: str, text: str, item_id: int | None) -> None:
+        self._pending.setdefault(chat_id, deque()).append((text, item_id))
+        worker = self._workers.get(chat_id)
+        if worker is None or worker.done():
+            self._workers[chat_id] = asyncio.create_task(self._run(chat_id))
+
+    async def _take_from_queue(self) -> None:
+        """Забирать сообщения из queue, пока в памяти меньше max_claimed неотправленных."""
+        while True:
+            if self._claimed >= self.max_claimed:
+                self._sent.clear()
+                await self._sent.wait()
+                continue
+            item_id, payload, _ = await self.queue.get()
+            message = json.loads(payload)
+            self._claimed += 1
+            self._enqueue(message["chat_id"], message["text"], item_id)
+
+    def _next_message(self, pending: deque[tuple[str, int | None]], tokens: float) -> tuple[str, int]:
+        """
+        Если оставшихся токенов хватает на всю очередь - первое сообщение как есть,
+        иначе сводка из первых сообщений, пока она влезает в лимит Телеграма.
+        """
+        if len(pending) - 1 <= tokens:
+            return pending[0][0], 1
+
+        parts = [pending[0][0]]
+        length = len(parts[0])
+        for text, _ in list(pending)[1:]:
+            length += len(DIGEST_SEPARATOR) + len(text)
+            if length > TELEGRAM_MESSAGE_LIMIT:
+                break
+            parts.append(text)
+        return DIGEST_SEPARATOR.join(parts), len(parts)
+
+    async def _run(self, chat_id: str) -> None:
+        pending = self._pending[chat_id]
+        bucket = self._buckets.setdefault(chat_id, ChatBucket(self.rate, self.burst))
+        attempts = 0
+        waited = 0.0
+        while pending:
+            await bucket.take()
+            text, count = self._next_message(pending, bucket.tokens)
+            try:
+                await self.bot.send_message(chat_id=chat_id, text=text, parse_mode="HTML")
+            except TelegramRetryAfter as e:
+                if waited + e.retry_after <= self.max_retry_time:
+                    logger.warning("Telegram flood control, retrying later", chat_id=chat_id, retry_after=e.retry_after)
+                    bucket.tokens = 0
+                    waited += e.retry_after
+                    await asyncio.sleep(e.retry_after)
+                    continue
+                logger.error("Notification dropped after flood control", chat_id=chat_id, messages=count, waited=waited)
+            except Exception as e:
+                attempts += 1
+                if attempts < self.max_attempts:
+                    logger.warning("Failed to send notification", chat_id=chat_id, attempt=attempts, error=str(e))
+                    await asyncio.sleep(2 ** attempts)
+                    continue
+                logger.error("Notification dropped", chat_id=chat_id, messages=count, error=str(e))
+            attempts = 0
+            waited = 0.0
+            for _ in range(count):
+                _, item_id = pending.popleft()
+                if item_id is not None:
+                    await self.queue.ack(item_id)
+                    self._claimed -= 1
+                    self._sent.set()
+            if count > 1:
+                logger.info("Notifications sent as digest", chat_id=chat_id, messages=count)
+
+    async def close(self, timeout: float = 10) -> None:
+        """Дождаться отправки накопленного, но не дольше timeout секунд."""
+        if self._pump:
+            self._pump.cancel()
+        workers = [worker for worker in self._workers.values() if not worker.done()]
+        if workers:
+            _, not_done = await asyncio.wait(workers, timeout=timeout)
+            for worker in not_done:
+                worker.cancel()
+        unsent = [item_id for pending in self._pending.values() for _, item_id in pending]
+        if unsent:
+            logger.warning("Notifications left unsent", messages=len(unsent))
+        # взятые из queue, но не отправленные - снова доступны следующему запуску сразу, без visibility_timeout
+        for item_id in unsent:
+            if item_id is not None:
+                await self.queue.nack(item_id)
@@ -0,0 +1,79 @@
+import re
+from typing import Iterable
+
+import structlog
+
+from app.services.cache import TTLCache
+
+logger = structlog.get_logger(service="PhoneIndex")
+
+_NOT_DIGITS = re.compile(r"\D")
+
+
+def normalize_phone(raw: str | None) -> str | None:
+    """
+    Телефон в E.164 (+79001234567).
+
+    Россия и Казахстан - общий код +7: 8XXXXXXXXXX и 7XXXXXXXXXX - это +7XXXXXXXXXX,
+    10 цифр без кода (900..., 495..., 701... в KZ) - тоже +7. 810 - выход на международную линию из РФ/KZ.
+    Остальные номера принимаются, только если в них 11-15 цифр.
+
+    :return: None, если номер не похож на телефон
+    """
+    if not raw:
+        return None
+    digits = _NOT_DIGITS.sub("", str(raw))
+    if digits.startswith("810") and len(digits) > 13:
+        digits = digits[3:]
+    length = len(digits)
+    if length == 10:
+        return "+7" + digits
+    if length == 11 and digits[0] in "78":
+        return "+7" + digits[1:]
+    if 11 <= length <= 15 and digits[0] != "0":
+        return "+" + digits
+    return None
+
+
+class PhoneIndex:
+    """
+    Телефоны, недавно загруженные в Сашу, с контекстом загрузки: (deal или lead, ID сущности).
+
+    collapse убирает повторы телефона внутри одной загрузки и телефоны, которые за последние ttl секунд
+    уже ушли в Сашу от другой сущности - сделки или лида: один человек не получает два звонка.
+    Та же сущность проходит - повторы одной сущности решает UploadLedger.
+    """
+
+    def __init__(self, ttl: float = 900, maxsize: int = 100_000):
+        self._uploaded = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    @staticmethod
+    def _entity_id(contact: dict, kind: str) -> str:
+        return str(contact["additionalFields"].get(f"{kind}_id"))
+
+    def collapse(self, contacts: list[dict], kind: str) -> list[dict]:
+        """
+        :param contacts: контакты для SashaService.add_contacts, телефон уже нормализован
+        :param kind: deal или lead
+        """
+        seen: set[str] = set()
+        collapsed = []
+        for contact in contacts:
+            phone = contact["phone"]
+            if phone in seen:
+                continue
+            seen.add(phone)
+            uploaded = self._uploaded.get(phone)
+            if uploaded is not None and uploaded != (kind, self._entity_id(contact, kind)):
+                continue
+            collapsed.append(contact)
+        if len(collapsed) != len(contacts):
+            logger.info("Duplicate phones collapsed", kind=kind, contacts=len(contacts), left=len(collapsed))
+        return collapsed
+
+    def remember(self, contacts: Iterable[dict], kind: str, failed_phones: Iterable[str] = ()) -> None:
+        """Запомнить загруженные контакты, кроме телефонов из не прошедших частей."""
+        failed = set(failed_phones)
+        for contact in contacts:
+            if contact["phone"] not in failed:
+                self._uploaded.set(contact["phone"], (kind, self._entity_id(contact, kind)))
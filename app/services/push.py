@@ -0,0 +1,119 @@
+import asyncio
+import time
+from typing import Awaitable, Callable
+
+import structlog
+
+from app.core.leader import LeaseLock
+from app.services.bitrix import BITRIX_BATCH_SIZE, BitrixService
+from app.services.transitions import DEAL_SETTLE_SECONDS, LOAD
+
+logger = structlog.get_logger(service="PushSync")
+
+
+class Debouncer:
+    """
+    Схлопывание пачек событий по ключу (ID сущности).
+
+    Ключ сбрасывается в flush, когда по нему delay секунд не было событий,
+    но не позже max_delay секунд после первого события.
+    Ключи, созревшие одновременно, уходят одним вызовом flush - не больше batch_size за раз.
+    """
+
+    def __init__(
+            self,
+            name: str,
+            flush: Callable[[list[str]], Awaitable[object]],
+            delay: float,
+            max_delay: float | None = None,
+            batch_size: int = BITRIX_BATCH_SIZE,
+    ):
+        self.name = name
+        self.flush = flush
+        self.delay = delay
+        self.max_delay = max_delay or delay * 10
+        self.batch_size = batch_size
+
+        # ключ -> (первое событие, последнее событие)
+        self._pending: dict[str, tuple[float, float]] = {}
+        self._wakeup = asyncio.Event()
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def touch(self, key: str) -> None:
+        now = time.monotonic()
+        first, _ = self._pending.get(key, (now, now))
+        self._pending[key] = (first, now)
+        self._wakeup.set()
+
+    def _due_at(self, key: str) -> float:
+        first, last = self._pending[key]
+        return min(last + self.delay, first + self.max_delay)
+
+    def _pop_due(self, now: float) -> list[str]:
+        due = [key for key in self._pending if self._due_at(key) <= now][:self.batch_size]
+        for key in due:
+            del self._pending[key]
+        return due
+
+    async def run(self) -> None:
+        while True:
+            if not self._pending:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            # новые события сдвигают сроки только вперед, поэтому ближайший срок не может стать раньше
+            wait = min(self._due_at(key) for key in self._pending) - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+
+            keys = self._pop_due(time.monotonic())
+            try:
+                await self.flush(keys)
+            except Exception as e:
+                # не повторяем: сущности подберет опрос по расписанию
+                logger.error("Debounced flush failed", debouncer=self.name, keys=len(keys), error=str(e))
+
+
+class PushSync:
+    """
+    Загрузка в Сашу по исходящим событиям Битрикс24 вместо ожидания очередного опроса.
+
+    В Битрикс уходит только сущность из события, через те же фильтры и маппинги, что и у опроса:
+    лиды - через delay секунд тишины по лиду, сделки - не раньше DEAL_SETTLE_SECONDS после переноса в C27:NEW.
+    Опрос остается - он подбирает потерянные события и неудачные загрузки.
+    """
+
+    def __init__(self, bitrix: BitrixService, locks: LeaseLock, delay: float = 2.0):
+        self.bitrix = bitrix
+        # те же блокировки leads и deals, что у задач опроса во всех процессах,
+        # чтобы одна сущность не грузилась и не переносилась дважды параллельно
+        self.locks = locks
+        self.leads = Debouncer("leads", self._flush_leads, delay=delay)
+        self.deals = Debouncer("deals", self._flush_deals, delay=DEAL_SETTLE_SECONDS + delay)
+
+    async def _flush_leads(self, ids: list[str]) -> None:
+        async with self.locks.hold("leads"):
+            items = await self.bitrix.load_leads_to_sasha(ids)
+        logger.info("Pushed leads", requested=len(ids), loaded=items)
+
+    async def _flush_deals(self, ids: list[str]) -> None:
+        async with self.locks.hold("deals"):
+            items = await self.bitrix.run_transitions((LOAD,), ids=ids)
+        logger.info("Pushed deals", requested=len(ids), loaded=items)
+
+    def deal_updated(self, deal_id: str) -> None:
+        """
+        ONCRMDEALUPDATE. Эхо собственных переносов сервиса не в C27:NEW (загрузка в C27:PREPARATION)
+        пропускается: переход LOAD такую сделку все равно не найдет.
+        """
+        target = self.bitrix.recent_moves.get(deal_id)
+        if target is not None and target != LOAD.stage:
+            return
+        self.deals.touch(deal_id)
+
+    async def run(self) -> None:
+        await asyncio.gather(self.leads.run(), self.deals.run())
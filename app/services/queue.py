@@ -0,0 +1,98 @@
+import asyncio
+import time
+
+import structlog
+
+from app.core.sqlite import SQLiteStore
+
+logger = structlog.get_logger(service="SQLiteQueue")
+
+
+class SQLiteQueue(SQLiteStore):
+    """
+    Надежная очередь на SQLite.
+
+    Взятый элемент не удаляется, а скрывается на visibility_timeout секунд:
+    если обработчик упал вместе с процессом, элемент снова станет доступен.
+    Удаляется элемент только после ack().
+    """
+
+    schema = """
+        CREATE TABLE IF NOT EXISTS queue_items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            queue TEXT NOT NULL,
+            payload BLOB NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            available_at REAL NOT NULL,
+            created_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS ix_queue_items_available ON queue_items (queue, available_at);
+    """
+
+    def __init__(self, path: str, name: str, visibility_timeout: float = 300, poll_interval: float = 1.0):
+        super().__init__(path)
+        self.name = name
+        self.visibility_timeout = visibility_timeout
+        self.poll_interval = poll_interval
+        self._new_item = asyncio.Event()
+
+    async def put(self, payload: bytes) -> int:
+        now = time.time()
+        rows = await self.execute(
+            "INSERT INTO queue_items (queue, payload, available_at, created_at) VALUES (?, ?, ?, ?) RETURNING id",
+            (self.name, payload, now, now),
+        )
+        self._new_item.set()
+        return rows[0][0]
+
+    async def get_nowait(self) -> tuple[int, bytes, int] | None:
+        """Забрать первый доступный элемент: (id, payload, номер попытки) или None."""
+        now = time.time()
+        rows = await self.execute(
+            """
+            UPDATE queue_items SET available_at = ?, attempts = attempts + 1
+            WHERE id = (
+                SELECT id FROM queue_items WHERE queue = ? AND available_at <= ? ORDER BY id LIMIT 1
+            )
+            RETURNING id, payload, attempts
+            """,
+            (now + self.visibility_timeout, self.name, now),
+        )
+        return rows[0] if rows else None
+
+    async def get(self) -> tuple[int, bytes, int]:
+        while True:
+            item = await self.get_nowait()
+            if item:
+                return item
+            self._new_item.clear()
+            try:
+                # put() в этом же процессе будит сразу, записи других процессов ловим опросом
+                await asyncio.wait_for(self._new_item.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def ack(self, item_id: int) -> None:
+        await self.execute("DELETE FROM queue_items WHERE id = ?", (item_id,))
+
+    async def touch(self, item_id: int) -> None:
+        """Продлить скрытие взятого элемента еще на visibility_timeout: обработчик жив и еще работает."""
+        await self.execute(
+            "UPDATE queue_items SET available_at = ? WHERE id = ?",
+            (time.time() + self.visibility_timeout, item_id),
+        )
+
+    async def nack(self, item_id: int, delay: float = 0) -> None:
+        await self.execute(
+            "UPDATE queue_items SET available_at = ? WHERE id = ?",
+            (time.time() + delay, item_id),
+        )
+
+    async def size(self) -> int:
+        rows = await self.execute("SELECT COUNT(*) FROM queue_items WHERE queue = ?", (self.name,))
+        return rows[0][0]
+
+    async def depths(self) -> dict[str, int]:
+        """Размеры всех очередей в этой базе (вебхуки, задачи taskiq)."""
+        rows = await self.execute("SELECT queue, COUNT(*) FROM queue_items GROUP BY queue")
+        return dict(rows)
@@ -1,29 +1,126 @@
+import asyncio
+import gzip
+import json
+
 import httpx
 import structlog
 
+from app.core.metrics import SASHA_CHUNK_BYTES, SASHA_UPLOAD_CONTACTS, SASHA_UPLOAD_SECONDS, track
+from app.core.resilience import CircuitBreaker, retry
 from app.core.settings.production import SashaWebhookStorage
 
 logger = structlog.get_logger(service="SashaService")
 
 
+def is_transient(error: BaseException) -> bool:
+    """Ошибка, после которой запрос стоит повторить: сеть, таймаут, 5xx или 429."""
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code >= 500 or error.response.status_code == 429
+    return isinstance(error, httpx.RequestError)
+
+
+def is_outage(error: BaseException) -> bool:
+    """Саша недоступна (сеть, таймаут, 5xx), а не попросила сбавить скорость (429) - для предохранителя."""
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code >= 500
+    return isinstance(error, httpx.RequestError)
+
+
 class SashaService:
-    def __init__(self, webhooks: SashaWebhookStorage):
+    def __init__(
+            self,
+            webhooks: SashaWebhookStorage,
+            chunk_size: int = 500,
+            concurrency: int = 4,
+            gzip_requests: bool = False,
+            retries: int = 3,
+            breaker: CircuitBreaker | None = None,
+    ):
         self.webhooks: SashaWebhookStorage = webhooks
+        self.chunk_size = chunk_size
+        self.concurrency = concurrency
+        self.gzip_requests = gzip_requests
+        # часть повторяется до retries раз, пока Саша лежит - части сразу падают с CircuitOpenError
+        self.retries = retries
+        self.breaker = breaker or CircuitBreaker("sasha")
         self.client = httpx.AsyncClient(
             base_url="https://platform.trysasha.ru/api/upload-contacts-integrations/webhook/",
-            timeout=120
+            timeout=httpx.Timeout(120, connect=10),
+            http2=True,
+            limits=httpx.Limits(
+                max_connections=concurrency,
+                max_keepalive_connections=concurrency,
+                keepalive_expiry=60,
+            ),
+        )
+
+    async def close(self):
+        await self.client.aclose()
+
+    async def _post_chunk(self, contacts: list[dict], webhook: str) -> dict:
+        content = json.dumps(contacts, ensure_ascii=False).encode()
+        headers = {"Content-Type": "application/json"}
+        if self.gzip_requests:
+            content = gzip.compress(content)
+            headers["Content-Encoding"] = "gzip"
+        SASHA_CHUNK_BYTES.observe(len(content))
+        return await retry(
+            lambda: self._post(content, headers, webhook, len(contacts)),
+            attempts=self.retries,
+            retry_on=is_transient,
         )
 
+    async def _post(self, content: bytes, headers: dict, webhook: str, contacts: int) -> dict:
+        async with self.breaker.guard(is_failure=is_outage):
+            try:
+                r = await self.client.post(webhook, content=content, headers=headers)
+                r.raise_for_status()
+                logger.info("Request to platform successfully done", contacts=contacts, response=r.json())
+                return r.json()
+            except httpx.HTTPStatusError as e:
+                logger.error("Failed to add contacts to Sasha", error=e.response.text)
+                raise
+            except httpx.RequestError as e:
+                logger.error("An error occurred while requesting Sasha API", error=e)
+                raise
+
     async def add_contacts(self, contacts: list[dict], webhook: str):
+        """
+        Загрузка контактов частями по chunk_size, не более concurrency частей одновременно.
+
+        Ответы частей сливаются в один: списки (skippedPhones) склеиваются, числа складываются.
+        Телефоны из неудавшихся частей возвращаются в failedPhones, исключение - только если не прошла ни одна часть.
+        """
         logger.info("adding contacts to Sasha", contacts=len(contacts))
-        try:
-            r = await self.client.post(webhook, json=contacts)
-            r.raise_for_status()
-            logger.info("Request to platform successfully done", response=r.json())
-            return r.json()
-        except httpx.HTTPStatusError as e:
-            logger.error("Failed to add contacts to Sasha", error=e.response.text)
-            raise
-        except httpx.RequestError as e:
-            logger.error("An error occurred while requesting Sasha API", error=e)
-            raise
+        SASHA_UPLOAD_CONTACTS.observe(len(contacts))
+        with track(SASHA_UPLOAD_SECONDS):
+            return await self._add_contacts(contacts, webhook)
+
+    async def _add_contacts(self, contacts: list[dict], webhook: str) -> dict:
+        chunks = [contacts[i:i + self.chunk_size] for i in range(0, len(contacts), self.chunk_size)]
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def upload(chunk: list[dict]) -> dict:
+            async with semaphore:
+                return await self._post_chunk(chunk, webhook)
+
+        responses = await asyncio.gather(*(upload(chunk) for chunk in chunks), return_exceptions=True)
+
+        result: dict = {"skippedPhones": [], "failedPhones": []}
+        errors = []
+        for chunk, response in zip(chunks, responses):
+            if isinstance(response, Exception):
+                errors.append(response)
+                result["failedPhones"].extend(contact.get("phone") for contact in chunk)
+                continue
+            for key, value in response.items():
+                if isinstance(value, list):
+                    result.setdefault(key, []).extend(value)
+                elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                    result[key] = result.get(key, 0) + value
+                else:
+                    result[key] = value
+
+        if errors and len(errors) == len(chunks):
+            raise errors[0]
+        return result
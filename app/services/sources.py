@@ -0,0 +1,76 @@
+import asyncio
+import time
+
+import structlog
+from fast_bitrix24 import BitrixAsync
+
+logger = structlog.get_logger(service="SourceRegistry")
+
+
+class SourceRegistry:
+    """Источники (crm.status.list, ENTITY_ID=SOURCE), проиндексированные по STATUS_ID."""
+
+    raw_sources = (
+        "Сайт", "Реклама", "CRM-форма", "Квиз", "Яндекс Директ", "Авито", "Таргетированная реклама",
+        "Социальные сети",
+    )
+
+    raw_potencial_sources = (
+        "Скан", "Скан KZ", "Обзвон базы ИИ", "Обзвон базы RUS"
+    )
+
+    def __init__(self, bitrix: BitrixAsync, ttl: float = 3600):
+        self.bitrix = bitrix
+        self.ttl = ttl
+
+        self._by_id: dict[str, dict] = {}
+        self._refreshed_at: float | None = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def ids(self) -> list[str]:
+        return list(self._by_id)
+
+    @property
+    def is_stale(self) -> bool:
+        return self._refreshed_at is None or time.monotonic() - self._refreshed_at > self.ttl
+
+    def get(self, status_id: str) -> dict | None:
+        return self._by_id.get(status_id)
+
+    def is_potencial(self, status_id: str) -> bool:
+        source = self._by_id.get(status_id)
+        return source["is_potencial"] if source else False
+
+    async def refresh(self) -> dict[str, dict]:
+        async with self._lock:
+            statuses = await self.bitrix.get_all('crm.status.list', params=
+            {
+                'filter': {"filter[ENTITY_ID]": "SOURCE"}
+            })
+            by_id = {}
+            for status in statuses:
+                if status["NAME"] in self.raw_sources or status["NAME"] in self.raw_potencial_sources:
+                    by_id[status["STATUS_ID"]] = {
+                        "name": status["NAME"],
+                        "id": status["STATUS_ID"],
+                        "is_potencial": status["NAME"] in self.raw_potencial_sources
+                    }
+            # подменяем индекс целиком, чтобы читатели не видели его наполовину заполненным
+            self._by_id = by_id
+            self._refreshed_at = time.monotonic()
+            logger.info("sources refreshed", sources=len(by_id))
+            return by_id
+
+    async def ensure_fresh(self) -> None:
+        if self.is_stale:
+            await self.refresh()
+
+    async def run_refresh(self) -> None:
+        """Фоновое обновление раз в ttl секунд."""
+        while True:
+            await asyncio.sleep(self.ttl)
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error("failed to refresh sources", error=str(e))
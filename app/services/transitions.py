@@ -0,0 +1,91 @@
+from datetime import datetime, timedelta
+from typing import NamedTuple
+
+from app.services.mapping import DEAL_MAPPING
+from app.services.mirror import matches, parse_key, timestamp
+
+
+class Transition(NamedTuple):
+    """Перенос сделок из стадии stage в target: тех, что пролежали в stage дольше settle и подходят под filters."""
+    name: str  # для логов
+    stage: str
+    target: str
+    settle: timedelta
+    filters: dict = {}  # остальные условия в формате фильтра crm.*.list
+    comment: str | None = None  # комментарий в таймлайн сделки при переносе
+    upload: bool = False  # перед переносом загрузить в Сашу, не загрузившиеся остаются в stage
+
+
+DEAL_SETTLE_SECONDS = 30  # сделка в C27:NEW уходит в Сашу не раньше, чем через столько секунд после переноса
+
+# сделки, находящиеся более 30 дней в "Ожидании решения", - в прогрев
+COLD = Transition(
+    "cold", "C20:FINAL_INVOICE", "C27:NEW", timedelta(seconds=10),
+    filters={">DATE_CREATE": "2026-01-13T00:00:00+00:00", "=%TITLE": "%test%"},
+    comment='Сделка перенесена в [B]"Новый прогрев"[/B] так как более [B]30 дней[/B] находится на стадии [B]"Ожидание решения"[/B].',
+)
+LOAD = Transition("load", "C27:NEW", "C27:PREPARATION", timedelta(seconds=DEAL_SETTLE_SECONDS), upload=True)
+ROLLBACK = Transition("rollback", "C27:PREPARATION", "C27:NEW", timedelta(days=1))
+TRANSITIONS = (COLD, LOAD, ROLLBACK)
+
+
+def category(stage: str) -> str | None:
+    """C27:NEW -> 27, у стадий основной воронки (NEW) категории в коде нет"""
+    prefix, _, _ = stage.partition(":")
+    return prefix.removeprefix("C") if _ else None
+
+
+def rule_filter(transition: Transition, now: datetime) -> dict:
+    """Фильтр crm.deal.list перехода: его стадия, граница MOVED_TIME и остальные условия - все на стороне Битрикс."""
+    return {
+        "STAGE_ID": transition.stage,
+        "<MOVED_TIME": (now - transition.settle).isoformat(),
+        **transition.filters,
+    }
+
+
+def rule_select(transition: Transition) -> list[str]:
+    """Поля, нужные переходу: для переноса и проверки условий, для загрузки в Сашу - еще поля маппинга."""
+    fields = ["ID", "STAGE_ID", "CATEGORY_ID", "MOVED_TIME", *(parse_key(key)[1] for key in transition.filters)]
+    if transition.upload:
+        fields.extend(DEAL_MAPPING.select)
+    return list(dict.fromkeys(fields))
+
+
+def stage_fields(deal: dict, target: str) -> dict:
+    """Поля crm.item.update для переноса в target; CATEGORY_ID - только если меняется."""
+    fields = {"STAGE_ID": target}
+    target_category = category(target)
+    if target_category is not None and str(deal.get("CATEGORY_ID")) != target_category:
+        fields["CATEGORY_ID"] = target_category
+    return fields
+
+
+def move_command(deal_id: str, fields: dict) -> tuple[str, dict]:
+    """Команда batch переноса сделки (crm.item.update) - одна на все переносы, id в параметрах ровно один."""
+    return "crm.item.update", {"entityTypeId": 2, "id": deal_id, "fields": fields}
+
+
+def plan(deals: list[dict], transitions: tuple[Transition, ...], now: datetime) -> dict[str, list[dict]]:
+    """
+    Разложить сделки по переходам: {Transition.name: сделки}.
+
+    Сделка попадает не больше чем в один переход (первый подходящий), повторы одной сделки в выгрузке
+    (get_all при сдвиге страниц) отбрасываются.
+    """
+    planned: dict[str, list[dict]] = {t.name: [] for t in transitions}
+    seen = set()
+    for deal in deals:
+        if deal["ID"] in seen:
+            continue
+        seen.add(deal["ID"])
+        moved = timestamp(deal.get("MOVED_TIME"))
+        for t in transitions:
+            if (
+                    deal.get("STAGE_ID") == t.stage
+                    and moved is not None and moved < (now - t.settle).timestamp()
+                    and matches(deal, t.filters)
+            ):
+                planned[t.name].append(deal)
+                break
+    return planned
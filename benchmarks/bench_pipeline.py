@@ -0,0 +1,284 @@
+"""
+Сквозной бенчмарк на локальных заглушках Битрикс24, Саши и Телеграма (benchmarks/fake_*.py).
+
+    python -m benchmarks.bench_pipeline
+    python -m benchmarks.bench_pipeline --sizes 1000 --scenarios deals webhooks --rps 2 --quota-errors 0.01
+    python -m benchmarks.bench_pipeline --scenarios leads --list-mode keyset --windows 4
+
+Сценарии:
+    deals     - BitrixService.run_transitions((LOAD,)) по n сделкам в C27:NEW
+    leads     - BitrixService.load_leads_to_sasha по n лидам
+    rollback  - BitrixService.run_transitions((ROLLBACK,)) по n сделкам в C27:PREPARATION
+    transitions - BitrixService.run_transitions по n сделкам, поровну в C20:FINAL_INVOICE, C27:NEW и C27:PREPARATION
+    webhooks  - n результатов звонков (поровну сделки и лиды) в POST /webhooks/{id}, --concurrency одновременно
+
+Сервисы берутся из контейнера приложения, как в проде, заглушки работают в том же event loop.
+По умолчанию квота портала не моделируется (--rps 0) и измеряется сам клиент,
+--rps 2 воспроизводит обычный портал (пул 50 запросов, 2 в секунду) - 100k сущностей тогда идут десятки минут.
+
+p50/p99: для deals/leads/rollback/transitions - HTTP-запрос к Битрикс со стороны клиента (с ожиданием лимитера),
+для webhooks - обработка вебхука целиком.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+
+import httpx
+import structlog
+from aiohttp import web
+
+from benchmarks.fake_bitrix import FakeBitrix
+from benchmarks.fake_sasha import SASHA_UPLOAD_PATH, FakeSasha, FakeTelegram
+from benchmarks.payloads import call_result_payload
+
+SCENARIOS = ("deals", "leads", "rollback", "transitions", "webhooks")
+
+# без моделирования квоты лимитер клиента тоже не должен ничего ждать
+UNLIMITED_POOL = 10 ** 9
+UNLIMITED_RPS = 10.0 ** 9
+
+
+@dataclass
+class Report:
+    scenario: str
+    size: int
+    seconds: float
+    items: int
+    latencies: list[float]
+    bitrix_requests: Counter[str] = field(default_factory=Counter)
+    bitrix_commands: Counter[str] = field(default_factory=Counter)
+    quota_errors: int = 0
+    sasha_requests: int = 0
+    sasha_contacts: int = 0
+    telegram_messages: int = 0
+
+    def percentile(self, p: float) -> float:
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+
+class Bench:
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.bitrix = FakeBitrix(
+            latency=args.bitrix_latency, pool=args.pool, rate=args.rps, quota_error_rate=args.quota_errors
+        )
+        self.sasha = FakeSasha(latency=args.sasha_latency)
+        self.telegram = FakeTelegram()
+        self.base_url = ""
+        self._runner: web.AppRunner | None = None
+
+        self.app = None
+        self.container = None
+        self._latencies: list[float] = []
+
+    async def start(self) -> None:
+        server = web.Application(client_max_size=256 * 1024 ** 2)
+        server.add_routes([*self.bitrix.routes(), *self.sasha.routes(), *self.telegram.routes()])
+        self._runner = web.AppRunner(server, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        host, port = self._runner.addresses[0][:2]
+        self.base_url = f"http://{host}:{port}"
+
+        # настройки читаются при импорте app.main, поэтому окружение - до импорта
+        os.environ.update({
+            "BITRIX24_WEBHOOK_URL": f"{self.base_url}/rest/1/benchmark/",
+            "TG_BOT_TOKEN": "42:benchmark",
+            "TG_CHAT_ID": "-100",
+            "SASHA_WEBHOOK_UUIDS": json.dumps(["default", "potencial", "stuck"]),
+            "SQLITE_PATH": os.path.join(tempfile.mkdtemp(prefix="bench-"), "app.sqlite3"),
+            "BITRIX24_RPS": str(self.args.rps or UNLIMITED_RPS),
+            "BITRIX24_POOL_SIZE": str(self.args.pool if self.args.rps else UNLIMITED_POOL),
+            "BITRIX24_LIST_MODE": self.args.list_mode,
+            "BITRIX24_LIST_WINDOWS": str(self.args.windows),
+        })
+        from aiogram import Bot
+        from aiogram.client.telegram import TelegramAPIServer
+        from fast_bitrix24 import BitrixAsync
+
+        from app.main import app
+        from app.services.sasha import SashaService
+
+        self.app = app
+        self.container = app.state.dishka_container
+
+        sasha = await self.container.get(SashaService)
+        sasha.client.base_url = f"{self.base_url}{SASHA_UPLOAD_PATH}"
+        bot = await self.container.get(Bot)
+        bot.session.api = TelegramAPIServer.from_base(self.base_url)
+
+        # время каждого HTTP-запроса к Битрикс глазами клиента, вместе с ожиданием лимитера
+        bitrix = await self.container.get(BitrixAsync)
+        request_attempt = bitrix.srh.request_attempt
+
+        async def timed_request_attempt(method, params=None):
+            start = time.perf_counter()
+            try:
+                return await request_attempt(method, params)
+            finally:
+                self._latencies.append(time.perf_counter() - start)
+
+        bitrix.srh.request_attempt = timed_request_attempt
+
+    async def stop(self) -> None:
+        from aiogram import Bot
+
+        bot = await self.container.get(Bot)
+        await self.container.close()
+        await bot.session.close()
+        await self._runner.cleanup()
+
+    def _reset(self) -> None:
+        self.bitrix.reset()
+        self.sasha.reset_stats()
+        self.telegram.messages.clear()
+        self._latencies = []
+
+    async def _service(self):
+        from app.services.bitrix import BitrixService
+
+        service = await self.container.get(BitrixService)
+        service.contacts_cache.clear()
+        return service
+
+    async def run(self, scenario: str, size: int) -> Report:
+        from app.services.transitions import LOAD, ROLLBACK
+
+        self._reset()
+        if scenario == "deals":
+            self.bitrix.seed_deals(size, stage="C27:NEW")
+            service = await self._service()
+            start = time.perf_counter()
+            items = await service.run_transitions((LOAD,))
+        elif scenario == "leads":
+            self.bitrix.seed_leads(size)
+            service = await self._service()
+            start = time.perf_counter()
+            items = await service.load_leads_to_sasha()
+        elif scenario == "rollback":
+            self.bitrix.seed_deals(size, stage="C27:PREPARATION")
+            service = await self._service()
+            start = time.perf_counter()
+            items = await service.run_transitions((ROLLBACK,))
+        elif scenario == "transitions":
+            for stage in ("C20:FINAL_INVOICE", "C27:NEW", "C27:PREPARATION"):
+                self.bitrix.seed_deals(size // 3, stage=stage)
+            service = await self._service()
+            start = time.perf_counter()
+            items = await service.run_transitions()
+        else:
+            start, items = await self._webhooks(size)
+        seconds = time.perf_counter() - start
+
+        return Report(
+            scenario=scenario,
+            size=size,
+            seconds=seconds,
+            items=items,
+            latencies=self._latencies,
+            bitrix_requests=Counter(self.bitrix.requests),
+            bitrix_commands=Counter(self.bitrix.commands),
+            quota_errors=self.bitrix.quota_errors,
+            sasha_requests=self.sasha.requests,
+            sasha_contacts=self.sasha.contacts,
+            telegram_messages=sum(self.telegram.messages.values()),
+        )
+
+    async def _webhooks(self, size: int) -> tuple[float, int]:
+        deal_ids = self.bitrix.seed_deals(size // 2 + size % 2, stage="C27:PREPARATION")
+        lead_ids = self.bitrix.seed_leads(size // 2, status="IN_PROCESS")
+        bodies = []
+        for i in range(size):
+            deal_id = deal_ids[i // 2] if i % 2 == 0 else None
+            lead_id = None if i % 2 == 0 else lead_ids[i // 2]
+            payload = call_result_payload(
+                event_id=f"bench-{size}-{i}", call_id=f"call-{size}-{i}", deal_id=deal_id, lead_id=lead_id,
+            )
+            bodies.append(json.dumps(payload, ensure_ascii=False).encode())
+
+        semaphore = asyncio.Semaphore(self.args.concurrency)
+        latencies: list[float] = []
+        transport = httpx.ASGITransport(app=self.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+
+            async def send(body: bytes) -> None:
+                async with semaphore:
+                    sent_at = time.perf_counter()
+                    response = await client.post(
+                        "/webhooks/bench", content=body, headers={"Content-Type": "application/json"}
+                    )
+                    latencies.append(time.perf_counter() - sent_at)
+                    response.raise_for_status()
+
+            start = time.perf_counter()
+            await asyncio.gather(*(send(body) for body in bodies))
+
+        # в отчет идет время вебхуков, а не отдельных запросов к Битрикс
+        self._latencies = latencies
+        return start, size
+
+
+def print_reports(reports: list[Report]) -> None:
+    print(
+        f"{'scenario':<9} {'size':>7} {'time, s':>8} {'items/s':>9} {'p50, ms':>8} {'p99, ms':>8} "
+        f"{'bitrix':>7} {'cmds':>7} {'503':>5} {'sasha':>6} {'tg':>4}"
+    )
+    for r in reports:
+        print(
+            f"{r.scenario:<9} {r.size:>7} {r.seconds:>8.2f} {r.items / r.seconds if r.seconds else 0:>9.0f} "
+            f"{r.percentile(0.5) * 1000:>8.1f} {r.percentile(0.99) * 1000:>8.1f} "
+            f"{sum(r.bitrix_requests.values()):>7} {sum(r.bitrix_commands.values()):>7} {r.quota_errors:>5} "
+            f"{r.sasha_requests:>6} {r.telegram_messages:>4}"
+        )
+    print()
+    for r in reports:
+        requests = ", ".join(f"{method}={count}" for method, count in r.bitrix_requests.most_common())
+        commands = ", ".join(f"{method}={count}" for method, count in r.bitrix_commands.most_common())
+        print(f"{r.scenario} {r.size}: requests [{requests}] commands [{commands}]")
+
+
+async def main(args: argparse.Namespace) -> None:
+    bench = Bench(args)
+    await bench.start()
+    reports = []
+    try:
+        for size in args.sizes:
+            for scenario in args.scenarios:
+                report = await bench.run(scenario, size)
+                reports.append(report)
+                print(f"{scenario} {size}: {report.seconds:.2f}s", flush=True)
+    finally:
+        await bench.stop()
+    print()
+    print_reports(reports)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--bitrix-latency", type=float, default=0.05, help="ответ Битрикс, с")
+    parser.add_argument("--sasha-latency", type=float, default=0.2, help="ответ Саши на одну часть, с")
+    parser.add_argument("--rps", type=float, default=0.0, help="скорость пула портала, 0 - без квоты")
+    parser.add_argument("--pool", type=int, default=50, help="размер пула портала")
+    parser.add_argument("--quota-errors", type=float, default=0.0, help="доля случайных QUERY_LIMIT_EXCEEDED")
+    parser.add_argument("--concurrency", type=int, default=50, help="одновременных вебхуков")
+    parser.add_argument("--list-mode", choices=("get_all", "keyset"), default="get_all", help="BITRIX24_LIST_MODE")
+    parser.add_argument("--windows", type=int, default=1, help="BITRIX24_LIST_WINDOWS")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    # логи сервисов на каждую сущность заглушили бы сам замер
+    structlog.configure(wrapper_class=structlog.make_filtering_bound_logger(logging.WARNING))
+    asyncio.run(main(parse_args()))
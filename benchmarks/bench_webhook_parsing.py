@@ -0,0 +1,38 @@
+"""
+Разбор тела вебхука результата звонка: было (dict -> CallResultEvent(**data))
+против стало (CallResultEventLite.model_validate_json из байтов).
+
+    python -m benchmarks.bench_webhook_parsing
+"""
+import json
+import timeit
+
+from app.models.sasha import CallResultEvent, CallResultEventLite
+from benchmarks.payloads import call_result_payload
+
+
+def before(body: bytes):
+    # FastAPI разбирает тело в dict для `data: dict`, затем модель строится из dict
+    data = json.loads(body)
+    return CallResultEvent(**data)
+
+
+def after(body: bytes):
+    return CallResultEventLite.model_validate_json(body)
+
+
+def main():
+    print(f"{'history':>8} {'body, KB':>9} {'before, us':>11} {'after, us':>10} {'speedup':>8}")
+    for history in (10, 100, 1000, 5000):
+        body = json.dumps(call_result_payload(history=history), ensure_ascii=False).encode()
+        number = max(20, 20000 // history)
+        t_before = min(timeit.repeat(lambda: before(body), number=number, repeat=5)) / number
+        t_after = min(timeit.repeat(lambda: after(body), number=number, repeat=5)) / number
+        print(
+            f"{history:>8} {len(body) / 1024:>9.1f} {t_before * 1e6:>11.1f} {t_after * 1e6:>10.1f} "
+            f"{t_before / t_after:>7.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,421 @@
+"""
+Заглушка REST Битрикс24 для бенчмарков: сделки, лиды, контакты и источники живут в памяти.
+
+Понимает crm.{deal,lead,contact}.list (в т.ч. >ID с order ID ASC и start=-1), crm.contact.get,
+crm.{deal,lead}.update, crm.item.update, crm.timeline.comment.add, crm.status.list и batch (до 50 команд, как у портала).
+Каждый HTTP-запрос отвечает через latency секунд. При rate > 0 портал моделируется
+leaky bucket (pool запросов, утекает rate в секунду) и при переполнении отвечает
+503 QUERY_LIMIT_EXCEEDED; quota_error_rate - доля случайных 503 сверх этого.
+"""
+import asyncio
+import bisect
+import json
+import random
+import re
+import time
+from collections import Counter
+from datetime import UTC, datetime, timedelta
+from urllib.parse import parse_qsl
+
+from aiohttp import web
+
+from app.services.mapping import DEAL_MAPPING, LEAD_MAPPING
+
+PAGE_SIZE = 50
+BATCH_LIMIT = 50
+
+SOURCES = [
+    ("WEB", "Сайт"), ("ADVERTISING", "Реклама"), ("CRM_FORM", "CRM-форма"), ("QUIZ", "Квиз"),
+    ("SCAN", "Скан"), ("SCAN_KZ", "Скан KZ"), ("CALL_AI", "Обзвон базы ИИ"), ("OTHER", "Другое"),
+]
+
+# операции фильтра от длинных к коротким, чтобы ">=" не принять за ">"
+FILTER_OPS = (">=", "<=", "!@", "!=", "=%", "@", ">", "<", "=", "!", "%")
+
+
+class BitrixError(Exception):
+    def __init__(self, code: str, description: str, status: int = 400):
+        super().__init__(description)
+        self.code = code
+        self.description = description
+        self.status = status
+
+
+def parse_query(query: str) -> dict:
+    """Разбор строки команды batch (http_build_query) обратно во вложенные dict/list."""
+    root: dict = {}
+    for key, value in parse_qsl(query, keep_blank_values=True):
+        parts = re.findall(r"[^\[\]]+", key)
+        node = root
+        for part in parts[:-1]:
+            node = node.setdefault(part, {})
+        node[parts[-1]] = value
+    return _listify(root)
+
+
+def _listify(node):
+    if not isinstance(node, dict):
+        return node
+    node = {key: _listify(value) for key, value in node.items()}
+    if node and all(key.isdigit() for key in node):
+        return [node[key] for key in sorted(node, key=int)]
+    return node
+
+
+def _substitute(node, results: dict):
+    """Ссылки $result[команда][индекс][поле] на ответы предыдущих команд batch, ненайденные - пустая строка."""
+    if isinstance(node, dict):
+        return {key: _substitute(value, results) for key, value in node.items()}
+    if isinstance(node, list):
+        return [_substitute(value, results) for value in node]
+    if isinstance(node, str) and node.startswith("$result["):
+        value = results
+        for part in re.findall(r"\[([^\]]*)\]", node):
+            try:
+                value = value[int(part)] if isinstance(value, list) else value[part]
+            except (KeyError, IndexError, ValueError, TypeError):
+                return ""
+        return value
+    return node
+
+
+def _comparable(value):
+    if isinstance(value, (int, float)):
+        return value
+    value = str(value)
+    if value.lstrip("-").isdigit():
+        return int(value)
+    try:
+        moment = datetime.fromisoformat(value)
+    except ValueError:
+        return value
+    return moment if moment.tzinfo else moment.replace(tzinfo=UTC)
+
+
+def _like(pattern: str) -> re.Pattern:
+    return re.compile("^" + ".*".join(re.escape(part) for part in pattern.split("%")) + "$", re.IGNORECASE)
+
+
+def _matches(item: dict, filters: dict) -> bool:
+    for key, expected in filters.items():
+        op = next((op for op in FILTER_OPS if key.startswith(op)), "")
+        field = key[len(op):]
+        # условия на поля, которых у сущности нет, заглушка не проверяет
+        if field not in item:
+            continue
+        actual = item[field]
+        if op in ("@", "!@"):
+            values = expected if isinstance(expected, list) else [expected]
+            found = str(actual) in {str(value) for value in values}
+            if found != (op == "@"):
+                return False
+        elif op == "=%":
+            if not _like(str(expected)).match(str(actual or "")):
+                return False
+        elif op == "%":
+            if str(expected).lower() not in str(actual or "").lower():
+                return False
+        elif op in (">", "<", ">=", "<="):
+            a, b = _comparable(actual), _comparable(expected)
+            if type(a) is not type(b):
+                a, b = str(a), str(b)
+            if not {">": a > b, "<": a < b, ">=": a >= b, "<=": a <= b}[op]:
+                return False
+        else:
+            if isinstance(expected, bool):
+                expected = "Y" if expected else "N"
+            equal = str(actual) == str(expected)
+            if equal == (op in ("!", "!=")):
+                return False
+    return True
+
+
+class FakeBitrix:
+    def __init__(
+            self,
+            latency: float = 0.05,
+            pool: int = 50,
+            rate: float = 0.0,
+            quota_error_rate: float = 0.0,
+            seed: int = 0,
+    ):
+        self.latency = latency
+        self.pool = pool
+        self.rate = rate
+        self.quota_error_rate = quota_error_rate
+        self.random = random.Random(seed)
+
+        self.deals: dict[str, dict] = {}
+        self.leads: dict[str, dict] = {}
+        self.contacts: dict[str, dict] = {}
+        self.statuses = {
+            str(i): {"ID": str(i), "ENTITY_ID": "SOURCE", "STATUS_ID": status_id, "NAME": name, "SORT": str(i * 10)}
+            for i, (status_id, name) in enumerate(SOURCES, start=1)
+        }
+        self._ids = 0
+        # выборки по запросу без start: страницы одного get_all не фильтруют всю таблицу заново
+        self._found: dict[tuple, list[dict]] = {}
+        self._version = 0
+
+        self.level = 0.0
+        self._updated_at = time.monotonic()
+
+        self.requests: Counter[str] = Counter()  # HTTP-запросы по методам
+        self.commands: Counter[str] = Counter()  # команды, включая вложенные в batch
+        self.quota_errors = 0
+
+    def _next_id(self) -> str:
+        self._ids += 1
+        return str(self._ids)
+
+    def _take_id(self, ids: list[str] | None, i: int) -> str:
+        if not ids:
+            return self._next_id()
+        # заданные ID (повтор записанного трафика) не должны совпасть со следующими сквозными
+        if ids[i].isdigit():
+            self._ids = max(self._ids, int(ids[i]))
+        return ids[i]
+
+    def _contact(self) -> str:
+        contact_id = self._next_id()
+        self.contacts[contact_id] = {
+            "ID": contact_id,
+            "NAME": f"Клиент {contact_id}",
+            "PHONE": [{"ID": contact_id, "VALUE_TYPE": "WORK", "VALUE": f"+7900{int(contact_id):07d}", "TYPE_ID": "PHONE"}],
+        }
+        return contact_id
+
+    @staticmethod
+    def _custom_fields(select: list[str], n: int) -> dict:
+        return {field: f"{field[-4:]}-{n % 97}" for field in select if field.startswith("UF_")}
+
+    def seed_deals(
+            self, n: int, stage: str = "C27:NEW", moved_days_ago: float = 2, ids: list[str] | None = None,
+    ) -> list[str]:
+        """:param ids: ID сделок вместо сквозной нумерации, n тогда не больше len(ids)"""
+        moved = (datetime.now(tz=UTC) - timedelta(days=moved_days_ago)).isoformat()
+        seeded = []
+        for i in range(n):
+            deal_id = self._take_id(ids, i)
+            self.deals[deal_id] = {
+                "ID": deal_id,
+                "TITLE": f"test сделка {deal_id}",
+                "CATEGORY_ID": stage.split(":")[0].removeprefix("C") if ":" in stage else "0",
+                "STAGE_ID": stage,
+                "MOVED_TIME": moved,
+                "DATE_CREATE": "2026-02-01T10:00:00+03:00",
+                "DATE_MODIFY": moved,
+                "SOURCE_ID": SOURCES[i % len(SOURCES)][0],
+                "CONTACT_ID": self._contact(),
+                **self._custom_fields(DEAL_MAPPING.select, i),
+            }
+            seeded.append(deal_id)
+        self._version += 1
+        return seeded
+
+    def seed_leads(self, n: int, status: str = "NEW", ids: list[str] | None = None) -> list[str]:
+        """:param ids: ID лидов вместо сквозной нумерации, n тогда не больше len(ids)"""
+        created = (datetime.now(tz=UTC) - timedelta(days=1)).isoformat()
+        seeded = []
+        for i in range(n):
+            lead_id = self._take_id(ids, i)
+            # у половины лидов есть контакт, у остальных только телефон в самом лиде
+            with_contact = i % 2 == 0
+            self.leads[lead_id] = {
+                "ID": lead_id,
+                "TITLE": f"test лид {lead_id}",
+                "STATUS_ID": status,
+                "DATE_CREATE": created,
+                "DATE_MODIFY": created,
+                "SOURCE_ID": SOURCES[i % len(SOURCES)][0],
+                "CONTACT_ID": self._contact() if with_contact else None,
+                "PHONE": [] if with_contact else [{"ID": lead_id, "VALUE_TYPE": "WORK", "VALUE": f"+7901{int(lead_id):07d}", "TYPE_ID": "PHONE"}],
+                **self._custom_fields(LEAD_MAPPING.select, i),
+            }
+            seeded.append(lead_id)
+        self._version += 1
+        return seeded
+
+    def reset(self) -> None:
+        """Удалить все сущности (кроме источников) и обнулить счетчики."""
+        self.deals.clear()
+        self.leads.clear()
+        self.contacts.clear()
+        self._found.clear()
+        self._version += 1
+        self.level = 0.0
+        self.requests.clear()
+        self.commands.clear()
+        self.quota_errors = 0
+
+    # --- методы REST
+
+    def _list(self, store: dict[str, dict], params: dict) -> tuple[list[dict], int | None, int | None]:
+        filters = params.get("filter") or params.get("FILTER") or {}
+        select = params.get("select") or params.get("SELECT") or []
+        order = params.get("order") or params.get("ORDER") or {"ID": "ASC"}
+        start = int(params.get("start", 0) or 0)
+
+        # >ID при order ID ASC - поиск по индексу, как у портала: выборка кэшируется без него
+        filters = dict(filters)
+        keyset = {field: str(direction).upper() for field, direction in order.items()} == {"ID": "ASC"}
+        after_id = filters.pop(">ID", None) if keyset else None
+
+        key = (id(store), self._version, json.dumps([filters, select, order], sort_keys=True, default=str))
+        found = self._found.get(key)
+        if found is None:
+            found = self._select(store, filters, select, order)
+            if len(self._found) > 16:
+                self._found.clear()
+            self._found[key] = found
+        if after_id not in (None, ""):
+            found = found[bisect.bisect_right(found, int(after_id), key=lambda item: int(item["ID"])):]
+
+        # start=-1 - без подсчета total, как у портала
+        if start == -1:
+            return found[:PAGE_SIZE], None, None
+        page = found[start:start + PAGE_SIZE]
+        next_start = start + PAGE_SIZE if start + PAGE_SIZE < len(found) else None
+        return page, len(found), next_start
+
+    @staticmethod
+    def _select(store: dict[str, dict], filters: dict, select: list[str], order: dict) -> list[dict]:
+        filters = dict(filters)
+        ids = filters.pop("@ID", None)
+        if ids is None:
+            items = store.values()
+        else:
+            ids = ids if isinstance(ids, list) else [ids]
+            items = (store[str(i)] for i in ids if str(i) in store)
+
+        found = [item for item in items if _matches(item, filters)]
+        for field, direction in reversed(list(order.items())):
+            found.sort(key=lambda item: _comparable(item.get(field) or 0), reverse=str(direction).upper() == "DESC")
+
+        if select and "*" not in select:
+            fields = set(select) | {"ID"}
+            found = [{key: value for key, value in item.items() if key in fields} for item in found]
+        return found
+
+    def _update(self, store: dict[str, dict], entity_id, fields: dict) -> None:
+        entity = store.get(str(entity_id))
+        if entity is None:
+            raise BitrixError("NOT_FOUND", "Not found")
+        now = datetime.now(tz=UTC).isoformat()
+        if "STAGE_ID" in fields and fields["STAGE_ID"] != entity.get("STAGE_ID"):
+            entity["MOVED_TIME"] = now
+        entity.update(fields)
+        entity["DATE_MODIFY"] = now
+        self._version += 1
+
+    def dispatch(self, method: str, params: dict) -> tuple[object, int | None, int | None]:
+        """Выполнить метод: (result, total, next)."""
+        self.commands[method] += 1
+        match method:
+            case "crm.deal.list":
+                return self._list(self.deals, params)
+            case "crm.lead.list":
+                return self._list(self.leads, params)
+            case "crm.contact.list":
+                return self._list(self.contacts, params)
+            case "crm.status.list":
+                return self._list(self.statuses, params)
+            case "crm.contact.get":
+                contact = self.contacts.get(str(params.get("ID") or params.get("id")))
+                if contact is None:
+                    raise BitrixError("NOT_FOUND", "Not found")
+                return contact, None, None
+            case "crm.item.update":
+                store = self.deals if str(params.get("entityTypeId")) == "2" else self.leads
+                self._update(store, params.get("id"), params.get("fields") or {})
+                return {"item": store[str(params["id"])]}, None, None
+            case "crm.deal.update":
+                self._update(self.deals, params.get("id"), params.get("fields") or {})
+                return True, None, None
+            case "crm.lead.update":
+                self._update(self.leads, params.get("id"), params.get("fields") or {})
+                return True, None, None
+            case "crm.timeline.comment.add":
+                return int(self._next_id()), None, None
+        raise BitrixError("ERROR_METHOD_NOT_FOUND", f"Method not found: {method}", status=404)
+
+    def _batch(self, params: dict) -> dict:
+        cmd = params.get("cmd") or {}
+        if len(cmd) > BATCH_LIMIT:
+            raise BitrixError("ERROR_BATCH_LENGTH_EXCEEDED", f"Max batch length exceeded ({BATCH_LIMIT})")
+        halt = str(params.get("halt", 0)) not in ("0", "", "False", "false", "N")
+
+        result, errors, totals, nexts, times = {}, {}, {}, {}, {}
+        for label, command in cmd.items():
+            method, _, query = command.partition("?")
+            try:
+                params = _substitute(parse_query(query), result)
+                value, total, next_start = self.dispatch(method.lower(), params)
+            except BitrixError as e:
+                errors[label] = {"error": e.code, "error_description": e.description}
+                if halt:
+                    break
+                continue
+            result[label] = value
+            if total is not None:
+                totals[label] = total
+            if next_start is not None:
+                nexts[label] = next_start
+            times[label] = self._timing()
+        return {
+            "result": result,
+            "result_error": errors or [],
+            "result_total": totals or [],
+            "result_next": nexts or [],
+            "result_time": times or [],
+        }
+
+    @staticmethod
+    def _timing() -> dict:
+        now = time.time()
+        return {"start": now, "finish": now, "duration": 0.001, "processing": 0.001, "operating": 0.001}
+
+    # --- HTTP
+
+    def _over_quota(self) -> bool:
+        if self.quota_error_rate and self.random.random() < self.quota_error_rate:
+            return True
+        if self.rate <= 0:
+            return False
+        now = time.monotonic()
+        self.level = max(0.0, self.level - (now - self._updated_at) * self.rate)
+        self._updated_at = now
+        if self.level + 1 > self.pool:
+            return True
+        self.level += 1
+        return False
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"].lower().removesuffix(".json")
+        self.requests[method] += 1
+        params = await request.json() if request.can_read_body else {}
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        if self._over_quota():
+            self.quota_errors += 1
+            return web.json_response(
+                {"error": "QUERY_LIMIT_EXCEEDED", "error_description": "Too many requests"}, status=503
+            )
+
+        try:
+            if method == "batch":
+                return web.json_response({"result": self._batch(params), "time": self._timing()})
+            result, total, next_start = self.dispatch(method, params)
+        except BitrixError as e:
+            return web.json_response({"error": e.code, "error_description": e.description}, status=e.status)
+
+        body = {"result": result, "time": self._timing()}
+        if total is not None:
+            body["total"] = total
+        if next_start is not None:
+            body["next"] = next_start
+        return web.json_response(body)
+
+    def routes(self) -> list[web.RouteDef]:
+        return [web.post("/rest/{user}/{token}/{method}", self.handle)]
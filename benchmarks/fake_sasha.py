@@ -0,0 +1,77 @@
+"""
+Заглушки вебхука загрузки контактов Саши и Bot API Телеграма для бенчмарков.
+"""
+import asyncio
+import gzip
+import json
+import random
+import time
+from collections import Counter
+
+from aiohttp import web
+
+SASHA_UPLOAD_PATH = "/api/upload-contacts-integrations/webhook/"
+
+
+class FakeSasha:
+    """
+    Принимает контакты (в т.ч. с Content-Encoding: gzip), отвечает через
+    latency + per_contact * len(contacts) секунд; error_rate - доля ответов 500.
+    """
+
+    def __init__(self, latency: float = 0.2, per_contact: float = 0.0, error_rate: float = 0.0, seed: int = 0):
+        self.latency = latency
+        self.per_contact = per_contact
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+
+        self.requests = 0
+        self.errors = 0
+        self.contacts = 0
+        self.bytes = 0
+
+    def reset_stats(self) -> None:
+        self.requests = self.errors = self.contacts = self.bytes = 0
+
+    async def handle(self, request: web.Request) -> web.Response:
+        body = await request.read()
+        self.requests += 1
+        self.bytes += len(body)
+        if request.headers.get("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+        contacts = json.loads(body)
+        await asyncio.sleep(self.latency + self.per_contact * len(contacts))
+
+        if self.error_rate and self.random.random() < self.error_rate:
+            self.errors += 1
+            return web.json_response({"message": "Internal error"}, status=500)
+
+        self.contacts += len(contacts)
+        return web.json_response({"added": len(contacts), "skippedPhones": []})
+
+    def routes(self) -> list[web.RouteDef]:
+        return [web.post(SASHA_UPLOAD_PATH + "{uuid}", self.handle)]
+
+
+class FakeTelegram:
+    """Bot API: только sendMessage, без задержки."""
+
+    def __init__(self):
+        self.messages: Counter[str] = Counter()
+
+    async def send_message(self, request: web.Request) -> web.Response:
+        data = await request.post() if request.content_type != "application/json" else await request.json()
+        chat_id = str(data.get("chat_id"))
+        self.messages[chat_id] += 1
+        return web.json_response({
+            "ok": True,
+            "result": {
+                "message_id": sum(self.messages.values()),
+                "date": int(time.time()),
+                "chat": {"id": int(chat_id), "type": "supergroup"},
+                "text": data.get("text", ""),
+            },
+        })
+
+    def routes(self) -> list[web.RouteDef]:
+        return [web.post("/bot{token}/sendMessage", self.send_message)]
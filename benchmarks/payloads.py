@@ -0,0 +1,94 @@
+"""Синтетические данные для бенчмарков."""
+
+
+def contact_payload(deal_id: str | None = "101", lead_id: str | None = None, phone: str = "+79001234567") -> dict:
+    additional_fields = {"title": "Ангар 20x40"}
+    if deal_id:
+        additional_fields["deal_id"] = deal_id
+    if lead_id:
+        additional_fields["lead_id"] = lead_id
+    return {
+        "additionalFields": additional_fields,
+        "blacklist": False,
+        "callList": {
+            "createdAt": "2026-01-01T10:00:00Z",
+            "deleted": False,
+            "id": "call-list-1",
+            "name": "Прогрев",
+            "settings": {
+                "callMapType": "default",
+                "callbackTiming": {"maxAttempts": 3, "retryDelay": 3600},
+                "considerSubscriberTimezone": True,
+                "skillbaseName": "angar",
+                "workingHours": [{"end": "20:00", "start": "09:00", "workDays": [1, 2, 3, 4, 5]}],
+            },
+            "status": "active",
+            "updatedAt": "2026-01-01T10:00:00Z",
+        },
+        "createdAt": "2026-01-01T10:00:00Z",
+        "createdByUserId": "user-1",
+        "id": "contact-1",
+        "isDeleted": False,
+        "phone": phone,
+        "tags": ["Сделка" if deal_id else "Лид"],
+        "updatedAt": "2026-01-01T10:00:00Z",
+    }
+
+
+def call_result_payload(
+        event_id: str = "event-1",
+        call_id: str = "call-1",
+        deal_id: str | None = "101",
+        lead_id: str | None = None,
+        phone: str = "+79001234567",
+        status: str = "completed",
+        is_commit: bool = True,
+        history: int = 20,
+        attempts_left: int = 1,
+) -> dict:
+    """CallResultEvent в том виде, в котором его присылает Саша."""
+    contact = contact_payload(deal_id=deal_id, lead_id=lead_id, phone=phone)
+    return {
+        "id": event_id,
+        "timestamp": "2026-01-01T10:05:00Z",
+        "contact": contact,
+        "call": {
+            "agreements": {
+                "clientFacts": "Нужен утепленный склад под Казанью",
+                "isCommit": is_commit,
+                "leadTransfer": {
+                    "data": '{"width": 20, "lenght": 40, "height": 8, "region": "Татарстан", "purpose": "склад"}',
+                },
+            },
+            "callDetails": {
+                "channelId": "channel-1",
+                "chatHistory": [
+                    {"content": f"Реплика номер {i}, немного текста о здании и сроках", "role": "user" if i % 2 else "assistant"}
+                    for i in range(history)
+                ],
+                "destinationPhone": phone,
+                "from": "+74950000000",
+                "to": phone,
+            },
+            "callSession": {
+                "attempts": 1,
+                "attemptsLeft": attempts_left,
+                "calls": [],
+                "contact": contact,
+                "createdAt": "2026-01-01T10:00:00Z",
+                "id": "session-1",
+                "status": "done",
+                "updatedAt": "2026-01-01T10:05:00Z",
+            },
+            "connectedAt": "2026-01-01T10:00:05Z",
+            "createdAt": "2026-01-01T10:00:00Z",
+            "endedAt": "2026-01-01T10:04:00Z",
+            "hangupReason": "normal",
+            "id": call_id,
+            "recordUrl": "https://records.example/1.mp3",
+            "startedAt": "2026-01-01T10:00:00Z",
+            "status": status,
+            "type": "outbound",
+            "updatedAt": "2026-01-01T10:05:00Z",
+        },
+    }
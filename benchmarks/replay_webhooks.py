@@ -0,0 +1,175 @@
+"""
+Повтор записанного трафика вебхуков (WEBHOOK_CAPTURE_DIR) на приложение с заглушками Битрикс24, Саши и Телеграма.
+
+    python -m benchmarks.replay_webhooks /var/lib/app/capture
+    python -m benchmarks.replay_webhooks capture/webhooks-*.jsonl.gz --speed 10
+    python -m benchmarks.replay_webhooks capture --speed 0 --concurrency 200
+    python -m benchmarks.replay_webhooks capture --speed 0 --url http://127.0.0.1:8000/api
+
+--speed 1 - с исходными интервалами между вебхуками, 10 - в 10 раз быстрее, 0 - без пауз,
+одновременно не больше --concurrency запросов.
+Без --url приложение поднимается в этом процессе, как в bench_pipeline: сделки и лиды из записанных тел
+заводятся в заглушке Битрикс (в C27:PREPARATION и IN_PROCESS), чтобы обработка шла по обычному пути.
+С --url запросы идут в уже запущенный экземпляр, заглушки не поднимаются.
+
+Отчет: пропускная способность, задержка ответа (p50/p99/p99.9/max), коды ответов
+и отставание отправки от расписания: если оно растет, запросы упираются в --concurrency
+(при --speed 0 это и есть очередь к приложению) или генератор сам не успевает за --speed.
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import logging
+import time
+from collections import Counter
+from pathlib import Path
+
+import httpx
+import structlog
+
+from benchmarks.bench_pipeline import Bench
+
+
+def read_capture(paths: list[str]) -> list[dict]:
+    """Записи всех сегментов по возрастанию ts; каталог - все *.jsonl.gz в нем."""
+    files = []
+    for path in map(Path, paths):
+        files.extend(sorted(path.glob("*.jsonl.gz")) if path.is_dir() else [path])
+    records = []
+    for file in files:
+        with gzip.open(file, "rt", encoding="utf-8") as f:
+            records.extend(json.loads(line) for line in f if line.strip())
+    records.sort(key=lambda record: record["ts"])
+    return records
+
+
+def entity_ids(records: list[dict]) -> tuple[list[str], list[str]]:
+    """ID сделок и лидов из тел вебхуков, тела без них или не JSON пропускаются."""
+    deals, leads = {}, {}
+    for record in records:
+        try:
+            fields = json.loads(record["body"])["contact"]["additionalFields"]
+        except (ValueError, KeyError, TypeError):
+            continue
+        if fields.get("deal_id"):
+            deals[str(fields["deal_id"])] = None
+        if fields.get("lead_id"):
+            leads[str(fields["lead_id"])] = None
+    return list(deals), list(leads)
+
+
+def percentile(values: list[float], p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+
+async def replay(client: httpx.AsyncClient, records: list[dict], speed: float, concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+    lags: list[float] = []
+    statuses: Counter[str] = Counter()
+    first_ts = records[0]["ts"]
+
+    async def send(record: dict, due: float) -> None:
+        async with semaphore:
+            sent_at = time.perf_counter()
+            lags.append(max(0.0, sent_at - due))
+            try:
+                response = await client.post(
+                    f"/webhooks/{record['webhook_id']}",
+                    content=record["body"].encode(),
+                    headers={"Content-Type": "application/json"},
+                )
+                statuses[str(response.status_code)] += 1
+            except httpx.HTTPError as e:
+                statuses[type(e).__name__] += 1
+            latencies.append(time.perf_counter() - sent_at)
+
+    start = time.perf_counter()
+    tasks = []
+    for record in records:
+        due = start + (record["ts"] - first_ts) / speed if speed else start
+        delay = due - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(send(record, due)))
+    await asyncio.gather(*tasks)
+    return {
+        "seconds": time.perf_counter() - start,
+        "latencies": latencies,
+        "lags": lags,
+        "statuses": statuses,
+    }
+
+
+def print_report(records: list[dict], result: dict, bench: Bench | None) -> None:
+    seconds, latencies, lags = result["seconds"], result["latencies"], result["lags"]
+    span = records[-1]["ts"] - records[0]["ts"]
+    print(f"webhooks:   {len(records)} (recorded over {span:.1f}s), replayed in {seconds:.2f}s")
+    print(f"throughput: {len(records) / seconds if seconds else 0:.0f}/s")
+    print(
+        "latency:    "
+        + " ".join(f"{name}={percentile(latencies, p) * 1000:.1f}ms" for name, p in
+                   (("p50", 0.5), ("p99", 0.99), ("p99.9", 0.999)))
+        + f" max={max(latencies, default=0) * 1000:.1f}ms"
+    )
+    print(f"send lag:   p99={percentile(lags, 0.99) * 1000:.1f}ms max={max(lags, default=0) * 1000:.1f}ms")
+    print("statuses:   " + ", ".join(f"{status}={count}" for status, count in result["statuses"].most_common()))
+    if bench:
+        requests = ", ".join(f"{method}={count}" for method, count in bench.bitrix.requests.most_common())
+        commands = ", ".join(f"{method}={count}" for method, count in bench.bitrix.commands.most_common())
+        print(f"bitrix:     requests [{requests}] commands [{commands}] 503={bench.bitrix.quota_errors}")
+        print(f"telegram:   {sum(bench.telegram.messages.values())}")
+
+
+async def main(args: argparse.Namespace) -> None:
+    records = read_capture(args.paths)
+    if not records:
+        print("no captured webhooks")
+        return
+
+    if args.url:
+        async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout) as client:
+            result = await replay(client, records, args.speed, args.concurrency)
+        print_report(records, result, None)
+        return
+
+    bench = Bench(args)
+    await bench.start()
+    try:
+        deal_ids, lead_ids = entity_ids(records)
+        bench.bitrix.seed_deals(len(deal_ids), stage="C27:PREPARATION", ids=deal_ids)
+        bench.bitrix.seed_leads(len(lead_ids), status="IN_PROCESS", ids=lead_ids)
+        bench.bitrix.requests.clear()
+        bench.bitrix.commands.clear()
+        transport = httpx.ASGITransport(app=bench.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://replay", timeout=args.timeout) as client:
+            result = await replay(client, records, args.speed, args.concurrency)
+        print_report(records, result, bench)
+    finally:
+        await bench.stop()
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("paths", nargs="+", help="каталоги или файлы сегментов *.jsonl.gz")
+    parser.add_argument("--speed", type=float, default=1.0, help="множитель скорости, 0 - без пауз")
+    parser.add_argument("--concurrency", type=int, default=100, help="одновременных запросов")
+    parser.add_argument("--url", help="префикс API запущенного экземпляра вместо приложения в процессе")
+    parser.add_argument("--timeout", type=float, default=60, help="таймаут запроса, с")
+    parser.add_argument("--bitrix-latency", type=float, default=0.05, help="ответ Битрикс, с")
+    parser.add_argument("--sasha-latency", type=float, default=0.2, help="ответ Саши на одну часть, с")
+    parser.add_argument("--rps", type=float, default=0.0, help="скорость пула портала, 0 - без квоты")
+    parser.add_argument("--pool", type=int, default=50, help="размер пула портала")
+    parser.add_argument("--quota-errors", type=float, default=0.0, help="доля случайных QUERY_LIMIT_EXCEEDED")
+    parser.set_defaults(list_mode="get_all", windows=1)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    # логи сервисов на каждый вебхук заглушили бы сам замер
+    structlog.configure(wrapper_class=structlog.make_filtering_bound_logger(logging.WARNING))
+    asyncio.run(main(parse_args()))
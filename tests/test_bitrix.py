@@ -0,0 +1,75 @@
+import unittest
+from datetime import UTC, datetime, timedelta
+from unittest.mock import AsyncMock, Mock
+
+from app.services.bitrix import BitrixService, DealUpload
+from app.services.transitions import TRANSITIONS
+
+
+def deal(deal_id: str, stage: str, moved_ago: timedelta) -> dict:
+    return {
+        "ID": deal_id,
+        "STAGE_ID": stage,
+        "CATEGORY_ID": stage.partition(":")[0].removeprefix("C"),
+        "MOVED_TIME": (datetime.now(tz=UTC) - moved_ago).isoformat(),
+        "DATE_CREATE": "2026-02-01T00:00:00+00:00",
+        "TITLE": "test deal",
+    }
+
+
+class RunTransitionsTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        deals = {
+            "C20:FINAL_INVOICE": [deal("1", "C20:FINAL_INVOICE", timedelta(minutes=1))],
+            "C27:NEW": [deal("2", "C27:NEW", timedelta(minutes=1)), deal("3", "C27:NEW", timedelta(minutes=1))],
+            "C27:PREPARATION": [deal("4", "C27:PREPARATION", timedelta(days=2))],
+        }
+        mirror = Mock(select=AsyncMock(side_effect=lambda entity, filters: deals[filters["STAGE_ID"]]))
+        self.service = BitrixService(
+            sasha=Mock(), bitrix=Mock(), source_registry=Mock(ensure_fresh=AsyncMock()), mirror=mirror,
+        )
+        self.service.batch = AsyncMock()
+
+    def moved(self) -> dict[str, str]:
+        commands = self.service.batch.await_args.args[0]
+        return {
+            params["id"]: params["fields"]["STAGE_ID"]
+            for method, params in commands.values() if method == "crm.item.update"
+        }
+
+    async def test_failed_uploads_stay_in_stage(self):
+        self.service.upload_deals = AsyncMock(return_value=DealUpload(failed={"3"}))
+        self.assertEqual(await self.service.run_transitions(TRANSITIONS), 3)
+        self.assertEqual(self.moved(), {"1": "C27:NEW", "2": "C27:PREPARATION", "4": "C27:NEW"})
+
+    async def test_sasha_outage_keeps_other_rules(self):
+        self.service.upload_deals = AsyncMock(side_effect=RuntimeError("Sasha is down"))
+        self.assertEqual(await self.service.run_transitions(TRANSITIONS), 2)
+        self.assertEqual(self.moved(), {"1": "C27:NEW", "4": "C27:NEW"})
+
+
+class UploadDealsTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.sasha = Mock(add_contacts=AsyncMock(return_value={"failedPhones": ["+79000000003"]}))
+        self.service = BitrixService(sasha=self.sasha, bitrix=Mock(), source_registry=Mock())
+        self.service.contacts_phones = AsyncMock(return_value={"10": "8 900 000-00-01"})
+
+    async def test_deals_not_sent_to_sasha_are_held(self):
+        self.service.phones.remember(
+            [{"phone": "+79000000004", "additionalFields": {"lead_id": "7"}}], "lead",
+        )
+        deals = [
+            {"ID": "1", "CONTACT_ID": "10"},
+            {"ID": "2", "PHONE": [{"VALUE": "+7 900 000-00-01"}]},  # тот же телефон в той же загрузке
+            {"ID": "3", "PHONE": [{"VALUE": "89000000003"}]},  # часть add_contacts с ошибкой
+            {"ID": "4", "PHONE": [{"VALUE": "89000000004"}]},  # телефон уже загружен от лида
+            {"ID": "5", "CONTACT_ID": "11"},  # контакт не найден
+            {"ID": "6"},  # нет телефона
+        ]
+        upload = await self.service.upload_deals(deals)
+        self.assertEqual(upload.failed, {"3"})
+        self.assertEqual(upload.collapsed, {"2", "4"})
+        self.assertEqual(upload.skipped, {"5", "6"})
+        self.assertEqual(upload.held, {"2", "3", "4", "5", "6"})
+        sent = self.sasha.add_contacts.await_args.args[0]
+        self.assertEqual([contact["phone"] for contact in sent], ["+79000000001", "+79000000003"])
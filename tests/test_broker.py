@@ -0,0 +1,36 @@
+import asyncio
+import tempfile
+import unittest
+from pathlib import Path
+
+from taskiq.message import BrokerMessage
+
+from app.core.broker import SQLiteBroker
+
+
+class SQLiteBrokerTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.broker = SQLiteBroker(str(Path(self.tmp.name) / "app.sqlite3"), visibility_timeout=0.3)
+        await self.broker.kick(BrokerMessage(task_id="1", task_name="long", message=b"payload", labels={}))
+
+    async def asyncTearDown(self):
+        self.broker.queue.close()
+        self.tmp.cleanup()
+
+    async def test_running_task_is_not_redelivered(self):
+        message = await anext(self.broker.listen())
+        self.assertEqual(message.data, b"payload")
+        # задача выполняется дольше visibility_timeout
+        await asyncio.sleep(1)
+        self.assertIsNone(await self.broker.queue.get_nowait())
+        await message.ack()
+        self.assertEqual(await self.broker.queue.size(), 0)
+        self.assertFalse(self.broker._heartbeats)
+
+    async def test_task_of_stopped_worker_is_redelivered(self):
+        await anext(self.broker.listen())
+        await self.broker.shutdown()
+        await asyncio.sleep(0.4)
+        item = await self.broker.queue.get_nowait()
+        self.assertEqual(item[1:], (b"payload", 2))
@@ -0,0 +1,43 @@
+import json
+import unittest
+
+from app.services.capture import PhoneRedactor
+from benchmarks.payloads import call_result_payload
+
+
+class PhoneRedactorTest(unittest.TestCase):
+    def setUp(self):
+        self.redactor = PhoneRedactor("salt")
+
+    def test_same_number_in_any_format_gets_one_pseudonym(self):
+        pseudonym = self.redactor.pseudonym("+79001234567")
+        self.assertTrue(pseudonym.startswith("+7999"))
+        self.assertEqual(self.redactor.redact("звоните 8 (900) 123-45-67"), f"звоните {pseudonym}")
+        self.assertEqual(self.redactor.redact("+7 900 123 45 67"), pseudonym)
+
+    def test_salt_changes_pseudonyms(self):
+        self.assertEqual(PhoneRedactor("salt").pseudonym("+79001234567"), self.redactor.pseudonym("+79001234567"))
+        self.assertNotEqual(PhoneRedactor("other").pseudonym("+79001234567"), self.redactor.pseudonym("+79001234567"))
+
+    def test_body_redacts_only_phone_fields_and_dialog(self):
+        payload = call_result_payload(phone="+79001234567")
+        payload["call"]["callDetails"]["chatHistory"].append({"role": "user", "content": "мой номер 89007654321"})
+        payload["call"]["id"] = "17676543210123"
+        payload["timestamp"] = "1767654321012"
+
+        body = json.loads(self.redactor.redact_body(json.dumps(payload, ensure_ascii=False)))
+        phone = self.redactor.pseudonym("+79001234567")
+        self.assertEqual(body["contact"]["phone"], phone)
+        self.assertEqual(body["call"]["callSession"]["contact"]["phone"], phone)
+        details = body["call"]["callDetails"]
+        self.assertEqual(details["to"], phone)
+        self.assertEqual(details["destinationPhone"], phone)
+        self.assertEqual(details["from"], self.redactor.pseudonym("+74950000000"))
+        self.assertEqual(details["chatHistory"][-1]["content"], f"мой номер {self.redactor.pseudonym('+79007654321')}")
+        # длинные числовые ID и время не трогаются
+        self.assertEqual(body["call"]["id"], "17676543210123")
+        self.assertEqual(body["timestamp"], "1767654321012")
+        self.assertNotIn("9001234567", json.dumps(body))
+
+    def test_non_json_body_is_redacted_as_text(self):
+        self.assertEqual(self.redactor.redact_body("phone=89001234567"), "phone=" + self.redactor.pseudonym("+79001234567"))
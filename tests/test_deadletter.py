@@ -0,0 +1,51 @@
+import asyncio
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+from app.services.deadletter import DeadLetterStore
+
+
+class DeadLetterStoreTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = str(Path(self.tmp.name) / "app.sqlite3")
+        self.store = DeadLetterStore(self.path, lease=0.2)
+
+    def tearDown(self):
+        self.store.close()
+        self.tmp.cleanup()
+
+    async def test_claimed_letter_is_leased(self):
+        letter_id = await self.store.put("webhooks", {"id": "a"}, "Bitrix is down")
+        other = DeadLetterStore(self.path, lease=0.2)
+        self.assertEqual(await self.store.claim("webhooks"), (letter_id, {"id": "a"}, 1))
+        # второй процесс не берет то же письмо, пока не истек lease
+        self.assertIsNone(await other.claim("webhooks"))
+        await asyncio.sleep(0.25)
+        self.assertEqual(await other.claim("webhooks"), (letter_id, {"id": "a"}, 2))
+        other.close()
+
+    async def test_ack_and_postpone(self):
+        first = await self.store.put("webhooks", {"id": "a"}, "error")
+        second = await self.store.put("webhooks", {"id": "b"}, "error")
+        await self.store.claim("webhooks")
+        await self.store.ack(first)
+        _, _, attempts = await self.store.claim("webhooks")
+        await self.store.postpone(second, attempts, "still down")
+        await asyncio.sleep(0.25)
+        # отложено на backoff, а не на lease
+        self.assertIsNone(await self.store.claim("webhooks"))
+        self.assertEqual(await self.store.counts(), {"webhooks": 1})
+
+    async def test_expired_letters_are_dropped(self):
+        await self.store.put("webhooks", {"id": "old"}, "error")
+        await self.store.execute("UPDATE dead_letters SET created_at = ?", (time.time() - self.store.ttl - 1,))
+        fresh = await self.store.put("webhooks", {"id": "new"}, "error")
+        self.assertEqual((await self.store.claim("webhooks"))[0], fresh)
+        self.assertEqual(await self.store.counts(), {"webhooks": 1})
+
+    async def test_kinds_are_separate(self):
+        await self.store.put("webhooks", {"id": "a"}, "error")
+        self.assertIsNone(await self.store.claim("notifications"))
@@ -0,0 +1,48 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from app.services.dedup import EventDeduplicator
+
+
+class EventDeduplicatorTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = str(Path(self.tmp.name) / "app.sqlite3")
+        self.dedup = EventDeduplicator(self.path)
+
+    def tearDown(self):
+        self.dedup.close()
+        self.tmp.cleanup()
+
+    async def test_any_seen_key_makes_a_duplicate(self):
+        self.assertFalse(await self.dedup.is_duplicate("event:1", "call:1"))
+        self.assertTrue(await self.dedup.is_duplicate("event:2", "call:1"))
+        self.assertFalse(await self.dedup.is_duplicate(None, ""))
+        self.assertEqual(self.dedup.duplicates_dropped, 1)
+
+    async def test_keys_are_shared_between_processes(self):
+        await self.dedup.is_duplicate("event:1")
+        other = EventDeduplicator(self.path)
+        self.assertTrue(await other.is_duplicate("event:1"))
+        other.close()
+
+    async def test_forget_allows_redelivery(self):
+        await self.dedup.is_duplicate("event:1")
+        await self.dedup.forget("event:1", None)
+        self.assertFalse(await self.dedup.is_duplicate("event:1"))
+
+    async def test_completed_steps(self):
+        self.assertEqual(await self.dedup.completed(), set())
+        await self.dedup.complete("step:1:comment", "step:1:update")
+        self.assertEqual(
+            await self.dedup.completed("step:1:comment", "step:1:notify", "step:1:update"),
+            {"step:1:comment", "step:1:update"},
+        )
+
+    async def test_expired_keys_are_not_duplicates(self):
+        dedup = EventDeduplicator(self.path, ttl=0)
+        await dedup.is_duplicate("event:1")
+        dedup._recent.clear()
+        self.assertFalse(await dedup.is_duplicate("event:1"))
+        dedup.close()
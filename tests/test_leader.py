@@ -0,0 +1,79 @@
+import asyncio
+import tempfile
+import unittest
+from pathlib import Path
+
+from app.core.leader import LeaderLease, LeaseLock
+
+
+class LeaseLockTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = str(Path(self.tmp.name) / "app.sqlite3")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    async def test_holders_in_different_processes_exclude_each_other(self):
+        # два хранилища на одном файле - как два процесса
+        first, second = LeaseLock(self.path, poll_interval=0.01), LeaseLock(self.path, poll_interval=0.01)
+        events = []
+
+        async def job(locks: LeaseLock, name: str):
+            async with locks.hold("deals"):
+                events.append(f"{name} in")
+                await asyncio.sleep(0.05)
+                events.append(f"{name} out")
+
+        await asyncio.gather(job(first, "a"), job(second, "b"))
+        self.assertIn(events, (["a in", "a out", "b in", "b out"], ["b in", "b out", "a in", "a out"]))
+
+    async def test_coroutines_of_one_process_exclude_each_other(self):
+        locks = LeaseLock(self.path, poll_interval=0.01)
+        inside = 0
+        most = 0
+
+        async def job():
+            nonlocal inside, most
+            async with locks.hold("leads"):
+                inside += 1
+                most = max(most, inside)
+                await asyncio.sleep(0.02)
+                inside -= 1
+
+        await asyncio.gather(*(job() for _ in range(3)))
+        self.assertEqual(most, 1)
+
+    async def test_different_names_do_not_block(self):
+        locks = LeaseLock(self.path)
+        async with locks.hold("deals"):
+            await asyncio.wait_for(self._enter(locks, "leads"), timeout=1)
+
+    async def test_lease_is_renewed_while_held(self):
+        holder, other = LeaseLock(self.path, ttl=0.15), LeaseLock(self.path, poll_interval=0.01)
+        async with holder.hold("deals"):
+            await asyncio.sleep(0.4)
+            with self.assertRaises(asyncio.TimeoutError):
+                await asyncio.wait_for(self._enter(other, "deals"), timeout=0.1)
+
+    async def test_expired_lease_of_dead_holder_is_taken_over(self):
+        dead = LeaseLock(self.path, ttl=0.1)
+        # держатель "упал": аренда взята и не продлевается
+        await dead.run(lambda: dead.conn.execute(
+            "INSERT INTO leases (name, holder, expires_at) VALUES ('lock:deals', 'dead', 0)"
+        ))
+        await asyncio.wait_for(self._enter(LeaseLock(self.path, poll_interval=0.01), "deals"), timeout=1)
+
+    async def test_lock_leases_do_not_collide_with_leader_lease(self):
+        leader = LeaderLease(self.path, name="deals")
+        self.assertTrue(await leader.run(leader._try_acquire))
+        await asyncio.wait_for(self._enter(LeaseLock(self.path), "deals"), timeout=1)
+
+    @staticmethod
+    async def _enter(locks: LeaseLock, name: str) -> None:
+        async with locks.hold(name):
+            pass
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+from app.services.ledger import UploadLedger, content_hash
+
+
+class ContentHashTest(unittest.TestCase):
+    def test_key_order_does_not_matter(self):
+        self.assertEqual(
+            content_hash({"phone": "+79000000001", "additionalFields": {"deal_id": "1", "name": "Иван"}}),
+            content_hash({"additionalFields": {"name": "Иван", "deal_id": "1"}, "phone": "+79000000001"}),
+        )
+
+    def test_any_field_change_changes_hash(self):
+        contact = {"phone": "+79000000001", "additionalFields": {"deal_id": "1"}}
+        self.assertNotEqual(
+            content_hash(contact), content_hash({**contact, "additionalFields": {"deal_id": "1", "city": "Омск"}}),
+        )
+
+
+class UploadLedgerTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.ledger = UploadLedger(str(Path(self.tmp.name) / "app.sqlite3"), cooldown=3600)
+
+    def tearDown(self):
+        self.ledger.close()
+        self.tmp.cleanup()
+
+    async def test_only_new_or_changed_are_pending(self):
+        await self.ledger.record("deal", {"1": "a", "2": "b"})
+        self.assertEqual(await self.ledger.pending("deal", {"1": "a", "2": "changed", "3": "c"}), {"2", "3"})
+        # журнал сделок и лидов раздельный
+        self.assertEqual(await self.ledger.pending("lead", {"1": "a"}), {"1"})
+        self.assertEqual(await self.ledger.pending("deal", {}), set())
+
+    async def test_resent_after_cooldown(self):
+        await self.ledger.record("deal", {"1": "a"})
+        await self.ledger.execute("UPDATE sasha_uploads SET uploaded_at = ?", (time.time() - 3601,))
+        self.assertEqual(await self.ledger.pending("deal", {"1": "a"}), {"1"})
+        await self.ledger.record("deal", {"1": "a"})
+        self.assertEqual(await self.ledger.pending("deal", {"1": "a"}), set())
+
+    async def test_many_ids(self):
+        hashes = {str(i): "h" for i in range(1200)}
+        await self.ledger.record("deal", hashes)
+        self.assertEqual(await self.ledger.pending("deal", {**hashes, "1200": "h"}), {"1200"})
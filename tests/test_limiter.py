@@ -0,0 +1,70 @@
+import asyncio
+import unittest
+
+from aiohttp import web
+
+from app.services.limiter import BitrixRateLimiter, LimitedBitrixAsync, LimitedRequestHandler, Priority
+from benchmarks.fake_bitrix import FakeBitrix
+
+
+class CountingLimiter(BitrixRateLimiter):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.acquired: list[Priority] = []
+
+    async def acquire(self, priority: Priority | None = None) -> None:
+        await super().acquire(priority)
+        self.acquired.append(priority)
+
+
+class LimitedBitrixAsyncTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.fake = FakeBitrix(latency=0.01)
+        self.fake.seed_deals(120)
+        self.in_flight: list[int] = []
+
+        async def handle(request: web.Request) -> web.Response:
+            # сколько запросов клиента в полете, пока портал отвечает на этот
+            self.in_flight.append(self.client.srh.in_flight)
+            return await self.fake.handle(request)
+
+        server = web.Application()
+        server.add_routes([web.post("/rest/{user}/{token}/{method}", handle)])
+        self.runner = web.AppRunner(server, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        host, port = self.runner.addresses[0][:2]
+
+        self.limiter = CountingLimiter(pool_size=1000, rate=1000.0)
+        self.client = LimitedBitrixAsync(f"http://{host}:{port}/rest/1/test/", limiter=self.limiter, verbose=False)
+
+    async def asyncTearDown(self):
+        await self.runner.cleanup()
+
+    def test_handler_is_built_with_limiter_params(self):
+        srh = self.client.srh
+        self.assertIsInstance(srh, LimitedRequestHandler)
+        self.assertIs(self.client.limiter, self.limiter)
+        self.assertEqual(srh.in_flight, 0)
+        self.assertEqual(vars(srh).get("concurrent_requests"), None)
+
+    async def test_every_request_goes_through_limiter_and_in_flight(self):
+        contact_id = next(iter(self.fake.contacts))
+        deals, contact = await asyncio.gather(
+            self.client.get_all("crm.deal.list", {"select": ["ID"]}),
+            self.client.call("crm.contact.get", {"id": contact_id}),
+        )
+        self.assertEqual(len(deals), 120)
+        self.assertTrue(contact)
+        self.assertEqual(len(self.limiter.acquired), sum(self.fake.requests.values()))
+        self.assertEqual(len(self.in_flight), sum(self.fake.requests.values()))
+        self.assertTrue(all(count >= 1 for count in self.in_flight))
+        self.assertEqual(self.client.srh.in_flight, 0)
+
+    def test_full_limit_still_leaves_a_slot(self):
+        srh = self.client.srh
+        srh.in_flight = int(srh.mcr_cur_limit)
+        self.assertEqual(srh.concurrent_requests, int(srh.mcr_cur_limit) - 1)
+        srh.mcr_cur_limit = srh.mcr_cur_limit / 3
+        self.assertLess(srh.concurrent_requests, srh.mcr_cur_limit)
@@ -0,0 +1,71 @@
+import unittest
+
+from aiohttp import web
+
+from app.services.limiter import BitrixRateLimiter, LimitedBitrixAsync
+from app.services.listing import date_windows, fetch_lists, list_keyset
+from benchmarks.fake_bitrix import FakeBitrix
+
+
+class DateWindowsTest(unittest.TestCase):
+    def test_range_is_split_into_equal_windows(self):
+        filters = {">=DATE_CREATE": "2026-01-01T00:00:00+00:00", "<DATE_CREATE": "2026-01-05T00:00:00+00:00"}
+        self.assertEqual(date_windows(filters, 2), [
+            ("2026-01-01T00:00:00+00:00", "2026-01-03T00:00:00+00:00"),
+            ("2026-01-03T00:00:00+00:00", "2026-01-05T00:00:00+00:00"),
+        ])
+
+    def test_open_upper_bound_stays_open(self):
+        windows = date_windows({">DATE_CREATE": "2026-01-01T00:00:00+00:00"}, 3)
+        self.assertEqual(len(windows), 3)
+        self.assertEqual(windows[0][0], "2026-01-01T00:00:00+00:00")
+        self.assertIsNone(windows[-1][1])
+
+    def test_single_window_or_no_lower_bound(self):
+        self.assertIsNone(date_windows({">DATE_CREATE": "2026-01-01T00:00:00+00:00"}, 1))
+        self.assertIsNone(date_windows({"<DATE_CREATE": "2026-01-01T00:00:00+00:00"}, 4))
+        self.assertIsNone(date_windows(
+            {">DATE_CREATE": "2026-01-05T00:00:00+00:00", "<DATE_CREATE": "2026-01-01T00:00:00+00:00"}, 2,
+        ))
+
+
+class KeysetTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.fake = FakeBitrix(latency=0)
+        server = web.Application()
+        server.add_routes(self.fake.routes())
+        self.runner = web.AppRunner(server, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        host, port = self.runner.addresses[0][:2]
+        limiter = BitrixRateLimiter(pool_size=1000, rate=1000.0)
+        self.client = LimitedBitrixAsync(f"http://{host}:{port}/rest/1/test/", limiter=limiter, verbose=False)
+
+    async def asyncTearDown(self):
+        await self.runner.cleanup()
+
+    async def test_chain_is_sized_by_total(self):
+        self.fake.seed_deals(175, stage="C27:NEW")
+        self.fake.seed_deals(30, stage="C27:PREPARATION")
+        deals = await list_keyset(self.client, "crm.deal.list", {"STAGE_ID": "C27:NEW"}, ["STAGE_ID"])
+        self.assertEqual(len(deals), 175)
+        self.assertEqual(len({deal["ID"] for deal in deals}), 175)
+        # первая страница и 3 догружаемые, ни одной лишней команды с пустым >ID
+        self.assertEqual(self.fake.commands["crm.deal.list"], 4)
+
+    async def test_full_last_page_ends_with_one_empty_page(self):
+        self.fake.seed_deals(100, stage="C27:NEW")
+        deals = await list_keyset(self.client, "crm.deal.list", {"STAGE_ID": "C27:NEW"}, [])
+        self.assertEqual(len(deals), 100)
+        self.assertEqual(self.fake.commands["crm.deal.list"], 3)
+
+    async def test_fetch_lists_tails_each_query(self):
+        self.fake.seed_deals(120, stage="C27:NEW")
+        self.fake.seed_deals(10, stage="C27:PREPARATION")
+        found = await fetch_lists(self.client, "crm.deal.list", {
+            "new": ({"STAGE_ID": "C27:NEW"}, ["STAGE_ID"]),
+            "preparation": ({"STAGE_ID": "C27:PREPARATION"}, ["STAGE_ID"]),
+        })
+        self.assertEqual({label: len(items) for label, items in found.items()}, {"new": 120, "preparation": 10})
+        self.assertEqual(self.fake.commands["crm.deal.list"], 4)
@@ -0,0 +1,80 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from aiohttp import web
+
+from app.services.bitrix import MIRROR_SCOPES, BitrixService
+from app.services.limiter import BitrixRateLimiter, LimitedBitrixAsync
+from app.services.mirror import CrmMirror, matches
+from app.services.transitions import move_command
+from benchmarks.fake_bitrix import FakeBitrix
+
+
+class MatchesTest(unittest.TestCase):
+    row = {
+        "ID": "5", "STAGE_ID": "C27:NEW", "TITLE": "Test сделка", "MOVED_TIME": "2026-01-10T00:00:00+00:00",
+        "UF_CRM_1765365691799": "0",
+    }
+
+    def test_operations(self):
+        self.assertTrue(matches(self.row, {"STAGE_ID": "C27:NEW", "@ID": ["4", "5"], "=%TITLE": "%test%"}))
+        self.assertTrue(matches(self.row, {"<MOVED_TIME": "2026-01-11T03:00:00+03:00", "UF_CRM_1765365691799": False}))
+        self.assertFalse(matches(self.row, {"!STAGE_ID": "C27:NEW"}))
+        self.assertFalse(matches(self.row, {"!@ID": [5]}))
+        self.assertFalse(matches(self.row, {">=MOVED_TIME": "2026-01-10T00:00:01+00:00"}))
+
+    def test_missing_time_does_not_match_comparison(self):
+        self.assertFalse(matches({"ID": "1"}, {"<MOVED_TIME": "2026-01-10T00:00:00+00:00"}))
+
+
+class CrmMirrorTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.fake = FakeBitrix(latency=0)
+        server = web.Application()
+        server.add_routes(self.fake.routes())
+        self.runner = web.AppRunner(server, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        host, port = self.runner.addresses[0][:2]
+        limiter = BitrixRateLimiter(pool_size=1000, rate=1000.0)
+        self.bitrix = LimitedBitrixAsync(f"http://{host}:{port}/rest/1/test/", limiter=limiter, verbose=False)
+        self.mirror = CrmMirror(str(Path(self.tmp.name) / "app.sqlite3"), self.bitrix, max_age=0, scopes=MIRROR_SCOPES)
+
+    async def asyncTearDown(self):
+        self.mirror.close()
+        await self.runner.cleanup()
+        self.tmp.cleanup()
+
+    async def test_full_sync_loads_only_rule_stages(self):
+        self.fake.seed_deals(3, stage="C27:NEW")
+        self.fake.seed_deals(5, stage="C27:WON")
+        self.fake.seed_leads(2, status="NEW")
+        self.fake.seed_leads(4, status="UC_LLR3RD")
+        self.assertEqual(await self.mirror.sync("deal"), 3)
+        self.assertEqual(await self.mirror.sync("lead"), 2)
+
+    async def test_delta_updates_rows_that_left_scope(self):
+        ids = self.fake.seed_deals(2, stage="C27:NEW")
+        await self.mirror.sync("deal")
+        await self.bitrix.call("crm.deal.update", {"id": ids[0], "fields": {"STAGE_ID": "C27:WON"}})
+        self.assertEqual([deal["ID"] for deal in await self.mirror.select("deal", {"STAGE_ID": "C27:NEW"})], [ids[1]])
+
+    async def test_own_moves_are_applied_after_batch(self):
+        ids = self.fake.seed_deals(2, stage="C27:NEW")
+        await self.mirror.sync("deal")
+        # без догрузки: выборка видит только то, что записал сам сервис
+        self.mirror.max_age = 3600
+        service = BitrixService(sasha=None, bitrix=self.bitrix, source_registry=None, mirror=self.mirror)
+        errors = await service.batch({
+            "move": move_command(ids[0], {"STAGE_ID": "C27:PREPARATION"}),
+            "missing": move_command("999", {"STAGE_ID": "C27:PREPARATION"}),
+        })
+        self.assertEqual(set(errors), {"missing"})
+
+        moved = await self.mirror.select("deal", {"STAGE_ID": "C27:PREPARATION"})
+        self.assertEqual([deal["ID"] for deal in moved], [ids[0]])
+        self.assertNotEqual(moved[0]["MOVED_TIME"], self.fake.deals[ids[1]]["MOVED_TIME"])
+        self.assertEqual([deal["ID"] for deal in await self.mirror.select("deal", {"STAGE_ID": "C27:NEW"})], [ids[1]])
@@ -0,0 +1,66 @@
+import asyncio
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import AsyncMock, Mock
+
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import SendMessage
+
+from app.services.notifications import NotificationOutbox
+from app.services.queue import SQLiteQueue
+
+
+def flood(retry_after: int) -> TelegramRetryAfter:
+    return TelegramRetryAfter(SendMessage(chat_id=1, text=""), "Flood control exceeded", retry_after)
+
+
+class NotificationOutboxTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = str(Path(self.tmp.name) / "app.sqlite3")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    async def wait_sent(self, bot: Mock, count: int) -> None:
+        for _ in range(200):
+            if bot.send_message.await_count >= count:
+                return
+            await asyncio.sleep(0.01)
+        self.fail(f"sent {bot.send_message.await_count} of {count}")
+
+    async def test_unsent_messages_survive_restart(self):
+        async def hang(**_):
+            await asyncio.sleep(3600)
+
+        stuck = Mock(send_message=AsyncMock(side_effect=hang))
+        first = NotificationOutbox(stuck, chat_id="1", queue=SQLiteQueue(self.path, "notifications"))
+        first.start()
+        for i in range(3):
+            await first.send(f"message {i}")
+        await asyncio.sleep(0.05)
+        await first.close(timeout=0.05)
+
+        bot = Mock(send_message=AsyncMock())
+        queue = SQLiteQueue(self.path, "notifications")
+        second = NotificationOutbox(bot, chat_id="1", queue=queue)
+        second.start()
+        await self.wait_sent(bot, 3)
+        await second.close()
+        self.assertEqual([call.kwargs["text"] for call in bot.send_message.await_args_list],
+                         ["message 0", "message 1", "message 2"])
+        self.assertEqual(await queue.size(), 0)
+
+    async def test_flood_control_retry_time_is_capped(self):
+        bot = Mock(send_message=AsyncMock(side_effect=[flood(0), flood(1), None]))
+        outbox = NotificationOutbox(bot, chat_id="1", rate=100, max_retry_time=0.5)
+        await outbox.send("first")
+        await self.wait_sent(bot, 2)
+        await outbox.send("second")
+        await self.wait_sent(bot, 3)
+        await outbox.close()
+        # первое отброшено: второй flood control вышел за max_retry_time, второе ушло
+        texts = [call.kwargs["text"] for call in bot.send_message.await_args_list]
+        self.assertEqual(texts[-1], "second")
+        self.assertEqual(texts.count("first"), 2)
@@ -0,0 +1,48 @@
+import unittest
+
+from app.services.phones import PhoneIndex, normalize_phone
+
+
+def contact(phone: str, kind: str, entity_id: str) -> dict:
+    return {"phone": phone, "tags": [], "additionalFields": {f"{kind}_id": entity_id}}
+
+
+class NormalizePhoneTest(unittest.TestCase):
+    def test_russian_and_kazakh_numbers(self):
+        for raw in ("89001234567", "79001234567", "+7 (900) 123-45-67", "9001234567", "8-10-7-900-123-45-67"):
+            self.assertEqual(normalize_phone(raw), "+79001234567", raw)
+
+    def test_international_numbers(self):
+        self.assertEqual(normalize_phone("+375 29 123 45 67"), "+375291234567")
+        self.assertEqual(normalize_phone("810 375291234567"), "+375291234567")
+
+    def test_not_a_phone(self):
+        for raw in (None, "", "12345", "0123456789012", "1234567890123456"):
+            self.assertIsNone(normalize_phone(raw), raw)
+
+
+class PhoneIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.index = PhoneIndex(ttl=60)
+
+    def test_repeats_inside_one_upload_collapse(self):
+        contacts = [contact("+79001234567", "deal", "1"), contact("+79001234567", "deal", "2")]
+        self.assertEqual(self.index.collapse(contacts, "deal"), contacts[:1])
+
+    def test_phone_uploaded_by_another_entity_collapses(self):
+        self.index.remember([contact("+79001234567", "lead", "5")], "lead")
+        # сделка поверх лида, лид поверх сделки, другая сделка - один человек не получает два звонка
+        self.assertEqual(self.index.collapse([contact("+79001234567", "deal", "1")], "deal"), [])
+        self.index.remember([contact("+79007654321", "deal", "1")], "deal")
+        self.assertEqual(self.index.collapse([contact("+79007654321", "lead", "6")], "lead"), [])
+        self.assertEqual(self.index.collapse([contact("+79007654321", "deal", "2")], "deal"), [])
+
+    def test_same_entity_passes(self):
+        self.index.remember([contact("+79001234567", "deal", "1")], "deal")
+        same = [contact("+79001234567", "deal", "1")]
+        self.assertEqual(self.index.collapse(same, "deal"), same)
+
+    def test_failed_phones_are_not_remembered(self):
+        self.index.remember([contact("+79001234567", "lead", "5")], "lead", failed_phones=["+79001234567"])
+        other = [contact("+79001234567", "deal", "1")]
+        self.assertEqual(self.index.collapse(other, "deal"), other)
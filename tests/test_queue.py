@@ -0,0 +1,64 @@
+import asyncio
+import tempfile
+import unittest
+from pathlib import Path
+
+from app.services.queue import SQLiteQueue
+
+
+class SQLiteQueueTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = str(Path(self.tmp.name) / "app.sqlite3")
+        self.queue = SQLiteQueue(self.path, "webhooks", visibility_timeout=0.2, poll_interval=0.05)
+
+    def tearDown(self):
+        self.queue.close()
+        self.tmp.cleanup()
+
+    async def test_taken_item_is_hidden_until_timeout(self):
+        item_id = await self.queue.put(b"a")
+        self.assertEqual(await self.queue.get_nowait(), (item_id, b"a", 1))
+        self.assertIsNone(await self.queue.get_nowait())
+        # обработчик не подтвердил элемент - он возвращается со следующим номером попытки
+        await asyncio.sleep(0.25)
+        self.assertEqual(await self.queue.get_nowait(), (item_id, b"a", 2))
+
+    async def test_ack_removes_and_nack_returns(self):
+        first = await self.queue.put(b"a")
+        second = await self.queue.put(b"b")
+        await self.queue.get_nowait()
+        await self.queue.ack(first)
+        await self.queue.get_nowait()
+        await self.queue.nack(second)
+        self.assertEqual(await self.queue.get_nowait(), (second, b"b", 2))
+        self.assertEqual(await self.queue.size(), 1)
+
+    async def test_nack_delay_and_touch(self):
+        item_id = await self.queue.put(b"a")
+        await self.queue.get_nowait()
+        await self.queue.nack(item_id, delay=60)
+        self.assertIsNone(await self.queue.get_nowait())
+
+        await self.queue.nack(item_id)
+        await self.queue.get_nowait()
+        await asyncio.sleep(0.15)
+        await self.queue.touch(item_id)
+        await asyncio.sleep(0.15)
+        self.assertIsNone(await self.queue.get_nowait())
+
+    async def test_queues_share_a_table(self):
+        other = SQLiteQueue(self.path, "notifications")
+        await self.queue.put(b"a")
+        await other.put(b"b")
+        self.assertEqual(await other.depths(), {"webhooks": 1, "notifications": 1})
+        self.assertEqual((await other.get_nowait())[1], b"b")
+        self.assertIsNone(await other.get_nowait())
+        other.close()
+
+    async def test_get_waits_for_put(self):
+        waiter = asyncio.create_task(self.queue.get())
+        await asyncio.sleep(0.1)
+        self.assertFalse(waiter.done())
+        await self.queue.put(b"a")
+        self.assertEqual((await asyncio.wait_for(waiter, 1))[1], b"a")
@@ -0,0 +1,88 @@
+import unittest
+
+import httpx
+
+from app.core.resilience import CircuitBreaker, CircuitOpenError, CircuitState, retry
+from app.services.sasha import is_outage, is_transient
+
+
+def status_error(code: int) -> httpx.HTTPStatusError:
+    request = httpx.Request("POST", "https://sasha.test/webhook")
+    return httpx.HTTPStatusError("error", request=request, response=httpx.Response(code, request=request))
+
+
+class CircuitBreakerTest(unittest.IsolatedAsyncioTestCase):
+    async def fail_call(self, breaker: CircuitBreaker, error: Exception, is_failure=lambda e: True) -> None:
+        with self.assertRaises(type(error)):
+            async with breaker.guard(is_failure=is_failure):
+                raise error
+
+    async def test_opens_after_threshold_and_probes_after_timeout(self):
+        breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=0)
+        await self.fail_call(breaker, RuntimeError("down"))
+        self.assertEqual(breaker.state, CircuitState.CLOSED)
+        await self.fail_call(breaker, RuntimeError("down"))
+        self.assertEqual(breaker.state, CircuitState.OPEN)
+
+        closed = []
+        breaker.on_close(lambda: closed.append(True))
+        # reset_timeout прошел - один пробный вызов, второй параллельный отклоняется
+        breaker.check()
+        self.assertEqual(breaker.state, CircuitState.HALF_OPEN)
+        with self.assertRaises(CircuitOpenError):
+            breaker.check()
+        breaker.success()
+        self.assertEqual(breaker.state, CircuitState.CLOSED)
+        self.assertEqual(closed, [True])
+
+    async def test_open_circuit_rejects_calls(self):
+        breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=60)
+        await self.fail_call(breaker, RuntimeError("down"))
+        with self.assertRaises(CircuitOpenError):
+            async with breaker.guard():
+                self.fail("call went through an open circuit")
+
+    async def test_failed_probe_reopens(self):
+        breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=0)
+        await self.fail_call(breaker, RuntimeError("down"))
+        await self.fail_call(breaker, RuntimeError("still down"))
+        self.assertEqual(breaker.state, CircuitState.OPEN)
+
+    async def test_sasha_rate_limit_does_not_open_circuit(self):
+        breaker = CircuitBreaker("sasha", failure_threshold=1)
+        await self.fail_call(breaker, status_error(429), is_failure=is_outage)
+        self.assertEqual(breaker.state, CircuitState.CLOSED)
+        await self.fail_call(breaker, status_error(503), is_failure=is_outage)
+        self.assertEqual(breaker.state, CircuitState.OPEN)
+
+
+class SashaErrorsTest(unittest.TestCase):
+    def test_rate_limit_is_retried_but_is_not_an_outage(self):
+        self.assertTrue(is_transient(status_error(429)))
+        self.assertFalse(is_outage(status_error(429)))
+
+    def test_server_and_network_errors(self):
+        for error in (status_error(502), httpx.ConnectError("refused")):
+            self.assertTrue(is_transient(error))
+            self.assertTrue(is_outage(error))
+
+    def test_client_errors(self):
+        self.assertFalse(is_transient(status_error(400)))
+        self.assertFalse(is_outage(status_error(400)))
+
+
+class RetryTest(unittest.IsolatedAsyncioTestCase):
+    async def test_retries_only_matching_errors(self):
+        calls = []
+
+        async def flaky():
+            calls.append(True)
+            if len(calls) < 3:
+                raise ValueError("again")
+            return "ok"
+
+        self.assertEqual(await retry(flaky, attempts=3, base=0), "ok")
+        calls.clear()
+        with self.assertRaises(ValueError):
+            await retry(flaky, attempts=3, base=0, retry_on=lambda e: False)
+        self.assertEqual(len(calls), 1)
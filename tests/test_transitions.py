@@ -0,0 +1,89 @@
+import unittest
+from datetime import UTC, datetime, timedelta
+
+from app.services.transitions import (
+    COLD,
+    LOAD,
+    ROLLBACK,
+    TRANSITIONS,
+    move_command,
+    plan,
+    rule_filter,
+    rule_select,
+    stage_fields,
+)
+
+NOW = datetime(2026, 3, 1, 12, 0, tzinfo=UTC)
+
+
+def deal(deal_id: str, stage: str, moved_ago: timedelta, **fields) -> dict:
+    return {
+        "ID": deal_id,
+        "STAGE_ID": stage,
+        "CATEGORY_ID": stage.partition(":")[0].removeprefix("C"),
+        "MOVED_TIME": (NOW - moved_ago).isoformat(),
+        "DATE_CREATE": "2026-02-01T00:00:00+00:00",
+        "TITLE": "test deal",
+        **fields,
+    }
+
+
+class PlanTest(unittest.TestCase):
+    def test_deals_go_to_their_stage_rule_after_settle(self):
+        deals = [
+            deal("1", "C20:FINAL_INVOICE", timedelta(minutes=1)),
+            deal("2", "C27:NEW", timedelta(minutes=1)),
+            deal("3", "C27:PREPARATION", timedelta(days=2)),
+        ]
+        planned = plan(deals, TRANSITIONS, NOW)
+        self.assertEqual({name: [d["ID"] for d in items] for name, items in planned.items()},
+                         {"cold": ["1"], "load": ["2"], "rollback": ["3"]})
+
+    def test_unsettled_deals_wait(self):
+        deals = [
+            deal("1", "C27:NEW", timedelta(seconds=5)),
+            deal("2", "C27:PREPARATION", timedelta(hours=3)),
+            deal("3", "C27:NEW", timedelta(minutes=1), MOVED_TIME=None),
+        ]
+        self.assertEqual(plan(deals, TRANSITIONS, NOW), {"cold": [], "load": [], "rollback": []})
+
+    def test_rule_filters_are_checked(self):
+        deals = [
+            deal("1", "C20:FINAL_INVOICE", timedelta(minutes=1), TITLE="real deal"),
+            deal("2", "C20:FINAL_INVOICE", timedelta(minutes=1), DATE_CREATE="2025-12-01T00:00:00+00:00"),
+        ]
+        self.assertEqual(plan(deals, (COLD,), NOW), {"cold": []})
+
+    def test_subset_of_rules_plans_only_them(self):
+        deals = [deal("1", "C27:NEW", timedelta(minutes=1)), deal("2", "C27:PREPARATION", timedelta(days=2))]
+        self.assertEqual([d["ID"] for d in plan(deals, (ROLLBACK,), NOW)["rollback"]], ["2"])
+        self.assertEqual(set(plan(deals, (LOAD,), NOW)), {"load"})
+
+    def test_repeated_deal_is_planned_once(self):
+        item = deal("1", "C27:NEW", timedelta(minutes=1))
+        self.assertEqual(len(plan([item, dict(item)], TRANSITIONS, NOW)["load"]), 1)
+
+
+class RuleTest(unittest.TestCase):
+    def test_filter_holds_stage_settle_and_conditions(self):
+        self.assertEqual(rule_filter(COLD, NOW), {
+            "STAGE_ID": "C20:FINAL_INVOICE",
+            "<MOVED_TIME": (NOW - COLD.settle).isoformat(),
+            **COLD.filters,
+        })
+
+    def test_select_covers_filter_fields_once(self):
+        fields = rule_select(COLD)
+        self.assertTrue({"ID", "STAGE_ID", "CATEGORY_ID", "MOVED_TIME", "DATE_CREATE", "TITLE"} <= set(fields))
+        self.assertEqual(len(fields), len(set(fields)))
+
+    def test_stage_fields_change_category_only_across_pipelines(self):
+        self.assertEqual(stage_fields({"CATEGORY_ID": "20"}, "C27:NEW"), {"STAGE_ID": "C27:NEW", "CATEGORY_ID": "27"})
+        self.assertEqual(stage_fields({"CATEGORY_ID": 27}, "C27:NEW"), {"STAGE_ID": "C27:NEW"})
+        self.assertEqual(stage_fields({"CATEGORY_ID": "0"}, "NEW"), {"STAGE_ID": "NEW"})
+
+    def test_move_command(self):
+        self.assertEqual(
+            move_command("7", {"STAGE_ID": "C27:NEW"}),
+            ("crm.item.update", {"entityTypeId": 2, "id": "7", "fields": {"STAGE_ID": "C27:NEW"}}),
+        )
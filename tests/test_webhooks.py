@@ -0,0 +1,82 @@
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import AsyncMock, Mock
+
+from aiohttp import web
+
+from app.api.routes.webhooks import deal_actions, lead_actions, process_result
+from app.models.sasha import CallResultEventLite
+from app.services.dedup import EventDeduplicator
+from app.services.limiter import BitrixRateLimiter, LimitedBitrixAsync
+from benchmarks.fake_bitrix import FakeBitrix
+from benchmarks.payloads import call_result_payload
+
+
+def call_result(**kwargs) -> CallResultEventLite:
+    return CallResultEventLite.model_validate(call_result_payload(**kwargs))
+
+
+class ResultActionsTest(unittest.TestCase):
+    def test_deal_success(self):
+        actions = deal_actions(call_result(deal_id="101"))
+        self.assertEqual(actions.commands["comment"][0], "crm.timeline.comment.add")
+        self.assertEqual(actions.commands["update"][0], "crm.deal.update")
+        self.assertIn("Успешный прогрев", actions.notification)
+
+    def test_deal_failed_with_attempts_left_only_comments(self):
+        actions = deal_actions(call_result(deal_id="101", status="failed", attempts_left=1))
+        self.assertEqual(set(actions.commands), {"comment"})
+        self.assertIsNone(actions.notification)
+
+    def test_lead_not_committed(self):
+        actions = lead_actions(call_result(deal_id=None, lead_id="7", is_commit=False))
+        self.assertEqual(
+            actions.commands["update"], ("crm.lead.update", {"id": "7", "fields": {"STATUS_ID": "UC_LLR3RD"}}),
+        )
+        self.assertIsNotNone(actions.notification)
+
+
+class ProcessResultTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.steps = EventDeduplicator(str(Path(self.tmp.name) / "app.sqlite3"))
+        self.fake = FakeBitrix(latency=0)
+        server = web.Application()
+        server.add_routes(self.fake.routes())
+        self.runner = web.AppRunner(server, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        host, port = self.runner.addresses[0][:2]
+        limiter = BitrixRateLimiter(pool_size=1000, rate=1000.0)
+        self.bitrix = LimitedBitrixAsync(f"http://{host}:{port}/rest/1/test/", limiter=limiter, verbose=False)
+        self.notifier = Mock(send=AsyncMock())
+
+    async def asyncTearDown(self):
+        await self.runner.cleanup()
+        self.steps.close()
+        self.tmp.cleanup()
+
+    async def test_retry_resumes_without_duplicates(self):
+        result = call_result(deal_id="101")
+        # сделки еще нет - комментарий записан, изменение сделки нет, уведомления тоже
+        with self.assertRaises(RuntimeError):
+            await process_result(result, self.notifier, self.bitrix, self.steps)
+        self.assertEqual(self.fake.commands["crm.timeline.comment.add"], 1)
+        self.notifier.send.assert_not_called()
+
+        self.fake.seed_deals(1, ids=["101"])
+        await process_result(result, self.notifier, self.bitrix, self.steps)
+        await process_result(result, self.notifier, self.bitrix, self.steps)
+        self.assertEqual(self.fake.commands["crm.timeline.comment.add"], 1)
+        self.assertEqual(self.fake.commands["crm.deal.update"], 2)
+        self.assertEqual(self.fake.deals["101"]["STATUS_ID"], "C27:WON")
+        self.notifier.send.assert_called_once()
+
+    async def test_other_results_are_independent(self):
+        self.fake.seed_deals(1, ids=["101"])
+        await process_result(call_result(event_id="a", deal_id="101"), self.notifier, self.bitrix, self.steps)
+        await process_result(call_result(event_id="b", deal_id="101"), self.notifier, self.bitrix, self.steps)
+        self.assertEqual(self.fake.commands["crm.timeline.comment.add"], 2)
+        self.assertEqual(self.notifier.send.call_count, 2)